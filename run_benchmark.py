@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Pruebas de carga y micro-benchmarks del agente RAG")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    load = subparsers.add_parser("load", help="Prueba de carga del pipeline completo")
+    load.add_argument("--requests", type=int, default=200, help="Peticiones por nivel de concurrencia")
+    load.add_argument("--concurrency", default="1,4,16", help="Niveles de concurrencia separados por comas")
+    load.add_argument("--rate", type=float, default=None, help="Llegadas por segundo (Poisson); sin valor, bucle cerrado")
+    load.add_argument("--questions", default=None, help="JSONL con preguntas; por defecto EVALUATION_QUESTIONS")
+    load.add_argument("--mix", default="zipf", choices=["uniform", "zipf", "sequential"], help="Distribución de preguntas")
+    load.add_argument("--stream", action="store_true", help="Usar ask_stream (mide el primer token)")
+    load.add_argument("--llm", default="fake", choices=["fake", "openai", "local"], help="Backend LLM")
+    load.add_argument("--llm-latency", type=float, default=None, help="Latencia del primer token del LLM simulado (s)")
+    load.add_argument("--llm-tokens-per-second", type=float, default=None, help="Velocidad del LLM simulado")
+    load.add_argument("--no-answer-cache", action="store_true", help="Desactivar la caché de respuestas")
+    load.add_argument("--warmup", type=int, default=10, help="Peticiones de calentamiento no medidas")
+    load.add_argument("--seed", type=int, default=0)
+    load.add_argument("--output", default=None, help="Guardar el informe JSON en este fichero")
+
+    retrieval = subparsers.add_parser("retrieval", help="Calidad de recuperación (recall@k, MRR, nDCG) sin LLM")
+    retrieval.add_argument("--labels", default=None, help="JSONL con preguntas y fragmentos relevantes")
+    retrieval.add_argument("--k", default="1,3,5,10", help="Valores de k separados por comas")
+    retrieval.add_argument(
+        "--sweep", action="append", default=[], metavar="PARAM=V1,V2",
+        help="Parámetro a barrer (repetible), p. ej. chunk_size=128,256 o retrieval_mode=dense,hybrid"
+    )
+    retrieval.add_argument("--output", default=None, help="Guardar el informe JSON en este fichero")
+
+    micro = subparsers.add_parser("micro", help="Micro-benchmarks (troceado, embeddings, índice, búsqueda...)")
+    micro.add_argument("names", nargs="*", help="Benchmarks a ejecutar; por defecto todos")
+    micro.add_argument("--output", default=None, help="Guardar el informe JSON en este fichero")
+
+    return parser.parse_args(argv)
+
+
+def run_load(args):
+    from src.config import agent_settings
+    from src.load_test import load_questions, run_load_suite
+    from src.rag_agent import create_certification_agent
+
+    settings = agent_settings()
+    settings.update(llm_backend=args.llm, enable_metrics=True)
+    if args.llm_latency is not None:
+        settings["fake_llm_latency"] = args.llm_latency
+    if args.llm_tokens_per_second is not None:
+        settings["fake_llm_tokens_per_second"] = args.llm_tokens_per_second
+    if args.no_answer_cache:
+        settings["use_answer_cache"] = False
+
+    agent = create_certification_agent(**settings)
+    return run_load_suite(
+        agent,
+        load_questions(args.questions),
+        [int(level) for level in args.concurrency.split(",")],
+        requests=args.requests,
+        rate=args.rate,
+        mix=args.mix,
+        stream=args.stream,
+        seed=args.seed,
+        warmup=args.warmup
+    )
+
+
+def _parse_value(value):
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+
+def run_retrieval(args):
+    from src.config import agent_settings
+    from src.retrieval_eval import LABELLED_SET_PATH, load_labelled_set, sweep
+
+    labelled = load_labelled_set(args.labels or LABELLED_SET_PATH)
+    grid = {}
+    for option in args.sweep:
+        name, _, values = option.partition("=")
+        grid[name] = [_parse_value(value) for value in values.split(",")]
+
+    return sweep(labelled, grid, agent_settings(), ks=[int(k) for k in args.k.split(",")])
+
+
+def run_micro(args):
+    from src.benchmark import BENCHMARKS
+
+    names = args.names or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            print(f"Benchmark desconocido: {name}. Disponibles: {', '.join(BENCHMARKS)}")
+            sys.exit(1)
+
+    return {name: BENCHMARKS[name]() for name in names}
+
+
+def main():
+    args = parse_args()
+    commands = {"load": run_load, "retrieval": run_retrieval, "micro": run_micro}
+    report = commands[args.command](args)
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        Path(args.output).write_text(output, encoding="utf-8")
+        print(f"Informe guardado en {args.output}")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -23,7 +23,7 @@ def check_environment():
     from dotenv import load_dotenv
     load_dotenv()
     
-    if not os.getenv("OPENAI_API_KEY"):
+    if os.getenv("LLM_BACKEND", "openai") == "openai" and not os.getenv("OPENAI_API_KEY"):
         print("Error: OPENAI_API_KEY no configurada")
         print("Crea un archivo .env con tu API key")
         return False
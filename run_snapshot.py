@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Snapshots portables del índice para arrancar réplicas sin reindexar")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export = subparsers.add_parser("export", help="Empaqueta el índice actual (chunks, embeddings, BM25 y manifest)")
+    export.add_argument("--output", default=None, help="Fichero de salida; por defecto SNAPSHOT_PATH")
+
+    imported = subparsers.add_parser("import", help="Comprueba los checksums de un snapshot y lo instala")
+    imported.add_argument("source", help="Snapshot a importar")
+    imported.add_argument("--destination", default=None, help="Ruta de instalación; por defecto SNAPSHOT_PATH")
+
+    info = subparsers.add_parser("info", help="Muestra la cabecera de un snapshot")
+    info.add_argument("path", nargs="?", default=None, help="Snapshot; por defecto SNAPSHOT_PATH")
+    info.add_argument("--verify", action="store_true", help="Comprobar también los checksums")
+
+    return parser.parse_args(argv)
+
+
+def run_export(args):
+    from src.config import SNAPSHOT_PATH, agent_settings
+    from src.rag_agent import create_certification_agent
+
+    settings = agent_settings()
+    # El snapshot se genera desde el vectorstore, nunca desde otro snapshot
+    settings.update(llm_backend="fake", use_answer_cache=False, snapshot_path=None)
+    agent = create_certification_agent(**settings)
+
+    header = agent.export_snapshot(args.output or SNAPSHOT_PATH)
+    return {key: value for key, value in header.items() if key != "sections"}
+
+
+def run_import(args):
+    from src.config import SNAPSHOT_PATH
+    from src.index_snapshot import import_snapshot
+
+    return import_snapshot(args.source, args.destination or SNAPSHOT_PATH)
+
+
+def run_info(args):
+    from src.config import SNAPSHOT_PATH
+    from src.index_snapshot import IndexSnapshot
+
+    snapshot = IndexSnapshot(args.path or SNAPSHOT_PATH)
+    if args.verify:
+        snapshot.verify()
+    return {**snapshot.info(), "verified": args.verify}
+
+
+def main():
+    args = parse_args()
+    commands = {"export": run_export, "import": run_import, "info": run_info}
+    print(json.dumps(commands[args.command](args), indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
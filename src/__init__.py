@@ -1,4 +1,5 @@
 from .rag_agent import RAGAgent, create_certification_agent, ask_certification_question
+from .corpus import CorpusAgent, create_corpus_agent
 from .config import *
 from .evaluator import RAGEvaluator
 
@@ -8,5 +9,7 @@ __all__ = [
     "RAGAgent",
     "create_certification_agent",
     "ask_certification_question",
+    "CorpusAgent",
+    "create_corpus_agent",
     "RAGEvaluator"
 ]
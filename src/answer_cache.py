@@ -0,0 +1,129 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SIMILARITY_THRESHOLD = 0.95
+DEFAULT_TTL_SECONDS = 3600
+DEFAULT_MAX_ENTRIES = 256
+
+
+def _normalize(vector: Sequence[float]) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+class AnswerCache:
+    def __init__(
+        self,
+        similarity_threshold: float = DEFAULT_SIMILARITY_THRESHOLD,
+        ttl_seconds: float = DEFAULT_TTL_SECONDS,
+        max_entries: int = DEFAULT_MAX_ENTRIES
+    ):
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.fingerprint = None
+        self.entries = OrderedDict()
+        self.next_entry_id = 0
+        self.lock = threading.Lock()
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "invalidations": 0
+        }
+
+    def _check_fingerprint(self, fingerprint: Optional[str]):
+        if fingerprint != self.fingerprint:
+            if self.entries:
+                logger.info("Vectorstore modificado, invalidando caché de respuestas")
+                self.stats["invalidations"] += 1
+            self.entries.clear()
+            self.fingerprint = fingerprint
+
+    def _expire(self, now: float):
+        expired = [entry_id for entry_id, entry in self.entries.items() if now - entry["created_at"] > self.ttl_seconds]
+        for entry_id in expired:
+            del self.entries[entry_id]
+        self.stats["expirations"] += len(expired)
+
+    def lookup(
+        self,
+        query_embedding: Sequence[float],
+        chunk_ids: List[Any],
+        fingerprint: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        query = _normalize(query_embedding)
+        chunk_key = tuple(chunk_ids)
+
+        with self.lock:
+            self._check_fingerprint(fingerprint)
+            self._expire(time.time())
+
+            candidates = [
+                (entry_id, entry) for entry_id, entry in self.entries.items()
+                if entry["chunk_ids"] == chunk_key
+            ]
+            if candidates:
+                similarities = np.stack([entry["embedding"] for _, entry in candidates]) @ query
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.similarity_threshold:
+                    entry_id, entry = candidates[best]
+                    self.entries.move_to_end(entry_id)
+                    entry["hits"] += 1
+                    self.stats["hits"] += 1
+                    return {
+                        "answer": entry["answer"],
+                        "question": entry["question"],
+                        "similarity": float(similarities[best]),
+                        "age_seconds": time.time() - entry["created_at"]
+                    }
+
+            self.stats["misses"] += 1
+            return None
+
+    def store(
+        self,
+        question: str,
+        query_embedding: Sequence[float],
+        chunk_ids: List[Any],
+        answer: str,
+        fingerprint: Optional[str] = None
+    ):
+        with self.lock:
+            self._check_fingerprint(fingerprint)
+
+            self.entries[self.next_entry_id] = {
+                "question": question,
+                "embedding": _normalize(query_embedding),
+                "chunk_ids": tuple(chunk_ids),
+                "answer": answer,
+                "created_at": time.time(),
+                "hits": 0
+            }
+            self.next_entry_id += 1
+
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def cache_stats(self) -> Dict[str, Any]:
+        with self.lock:
+            stats = self.stats.copy()
+            stats["entries"] = len(self.entries)
+
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
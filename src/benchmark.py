@@ -0,0 +1,1000 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from typing import Any, Dict, List
+
+from .config import (
+    PROJECT_ROOT, PDF_PATH, VECTORSTORE_PATH, EMBEDDING_MODEL, CHUNK_SIZE, CHUNK_OVERLAP, EMBEDDING_BATCH_SIZE, INDEX_BACKEND,
+    CHUNK_SIZE_TOKENS, CHUNK_OVERLAP_TOKENS, QUERY_BATCH_WINDOW_MS, QUERY_BATCH_MAX_SIZE, RETRIEVAL_MODE
+)
+from .pdf_extraction import PDF_EXTRACTORS, PageTextCache, iter_pdf_pages
+
+
+def _time_page_iteration(pages_iterator_factory, repeats: int) -> Dict[str, Any]:
+    times = []
+    pages = 0
+    characters = 0
+
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        pages = 0
+        characters = 0
+        for _, page_text in pages_iterator_factory():
+            pages += 1
+            characters += len(page_text)
+        times.append(time.perf_counter() - start_time)
+
+    best_time = min(times)
+    return {
+        "pages": pages,
+        "characters": characters,
+        "best_time": best_time,
+        "avg_time": sum(times) / len(times),
+        "pages_per_second": pages / best_time if best_time > 0 else 0
+    }
+
+
+def benchmark_pdf_extraction(
+    pdf_path: str = PDF_PATH,
+    workers_options: List[int] = None,
+    extractors: List[str] = None,
+    repeats: int = 3
+) -> Dict[str, Any]:
+    if workers_options is None:
+        workers_options = [1, 2, 4]
+    if extractors is None:
+        extractors = PDF_EXTRACTORS
+
+    results = []
+    work_dir = tempfile.mkdtemp(prefix="rag-pdf-bench-")
+
+    try:
+        for extractor in extractors:
+            for workers in workers_options:
+                results.append({
+                    "extractor": extractor,
+                    "workers": workers,
+                    "cached": False,
+                    **_time_page_iteration(
+                        lambda: iter_pdf_pages(pdf_path, workers=workers, extractor=extractor), repeats
+                    )
+                })
+
+            # Reconstrucción con el texto ya extraído: lectura de la caché de páginas
+            cache = PageTextCache(os.path.join(work_dir, "page_cache"))
+            for _ in iter_pdf_pages(pdf_path, extractor=extractor, cache=cache):
+                pass
+            results.append({
+                "extractor": extractor,
+                "workers": 1,
+                "cached": True,
+                **_time_page_iteration(lambda: iter_pdf_pages(pdf_path, extractor=extractor, cache=cache), repeats)
+            })
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    baseline = results[0]["pages_per_second"] or 1
+
+    for result in results:
+        result["speedup"] = result["pages_per_second"] / baseline
+
+    return {
+        "benchmark": "pdf_extraction",
+        "pdf_path": pdf_path,
+        "repeats": repeats,
+        "results": results
+    }
+
+
+def _rfind_chunk_offsets(text: str, chunk_size: int, chunk_overlap: int, max_iterations: int = 10000) -> List[tuple]:
+    # Troceado anterior (rfind por ventana y tope de iteraciones), como referencia
+    offsets = []
+    start = 0
+    iterations = 0
+
+    while start < len(text) and iterations < max_iterations:
+        iterations += 1
+        end = start + chunk_size
+
+        if end < len(text):
+            for char in ['. ', '? ', '! ']:
+                last_pos = text.rfind(char, start, end)
+                if last_pos != -1 and last_pos > start:
+                    end = last_pos + 1
+                    break
+
+        if text[start:end].strip():
+            offsets.append((start, end))
+
+        next_start = end - chunk_overlap
+        if next_start <= start:
+            next_start = start + max(1, chunk_size - chunk_overlap)
+        start = next_start
+
+    return offsets
+
+
+def benchmark_chunking(
+    pdf_path: str = PDF_PATH,
+    target_mb: float = 16,
+    repeats: int = 3,
+    tokenizer_name: str = EMBEDDING_MODEL
+) -> Dict[str, Any]:
+    from .chunking import (
+        iter_chunk_offsets, iter_chunks_stream, load_tokenizer, max_chunk_tokens, token_starts, uncovered_ranges
+    )
+
+    pages = [text for _, text in iter_pdf_pages(pdf_path)]
+    page_text = "".join(pages)
+    pages = pages * max(1, int(target_mb * 1024 * 1024 / max(1, len(page_text))) + 1)
+    text = "".join(pages)
+
+    pipelines = [
+        ("rfind (caracteres)", lambda: _rfind_chunk_offsets(text, CHUNK_SIZE, CHUNK_OVERLAP)),
+        ("sentence_offsets (caracteres)", lambda: list(iter_chunk_offsets(text, CHUNK_SIZE, CHUNK_OVERLAP))),
+        (
+            "sentence_offsets por páginas (caracteres)",
+            lambda: [(start, end) for _, start, end in iter_chunks_stream(pages, CHUNK_SIZE, CHUNK_OVERLAP)]
+        )
+    ]
+    try:
+        tokenizer = load_tokenizer(tokenizer_name)
+        chunk_size_tokens = min(CHUNK_SIZE_TOKENS, max_chunk_tokens(tokenizer_name) or CHUNK_SIZE_TOKENS)
+        pipelines.append((
+            "sentence_offsets (tokens)",
+            lambda: list(iter_chunk_offsets(text, chunk_size_tokens, CHUNK_OVERLAP_TOKENS, token_starts(text, tokenizer)))
+        ))
+        pipelines.append((
+            "sentence_offsets por páginas (tokens)",
+            lambda: [
+                (start, end) for _, start, end in iter_chunks_stream(
+                    pages, chunk_size_tokens, CHUNK_OVERLAP_TOKENS, lambda part: token_starts(part, tokenizer)
+                )
+            ]
+        ))
+    except Exception as e:
+        print(f"Tokenizer {tokenizer_name} no disponible, se omite el troceado por tokens: {e}", file=sys.stderr)
+
+    results = []
+
+    for name, pipeline in pipelines:
+        times = []
+        offsets = []
+        for _ in range(repeats):
+            start_time = time.perf_counter()
+            offsets = pipeline()
+            times.append(time.perf_counter() - start_time)
+
+        best_time = min(times)
+        missing = uncovered_ranges(text, offsets)
+        results.append({
+            "pipeline": name,
+            "chunks": len(offsets),
+            "best_time": best_time,
+            "mb_per_second": len(text) / (1024 * 1024) / best_time if best_time > 0 else 0,
+            "uncovered_ranges": len(missing),
+            "uncovered_chars": sum(end - start for start, end in missing),
+            "first_uncovered_offset": missing[0][0] if missing else None
+        })
+
+    # rfind es la referencia antigua; los troceadores del agente no pueden perder texto
+    lossy = [
+        f"{result['pipeline']} ({result['uncovered_chars']} caracteres desde el offset {result['first_uncovered_offset']})"
+        for result in results
+        if result["uncovered_ranges"] and not result["pipeline"].startswith("rfind")
+    ]
+    if lossy:
+        raise RuntimeError(f"Texto sin cubrir por los chunks: {'; '.join(lossy)}")
+
+    return {
+        "benchmark": "chunking",
+        "pdf_path": pdf_path,
+        "characters": len(text),
+        "repeats": repeats,
+        "results": results
+    }
+
+
+def _load_benchmark_documents(pdf_path: str):
+    from .rag_agent import RAGAgent
+
+    # Directorio propio: no se escriben cachés de páginas ni vectorstores en ./data
+    work_dir = tempfile.mkdtemp(prefix="rag-documents-bench-")
+    try:
+        agent = RAGAgent(
+            pdf_path=pdf_path,
+            vectorstore_path=f"{work_dir}/vectorstore",
+            page_cache_dir=f"{work_dir}/page_cache",
+            chunk_size=CHUNK_SIZE,
+            chunk_overlap=CHUNK_OVERLAP
+        )
+        return agent._load_documents()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def benchmark_embedding(
+    pdf_path: str = PDF_PATH,
+    batch_sizes: List[int] = None,
+    num_queries: int = 200
+) -> Dict[str, Any]:
+    from langchain_community.embeddings import SentenceTransformerEmbeddings
+    from .config import EVALUATION_QUESTIONS
+    from .embedding_cache import CachedEmbeddings
+
+    if batch_sizes is None:
+        batch_sizes = [1, 32, EMBEDDING_BATCH_SIZE]
+
+    texts = [doc.page_content for doc in _load_benchmark_documents(pdf_path)]
+    embedding_model = SentenceTransformerEmbeddings(model_name=EMBEDDING_MODEL)
+    embedding_model.embed_query("warm-up")
+
+    documents = []
+    for batch_size in batch_sizes:
+        start_time = time.perf_counter()
+        for i in range(0, len(texts), batch_size):
+            embedding_model.embed_documents(texts[i:i + batch_size])
+        wall_seconds = time.perf_counter() - start_time
+        documents.append({
+            "batch_size": batch_size,
+            "chunks": len(texts),
+            "wall_seconds": wall_seconds,
+            "chunks_per_second": len(texts) / wall_seconds if wall_seconds > 0 else 0
+        })
+
+    questions = [EVALUATION_QUESTIONS[i % len(EVALUATION_QUESTIONS)] + f" ({i})" for i in range(num_queries)]
+    cached = CachedEmbeddings(embedding_model, EMBEDDING_MODEL)
+    queries = {}
+    for name, model in [("sin caché", embedding_model), ("caché fría", cached), ("caché caliente", cached)]:
+        times = []
+        for question in questions:
+            start_time = time.perf_counter()
+            model.embed_query(question)
+            times.append(time.perf_counter() - start_time)
+        queries[name] = _latency_summary(times)
+
+    return {
+        "benchmark": "embedding",
+        "embedding_model": EMBEDDING_MODEL,
+        "documents": documents,
+        "query_latency": queries
+    }
+
+
+def benchmark_query_batching(
+    concurrency_levels: List[int] = None,
+    queries_per_level: int = 256,
+    window_ms: float = QUERY_BATCH_WINDOW_MS,
+    max_batch_size: int = QUERY_BATCH_MAX_SIZE
+) -> Dict[str, Any]:
+    from concurrent.futures import ThreadPoolExecutor
+    from langchain_community.embeddings import SentenceTransformerEmbeddings
+    from .config import EVALUATION_QUESTIONS
+    from .embedding_batcher import BatchingEmbeddings
+    from .embedding_cache import LockedEmbeddings
+
+    if concurrency_levels is None:
+        concurrency_levels = [1, 4, 16, 64]
+
+    model = LockedEmbeddings(SentenceTransformerEmbeddings(model_name=EMBEDDING_MODEL))
+    model.embed_query("warm-up")
+    results = []
+
+    for concurrency in concurrency_levels:
+        # Preguntas distintas en cada nivel: sin caché, todas llegan al modelo
+        questions = [
+            EVALUATION_QUESTIONS[i % len(EVALUATION_QUESTIONS)] + f" ({concurrency}-{i})"
+            for i in range(queries_per_level)
+        ]
+        for name, embeddings in [
+            ("una pasada por pregunta", model),
+            (f"lotes (ventana {window_ms} ms)", BatchingEmbeddings(model, window_ms=window_ms, max_batch_size=max_batch_size))
+        ]:
+            times = []
+
+            def embed(question):
+                start_time = time.perf_counter()
+                embeddings.embed_query(question)
+                times.append(time.perf_counter() - start_time)
+
+            start_time = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                list(executor.map(embed, questions))
+            wall_seconds = time.perf_counter() - start_time
+
+            result = {
+                "pipeline": name,
+                "concurrency": concurrency,
+                "queries": len(questions),
+                "queries_per_second": len(questions) / wall_seconds if wall_seconds > 0 else 0,
+                "latency": _latency_summary(times)
+            }
+            if isinstance(embeddings, BatchingEmbeddings):
+                result["batching"] = embeddings.batch_stats()
+            results.append(result)
+
+    return {
+        "benchmark": "query_batching",
+        "embedding_model": EMBEDDING_MODEL,
+        "results": results
+    }
+
+
+_EMBEDDING_BACKEND_SCRIPT = """
+import json, sys, time
+backend, model_name, onnx_dir, queries, documents = json.loads(sys.argv[1])
+start_time = time.perf_counter()
+from src.embedding_backends import create_embeddings
+embeddings = create_embeddings(backend, model_name, onnx_cache_dir=onnx_dir)
+embeddings.embed_query("warm-up")
+load_seconds = time.perf_counter() - start_time
+times, query_vectors = [], []
+for query in queries:
+    query_start = time.perf_counter()
+    query_vectors.append(embeddings.embed_query(query))
+    times.append(time.perf_counter() - query_start)
+batch_start = time.perf_counter()
+document_vectors = embeddings.embed_documents(documents)
+batch_seconds = time.perf_counter() - batch_start
+from src.load_test import _max_rss_mb
+print(json.dumps({
+    "load_seconds": load_seconds,
+    "query_times": times,
+    "batch_seconds": batch_seconds,
+    "max_rss_mb": _max_rss_mb(),
+    "query_vectors": query_vectors,
+    "document_vectors": document_vectors
+}))
+"""
+
+
+def benchmark_embedding_backends(
+    pdf_path: str = PDF_PATH,
+    backends: List[str] = None,
+    num_queries: int = 100,
+    num_documents: int = 256,
+    k: int = 5
+) -> Dict[str, Any]:
+    import numpy as np
+    from .config import EVALUATION_QUESTIONS, ONNX_MODEL_DIR
+    from .embedding_backends import EMBEDDING_BACKENDS, embedding_parity
+
+    backends = backends or EMBEDDING_BACKENDS
+    queries = [EVALUATION_QUESTIONS[i % len(EVALUATION_QUESTIONS)] + f" ({i})" for i in range(num_queries)]
+    documents = [doc.page_content for doc in _load_benchmark_documents(pdf_path)][:num_documents]
+
+    # La primera ejecución exporta el modelo ONNX si no está en disco; no se mide
+    for backend in backends:
+        if backend != "torch":
+            _run_python(_EMBEDDING_BACKEND_SCRIPT, [backend, EMBEDDING_MODEL, ONNX_MODEL_DIR, [], []])
+
+    runs = {
+        backend: _run_python(_EMBEDDING_BACKEND_SCRIPT, [backend, EMBEDDING_MODEL, ONNX_MODEL_DIR, queries, documents])
+        for backend in backends
+    }
+    reference = runs.get("torch")
+    results = []
+
+    for backend, run in runs.items():
+        result = {
+            "backend": backend,
+            "load_seconds": run["load_seconds"],
+            "max_rss_mb": run["max_rss_mb"],
+            "query_latency": _latency_summary(run["query_times"]),
+            "chunks_per_second": len(documents) / run["batch_seconds"] if run["batch_seconds"] > 0 else 0
+        }
+        if reference is not None and backend != "torch":
+            result["parity"] = {
+                "queries": embedding_parity(reference["query_vectors"], run["query_vectors"]),
+                "documents": embedding_parity(reference["document_vectors"], run["document_vectors"])
+            }
+            # Consultas de este backend contra el índice construido con PyTorch
+            index = np.asarray(reference["document_vectors"], dtype=np.float32)
+            exact = np.argsort(-(np.asarray(reference["query_vectors"]) @ index.T), axis=1)[:, :k]
+            found = np.argsort(-(np.asarray(run["query_vectors"]) @ index.T), axis=1)[:, :k]
+            result["parity"][f"recall@{k}"] = float(np.mean([
+                len(set(a) & set(b)) / k for a, b in zip(found.tolist(), exact.tolist())
+            ]))
+        results.append(result)
+
+    return {
+        "benchmark": "embedding_backends",
+        "embedding_model": EMBEDDING_MODEL,
+        "queries": len(queries),
+        "documents": len(documents),
+        "results": results
+    }
+
+
+def benchmark_indexing(
+    pdf_path: str = PDF_PATH,
+    embed_batch_sizes: List[int] = None,
+    legacy_batch_size: int = 5
+) -> Dict[str, Any]:
+    from langchain_community.embeddings import SentenceTransformerEmbeddings
+    from langchain_community.vectorstores import Chroma
+    from .indexing import BulkIndexer, chroma_max_batch_size
+
+    if embed_batch_sizes is None:
+        embed_batch_sizes = [32, EMBEDDING_BATCH_SIZE]
+
+    documents = _load_benchmark_documents(pdf_path)
+    embedding_model = SentenceTransformerEmbeddings(model_name=EMBEDDING_MODEL)
+    embedding_model.embed_query("warm-up")
+    results = []
+
+    work_dir = tempfile.mkdtemp(prefix="rag-index-bench-")
+    try:
+        start_time = time.perf_counter()
+        vectorstore = Chroma(persist_directory=f"{work_dir}/legacy", embedding_function=embedding_model)
+        for i in range(0, len(documents), legacy_batch_size):
+            vectorstore.add_documents(documents[i:i + legacy_batch_size])
+        wall_seconds = time.perf_counter() - start_time
+        results.append({
+            "pipeline": f"add_documents (lotes de {legacy_batch_size})",
+            "chunks": len(documents),
+            "wall_seconds": wall_seconds,
+            "chunks_per_second": len(documents) / wall_seconds if wall_seconds > 0 else 0
+        })
+
+        for embed_batch_size in embed_batch_sizes:
+            vectorstore = Chroma(
+                persist_directory=f"{work_dir}/bulk-{embed_batch_size}",
+                embedding_function=embedding_model
+            )
+            indexer = BulkIndexer(
+                vectorstore._collection,
+                embedding_model,
+                embed_batch_size=embed_batch_size,
+                write_batch_size=chroma_max_batch_size(vectorstore._client)
+            )
+            report = indexer.index(
+                [str(uuid.uuid4()) for _ in documents],
+                [doc.page_content for doc in documents],
+                [doc.metadata for doc in documents]
+            )
+            report["pipeline"] = f"BulkIndexer (lotes de {embed_batch_size})"
+            results.append(report)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    baseline = results[0]["chunks_per_second"] or 1
+
+    for result in results:
+        result["speedup"] = result["chunks_per_second"] / baseline
+
+    return {
+        "benchmark": "indexing",
+        "pdf_path": pdf_path,
+        "embedding_model": EMBEDDING_MODEL,
+        "results": results
+    }
+
+
+def _latency_summary(times: List[float]) -> Dict[str, float]:
+    ordered = sorted(times)
+    return {
+        "mean_ms": sum(ordered) / len(ordered) * 1000,
+        "p50_ms": ordered[len(ordered) // 2] * 1000,
+        "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000
+    }
+
+
+def benchmark_vector_index(
+    vectorstore_path: str = VECTORSTORE_PATH,
+    num_queries: int = 200,
+    k: int = 3
+) -> Dict[str, Any]:
+    import numpy as np
+    from langchain_community.vectorstores import Chroma
+    from .vector_index import ChromaIndex, INDEX_CLASSES, faiss_available
+
+    work_dir = tempfile.mkdtemp(prefix="rag-vector-index-bench-")
+    results = []
+
+    try:
+        store_copy = f"{work_dir}/vectorstore"
+        shutil.copytree(vectorstore_path, store_copy)
+
+        start_time = time.perf_counter()
+        vectorstore = Chroma(persist_directory=store_copy)
+        count = vectorstore._collection.count()
+        chroma_load = time.perf_counter() - start_time
+
+        stored = np.asarray(vectorstore._collection.get(include=["embeddings"])["embeddings"], dtype=np.float32)
+        rng = np.random.default_rng(0)
+        queries = stored[rng.integers(0, len(stored), num_queries)]
+        queries = queries + rng.normal(0, 0.05, queries.shape).astype(np.float32)
+
+        chroma_index = ChromaIndex(vectorstore)
+        backends = [("chroma", chroma_index, chroma_load)]
+
+        for backend in ["numpy", "faiss", "int8"]:
+            if backend == "faiss" and not faiss_available():
+                continue
+            directory = f"{work_dir}/{backend}_index"
+            INDEX_CLASSES[backend].from_chroma(vectorstore).save(directory)
+            start_time = time.perf_counter()
+            index = INDEX_CLASSES[backend].load(directory)
+            backends.append((backend, index, time.perf_counter() - start_time))
+
+        reference = None
+        for backend, index, load_seconds in backends:
+            times = []
+            found = []
+            for query in queries:
+                query_start = time.perf_counter()
+                documents = index.search(query.tolist(), k)
+                times.append(time.perf_counter() - query_start)
+                found.append({doc.metadata.get("chunk_id") for doc in documents})
+
+            if reference is None:
+                reference = found
+            agreement = sum(len(a & b) for a, b in zip(found, reference)) / max(1, sum(len(b) for b in reference))
+
+            results.append({
+                "backend": backend,
+                "vectors": count,
+                "load_seconds": load_seconds,
+                "query_latency": _latency_summary(times),
+                "agreement_with_chroma": agreement
+            })
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        "benchmark": "vector_index",
+        "vectorstore_path": vectorstore_path,
+        "num_queries": num_queries,
+        "k": k,
+        "results": results
+    }
+
+
+def _directory_bytes(directory: str) -> int:
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(directory)
+        for name in names
+    )
+
+
+def benchmark_quantization(
+    vectorstore_path: str = VECTORSTORE_PATH,
+    num_queries: int = 200,
+    ks: List[int] = None,
+    rescore_factors: List[int] = None
+) -> Dict[str, Any]:
+    import numpy as np
+    from langchain_community.vectorstores import Chroma
+    from .vector_index import Int8Index, NumpyIndex
+
+    ks = ks or [1, 3, 5, 10]
+    rescore_factors = rescore_factors or [1, 2, 4, 8]
+    depth = max(ks)
+
+    work_dir = tempfile.mkdtemp(prefix="rag-quantization-bench-")
+    results = []
+
+    try:
+        store_copy = f"{work_dir}/vectorstore"
+        shutil.copytree(vectorstore_path, store_copy)
+        vectorstore = Chroma(persist_directory=store_copy)
+
+        stored = np.asarray(vectorstore._collection.get(include=["embeddings"])["embeddings"], dtype=np.float32)
+        rng = np.random.default_rng(0)
+        queries = stored[rng.integers(0, len(stored), num_queries)]
+        queries = queries + rng.normal(0, 0.05, queries.shape).astype(np.float32)
+
+        indexes = []
+        for index_class in [NumpyIndex, Int8Index]:
+            directory = f"{work_dir}/{index_class.backend}_index"
+            index_class.from_chroma(vectorstore).save(directory)
+            indexes.append((index_class.load(directory), _directory_bytes(directory)))
+
+        def run(index):
+            times, found = [], []
+            for query in queries:
+                query_start = time.perf_counter()
+                documents = index.search(query.tolist(), depth)
+                times.append(time.perf_counter() - query_start)
+                found.append([doc.id for doc in documents])
+            return times, found
+
+        (exact_index, exact_disk), (int8_index, int8_disk) = indexes
+        exact_times, reference = run(exact_index)
+        results.append({
+            "backend": "numpy (float32)",
+            "memory_bytes": exact_index.memory_bytes(),
+            "disk_bytes": exact_disk,
+            "query_latency": _latency_summary(exact_times),
+            **{f"recall@{k}": 1.0 for k in ks}
+        })
+
+        for rescore_factor in rescore_factors:
+            int8_index.rescore_factor = rescore_factor
+            times, found = run(int8_index)
+            result = {
+                "backend": f"int8 (reordenación x{rescore_factor})",
+                "memory_bytes": int8_index.memory_bytes(),
+                "disk_bytes": int8_disk,
+                "query_latency": _latency_summary(times)
+            }
+            # Recall frente a la búsqueda exacta float32
+            for k in ks:
+                result[f"recall@{k}"] = float(np.mean([
+                    len(set(approx[:k]) & set(exact[:k])) / k for approx, exact in zip(found, reference)
+                ]))
+            results.append(result)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    float32_bytes = results[0]["memory_bytes"] or 1
+    float32_disk = results[0]["disk_bytes"] or 1
+    for result in results:
+        result["memory_ratio"] = result["memory_bytes"] / float32_bytes
+        # int8 guarda los códigos además de la matriz float32 para reordenar: en disco ocupa más
+        result["disk_ratio"] = result["disk_bytes"] / float32_disk
+
+    return {
+        "benchmark": "quantization",
+        "vectorstore_path": vectorstore_path,
+        "vectors": len(stored),
+        "dim": int(stored.shape[1]) if stored.ndim == 2 else 0,
+        "num_queries": num_queries,
+        "results": results
+    }
+
+
+def benchmark_hybrid_retrieval(
+    vectorstore_path: str = VECTORSTORE_PATH,
+    k: int = 3,
+    candidates: int = 20,
+    repeats: int = 20
+) -> Dict[str, Any]:
+    import numpy as np
+    from langchain_community.embeddings import SentenceTransformerEmbeddings
+    from langchain_community.vectorstores import Chroma
+    from .config import EVALUATION_QUESTIONS, RRF_K
+    from .lexical_index import BM25Index, hybrid_search_many, tokenize
+    from .vector_index import ChromaIndex, NumpyIndex
+
+    work_dir = tempfile.mkdtemp(prefix="rag-hybrid-bench-")
+    results = []
+
+    try:
+        store_copy = f"{work_dir}/vectorstore"
+        shutil.copytree(vectorstore_path, store_copy)
+        vectorstore = Chroma(persist_directory=store_copy)
+
+        numpy_index = NumpyIndex.from_chroma(vectorstore)
+        ids, texts = numpy_index.contents()
+
+        start_time = time.perf_counter()
+        lexical_index = BM25Index.build(ids, texts)
+        build_seconds = time.perf_counter() - start_time
+        lexical_index.save(f"{work_dir}/bm25_index")
+
+        # Consultas de término exacto: un término que solo aparece en un chunk
+        document_frequency = np.diff(lexical_index.indptr)
+        exact_queries = []
+        for doc_id, text in zip(ids, texts):
+            unique = [
+                term for term in dict.fromkeys(tokenize(text))
+                if len(term) > 3 and document_frequency[lexical_index.vocabulary[term]] == 1
+            ]
+            if unique:
+                exact_queries.append((unique[0], doc_id))
+
+        questions = list(EVALUATION_QUESTIONS) + [term for term, _ in exact_queries]
+        embedding_model = SentenceTransformerEmbeddings(model_name=EMBEDDING_MODEL)
+        query_embeddings = embedding_model.embed_documents(questions)
+
+        for backend, index in [("chroma", ChromaIndex(vectorstore)), ("numpy", numpy_index)]:
+            timings = {"dense": [], "hybrid": []}
+            found = {}
+
+            for mode in timings:
+                for _ in range(repeats):
+                    for question, query_embedding in zip(questions, query_embeddings):
+                        query_start = time.perf_counter()
+                        if mode == "dense":
+                            documents = index.search_many([query_embedding], k)[0]
+                        else:
+                            documents = hybrid_search_many(
+                                index, lexical_index, [question], [query_embedding], k,
+                                candidates=candidates, rrf_k=RRF_K
+                            )[0]
+                        timings[mode].append(time.perf_counter() - query_start)
+                        found[(mode, question)] = {doc.id for doc in documents}
+
+            dense_latency = _latency_summary(timings["dense"])
+            hybrid_latency = _latency_summary(timings["hybrid"])
+            results.append({
+                "backend": backend,
+                "dense_latency": dense_latency,
+                "hybrid_latency": hybrid_latency,
+                "added_p50_ms": hybrid_latency["p50_ms"] - dense_latency["p50_ms"],
+                "added_p95_ms": hybrid_latency["p95_ms"] - dense_latency["p95_ms"],
+                "exact_term_recall": {
+                    mode: sum(doc_id in found[(mode, term)] for term, doc_id in exact_queries) / max(1, len(exact_queries))
+                    for mode in timings
+                }
+            })
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        "benchmark": "hybrid_retrieval",
+        "vectorstore_path": vectorstore_path,
+        "chunks": len(lexical_index),
+        "terms": len(lexical_index.terms),
+        "postings": len(lexical_index.rows),
+        "build_seconds": build_seconds,
+        "exact_term_queries": len(exact_queries),
+        "k": k,
+        "candidates": candidates,
+        "results": results
+    }
+
+
+def benchmark_rerank(
+    vectorstore_path: str = VECTORSTORE_PATH,
+    candidate_options: List[int] = None,
+    batch_sizes: List[int] = None
+) -> Dict[str, Any]:
+    from langchain_community.vectorstores import Chroma
+    from .config import EVALUATION_QUESTIONS, RERANK_MODEL
+    from .reranker import CrossEncoderReranker
+    from .vector_index import NumpyIndex
+
+    if candidate_options is None:
+        candidate_options = [10, 30]
+    if batch_sizes is None:
+        batch_sizes = [1, 32]
+
+    work_dir = tempfile.mkdtemp(prefix="rag-rerank-bench-")
+    try:
+        store_copy = f"{work_dir}/vectorstore"
+        shutil.copytree(vectorstore_path, store_copy)
+        index = NumpyIndex.from_chroma(Chroma(persist_directory=store_copy))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    documents = index.get_documents(index.ids)
+    reranker = CrossEncoderReranker(RERANK_MODEL)
+    start_time = time.perf_counter()
+    reranker.load()
+    load_seconds = time.perf_counter() - start_time
+
+    results = []
+    for candidates in candidate_options:
+        pool = (documents * (candidates // max(1, len(documents)) + 1))[:candidates]
+        for batch_size in batch_sizes:
+            reranker.batch_size = batch_size
+            cold = []
+            cached = []
+            for question in EVALUATION_QUESTIONS:
+                reranker.cache.clear()
+                query_start = time.perf_counter()
+                reranker.rerank(question, pool, top_k=3)
+                cold.append(time.perf_counter() - query_start)
+
+                query_start = time.perf_counter()
+                reranker.rerank(question, pool, top_k=3)
+                cached.append(time.perf_counter() - query_start)
+
+            results.append({
+                "candidates": candidates,
+                "batch_size": batch_size,
+                "cold_latency": _latency_summary(cold),
+                "cached_latency": _latency_summary(cached)
+            })
+
+    return {
+        "benchmark": "rerank",
+        "model": RERANK_MODEL,
+        "load_seconds": load_seconds,
+        "results": results
+    }
+
+
+HEAVY_MODULES = ["langchain_community", "sentence_transformers", "torch", "pdfplumber", "chromadb", "langchain_openai"]
+
+_IMPORT_SCRIPT = """
+import json, sys, time
+start_time = time.perf_counter()
+import src.rag_agent
+print(json.dumps({
+    "seconds": time.perf_counter() - start_time,
+    "heavy_modules": [name for name in json.loads(sys.argv[1]) if name in sys.modules]
+}))
+"""
+
+_FIRST_ANSWER_SCRIPT = """
+import json, sys, time
+start_time = time.perf_counter()
+from src.rag_agent import create_certification_agent
+pdf_path, vectorstore_path, index_backend, background = json.loads(sys.argv[1])
+agent = create_certification_agent(
+    pdf_path, vectorstore_path, background=background, llm_backend="fake",
+    index_backend=index_backend, use_answer_cache=False
+)
+agent_seconds = time.perf_counter() - start_time
+result = agent.ask("¿Qué servicios de AWS se usan para entrenar modelos?")
+print(json.dumps({
+    "time_to_agent": agent_seconds,
+    "time_to_first_answer": time.perf_counter() - start_time,
+    "success": result["success"],
+    "startup_seconds": agent.get_stats()["startup_seconds"]
+}))
+"""
+
+
+def _run_python(script: str, payload: Any) -> Dict[str, Any]:
+    completed = subprocess.run(
+        [sys.executable, "-c", script, json.dumps(payload)],
+        cwd=PROJECT_ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+        env={**os.environ, "TOKENIZERS_PARALLELISM": "false"}
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def benchmark_startup(
+    pdf_path: str = PDF_PATH,
+    vectorstore_path: str = VECTORSTORE_PATH,
+    index_backend: str = INDEX_BACKEND,
+    repeats: int = 3
+) -> Dict[str, Any]:
+    imports = [_run_python(_IMPORT_SCRIPT, HEAVY_MODULES) for _ in range(repeats)]
+
+    work_dir = tempfile.mkdtemp(prefix="rag-startup-bench-")
+    results = []
+
+    try:
+        store_copy = f"{work_dir}/vectorstore"
+        shutil.copytree(vectorstore_path, store_copy)
+        # La primera ejecución construye los índices guardados; no se mide
+        _run_python(_FIRST_ANSWER_SCRIPT, [pdf_path, store_copy, index_backend, False])
+
+        for background in [False, True]:
+            runs = [
+                _run_python(_FIRST_ANSWER_SCRIPT, [pdf_path, store_copy, index_backend, background])
+                for _ in range(repeats)
+            ]
+            best = min(runs, key=lambda run: run["time_to_first_answer"])
+            results.append({
+                "mode": "background" if background else "eager",
+                "time_to_agent": min(run["time_to_agent"] for run in runs),
+                "time_to_first_answer": best["time_to_first_answer"],
+                "startup_seconds": best["startup_seconds"],
+                "success": all(run["success"] for run in runs)
+            })
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        "benchmark": "startup",
+        "index_backend": index_backend,
+        "repeats": repeats,
+        "import_seconds": min(run["seconds"] for run in imports),
+        "heavy_modules_on_import": imports[0]["heavy_modules"],
+        "results": results
+    }
+
+
+_SNAPSHOT_STARTUP_SCRIPT = """
+import json, sys, time
+start_time = time.perf_counter()
+from src.rag_agent import create_certification_agent
+from src.load_test import _max_rss_mb
+pdf_path, vectorstore_path, index_backend, retrieval_mode, snapshot_path, export_path = json.loads(sys.argv[1])
+agent = create_certification_agent(
+    pdf_path, vectorstore_path, llm_backend="fake", index_backend=index_backend, retrieval_mode=retrieval_mode,
+    snapshot_path=snapshot_path, use_answer_cache=False, enable_metrics=True
+)
+ready_seconds = time.perf_counter() - start_time
+spans = agent.metrics.snapshot()
+if export_path:
+    agent.export_snapshot(export_path)
+result = agent.ask("¿Qué servicios de AWS se usan para entrenar modelos?")
+print(json.dumps({
+    "time_to_ready": ready_seconds,
+    "index_seconds": sum(
+        spans[stage]["mean"] for stage in ("init_manifest", "init_index", "init_lexical_index") if stage in spans
+    ),
+    "max_rss_mb": _max_rss_mb(),
+    "success": result["success"]
+}))
+"""
+
+
+def benchmark_snapshot(
+    pdf_path: str = PDF_PATH,
+    vectorstore_path: str = VECTORSTORE_PATH,
+    retrieval_mode: str = RETRIEVAL_MODE,
+    repeats: int = 3
+) -> Dict[str, Any]:
+    work_dir = tempfile.mkdtemp(prefix="rag-snapshot-bench-")
+    results = []
+
+    try:
+        store_copy = f"{work_dir}/vectorstore"
+        snapshot_path = f"{work_dir}/index.ragsnap"
+        shutil.copytree(vectorstore_path, store_copy)
+        # Sin medir: deja el vectorstore, el índice numpy y el BM25 al día y exporta el snapshot
+        _run_python(_SNAPSHOT_STARTUP_SCRIPT, [pdf_path, store_copy, "numpy", retrieval_mode, None, snapshot_path])
+
+        modes = [
+            ("chroma", "chroma", None),
+            ("numpy", "numpy", None),
+            ("snapshot", "numpy", snapshot_path)
+        ]
+        for mode, index_backend, snapshot in modes:
+            runs = [
+                _run_python(_SNAPSHOT_STARTUP_SCRIPT, [pdf_path, store_copy, index_backend, retrieval_mode, snapshot, None])
+                for _ in range(repeats)
+            ]
+            results.append({
+                "mode": mode,
+                "time_to_ready": min(run["time_to_ready"] for run in runs),
+                "index_seconds": min(run["index_seconds"] for run in runs),
+                "max_rss_mb": min(run["max_rss_mb"] or 0 for run in runs),
+                "success": all(run["success"] for run in runs)
+            })
+        snapshot_bytes = os.path.getsize(snapshot_path)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    baseline = results[0]["index_seconds"] or 1
+    for result in results:
+        result["index_speedup"] = baseline / result["index_seconds"] if result["index_seconds"] > 0 else 0
+
+    return {
+        "benchmark": "snapshot",
+        "retrieval_mode": retrieval_mode,
+        "repeats": repeats,
+        "snapshot_bytes": snapshot_bytes,
+        "results": results
+    }
+
+
+BENCHMARKS = {
+    "pdf_extraction": benchmark_pdf_extraction,
+    "chunking": benchmark_chunking,
+    "embedding": benchmark_embedding,
+    "query_batching": benchmark_query_batching,
+    "embedding_backends": benchmark_embedding_backends,
+    "indexing": benchmark_indexing,
+    "vector_index": benchmark_vector_index,
+    "quantization": benchmark_quantization,
+    "hybrid_retrieval": benchmark_hybrid_retrieval,
+    "rerank": benchmark_rerank,
+    "startup": benchmark_startup,
+    "snapshot": benchmark_snapshot
+}
+
+
+def main(argv: List[str] = None):
+    argv = sys.argv[1:] if argv is None else argv
+    names = argv or list(BENCHMARKS)
+
+    for name in names:
+        if name not in BENCHMARKS:
+            print(f"Benchmark desconocido: {name}. Disponibles: {', '.join(BENCHMARKS)}")
+            sys.exit(1)
+
+    report = {name: BENCHMARKS[name]() for name in names}
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
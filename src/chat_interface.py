@@ -1,7 +1,7 @@
 import streamlit as st
 import time
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator
 import logging
 import sys
 from pathlib import Path
@@ -9,6 +9,8 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent))
 
 from rag_agent import create_certification_agent, RAGAgent
+from corpus import create_corpus_agent
+from metrics import start_metrics_server
 from config import CHAT_CONFIG, LOGS_DIR
 
 logging.basicConfig(
@@ -19,53 +21,58 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+@st.cache_resource(show_spinner=False)
+def get_shared_agent() -> RAGAgent:
+    # Un único agente (modelo de embeddings, índice y cliente LLM) para todas las
+    # sesiones; cada ChatInterface mantiene su propio historial y estadísticas
+    from config import agent_settings, corpus_settings, CORPUS_DIR, METRICS_ENABLED, METRICS_HOST, METRICS_PORT
+    
+    if CORPUS_DIR:
+        agent = create_corpus_agent(background=True, **corpus_settings())
+    else:
+        agent = create_certification_agent(background=True, **agent_settings())
+    
+    if METRICS_ENABLED and METRICS_PORT:
+        start_metrics_server(agent.prometheus_metrics, host=METRICS_HOST, port=METRICS_PORT)
+    
+    logger.info("Agente RAG compartido creado, cargando modelo e índice en segundo plano")
+    return agent
+
+
 class ChatInterface:
     def __init__(self):
         self.agent = None
         self.conversation_history = []
-        self.stats = {
+        self.stats = self._initial_stats()
+
+    @staticmethod
+    def _initial_stats() -> Dict[str, Any]:
+        return {
             "total_questions": 0,
             "avg_response_time": 0,
-            "total_response_time": 0
+            "total_response_time": 0,
+            "cache_hits": 0,
+            "cache_misses": 0,
+            "cache_hit_rate": 0,
+            "total_hit_response_time": 0,
+            "total_miss_response_time": 0,
+            "avg_hit_response_time": 0,
+            "avg_miss_response_time": 0,
+            "streamed_questions": 0,
+            "total_time_to_first_token": 0,
+            "avg_time_to_first_token": 0
         }
 
     def initialize_agent(self):
-        if self.agent is None:
-            try:
-                from config import PDF_PATH, VECTORSTORE_PATH
-                import os
-                
-                status_placeholder = st.empty()
-                progress_bar = st.progress(0)
-                
-                vectorstore_exists = os.path.exists(VECTORSTORE_PATH)
-                
-                if vectorstore_exists:
-                    status_placeholder.info("Cargando vectorstore existente...")
-                    progress_bar.progress(30)
-                else:
-                    status_placeholder.warning("Primera inicialización, procesando PDF...")
-                    progress_bar.progress(10)
-                
-                self.agent = create_certification_agent(
-                    pdf_path=PDF_PATH,
-                    vectorstore_path=VECTORSTORE_PATH
-                )
-                
-                progress_bar.progress(100)
-                status_placeholder.success("Agente inicializado correctamente")
-                logger.info("Agente RAG inicializado")
-                
-                time.sleep(2)
-                status_placeholder.empty()
-                progress_bar.empty()
-                
-            except Exception as e:
-                st.error(f"Error al inicializar: {e}")
-                logger.error(f"Error: {e}")
-                import traceback
-                st.error(traceback.format_exc())
-                return False
+        try:
+            self.agent = get_shared_agent()
+            
+        except Exception as e:
+            st.error(f"Error al inicializar: {e}")
+            logger.error(f"Error: {e}")
+            import traceback
+            st.error(traceback.format_exc())
+            return False
         return True
 
     def add_message(self, role: str, content: str, metadata: Dict = None):
@@ -81,20 +88,38 @@ class ChatInterface:
         if len(self.conversation_history) > CHAT_CONFIG["max_history"]:
             self.conversation_history = self.conversation_history[-CHAT_CONFIG["max_history"]:]
 
+    def _record_response(self, result: Dict[str, Any], response_time: float):
+        self.stats["total_questions"] += 1
+        self.stats["total_response_time"] += response_time
+        self.stats["avg_response_time"] = self.stats["total_response_time"] / self.stats["total_questions"]
+        
+        if result.get("success"):
+            if result["metadata"].get("cache_hit"):
+                self.stats["cache_hits"] += 1
+                self.stats["total_hit_response_time"] += response_time
+                self.stats["avg_hit_response_time"] = self.stats["total_hit_response_time"] / self.stats["cache_hits"]
+            else:
+                self.stats["cache_misses"] += 1
+                self.stats["total_miss_response_time"] += response_time
+                self.stats["avg_miss_response_time"] = self.stats["total_miss_response_time"] / self.stats["cache_misses"]
+            self.stats["cache_hit_rate"] = self.stats["cache_hits"] / (self.stats["cache_hits"] + self.stats["cache_misses"])
+            
+            time_to_first_token = result["metadata"].get("time_to_first_token")
+            if time_to_first_token is not None:
+                self.stats["streamed_questions"] += 1
+                self.stats["total_time_to_first_token"] += time_to_first_token
+                self.stats["avg_time_to_first_token"] = self.stats["total_time_to_first_token"] / self.stats["streamed_questions"]
+            
+            result["metadata"]["response_time"] = response_time
+        
+        logger.info(f"Pregunta procesada en {response_time:.2f}s")
+
     def ask_question(self, question: str) -> Dict[str, Any]:
         start_time = time.time()
         
         try:
             result = self.agent.ask(question)
-            response_time = time.time() - start_time
-            
-            self.stats["total_questions"] += 1
-            self.stats["total_response_time"] += response_time
-            self.stats["avg_response_time"] = self.stats["total_response_time"] / self.stats["total_questions"]
-            
-            result["metadata"]["response_time"] = response_time
-            
-            logger.info(f"Pregunta procesada en {response_time:.2f}s")
+            self._record_response(result, time.time() - start_time)
             
             return result
             
@@ -107,6 +132,28 @@ class ChatInterface:
                 "metadata": {}
             }
 
+    def ask_question_stream(self, question: str) -> Iterator[Dict[str, Any]]:
+        start_time = time.time()
+        
+        try:
+            for event in self.agent.ask_stream(question):
+                if event["type"] == "end":
+                    result = {key: value for key, value in event.items() if key != "type"}
+                else:
+                    yield event
+            self._record_response(result, time.time() - start_time)
+            
+        except Exception as e:
+            logger.error(f"Error al procesar pregunta: {e}")
+            
+            result = {
+                "success": False,
+                "answer": "Error al procesar la pregunta.",
+                "metadata": {}
+            }
+        
+        yield {"type": "end", **result}
+
     def get_stats(self) -> Dict[str, Any]:
         stats = self.stats.copy()
         stats["conversation_length"] = len(self.conversation_history)
@@ -114,16 +161,14 @@ class ChatInterface:
         if self.agent:
             agent_stats = self.agent.get_stats()
             stats["vectorstore_documents"] = agent_stats.get("vectorstore_documents", 0)
+            stats["latency"] = agent_stats.get("latency")
+            stats["collections"] = agent_stats.get("collections")
         
         return stats
 
     def clear_history(self):
         self.conversation_history = []
-        self.stats = {
-            "total_questions": 0,
-            "avg_response_time": 0,
-            "total_response_time": 0
-        }
+        self.stats = self._initial_stats()
         logger.info("Historial limpiado")
 
 
@@ -145,6 +190,44 @@ def display_message(message: Dict[str, Any]):
                         st.divider()
 
 
+def stream_answer(chat_interface: ChatInterface, question: str) -> Dict[str, Any]:
+    result = None
+    
+    with st.chat_message("assistant"):
+        placeholder = st.empty()
+        placeholder.markdown("Procesando..." if chat_interface.agent.is_ready() else "Cargando modelo e índice...")
+        answer = ""
+        
+        for event in chat_interface.ask_question_stream(question):
+            if event["type"] == "token":
+                answer += event["content"]
+                placeholder.markdown(answer + "▌")
+            elif event["type"] == "end":
+                result = event
+        
+        placeholder.markdown(result["answer"])
+    
+    return result
+
+
+def display_latency(latency: Dict[str, Dict[str, float]]):
+    if not latency:
+        return
+    
+    # Percentiles de todas las sesiones del agente compartido, en milisegundos
+    with st.expander("Latencia por etapa"):
+        st.table([
+            {
+                "Etapa": stage,
+                "n": summary["count"],
+                "p50 (ms)": f"{summary['p50'] * 1000:.1f}",
+                "p95 (ms)": f"{summary['p95'] * 1000:.1f}",
+                "p99 (ms)": f"{summary['p99'] * 1000:.1f}"
+            }
+            for stage, summary in latency.items()
+        ])
+
+
 def create_sidebar(chat_interface: ChatInterface):
     with st.sidebar:
         st.header("Opciones")
@@ -164,15 +247,31 @@ def create_sidebar(chat_interface: ChatInterface):
             with col1:
                 st.metric("Preguntas", stats.get("total_questions", 0))
                 st.metric("Tiempo promedio", f"{stats.get('avg_response_time', 0):.2f}s")
+                st.metric("Primer token", f"{stats.get('avg_time_to_first_token', 0):.2f}s")
+                st.metric("Tiempo con caché", f"{stats.get('avg_hit_response_time', 0):.2f}s")
             with col2:
                 st.metric("Longitud chat", stats.get("conversation_length", 0))
-                if chat_interface.agent:
-                    st.metric("Documentos", stats.get("vectorstore_documents", 0))
+                st.metric("Aciertos de caché", f"{stats.get('cache_hit_rate', 0) * 100:.0f}%")
+                st.metric("Tiempo sin caché", f"{stats.get('avg_miss_response_time', 0):.2f}s")
+            if chat_interface.agent:
+                st.metric("Documentos", stats.get("vectorstore_documents", 0))
+                if stats.get("collections"):
+                    st.metric("Colecciones", len(stats["collections"]))
+                display_latency(stats.get("latency"))
         
         st.divider()
         st.subheader("Información")
         
-        if chat_interface.agent:
+        if chat_interface.agent and chat_interface.agent.initialization_error:
+            st.write("Estado: Error de inicialización")
+            st.caption(str(chat_interface.agent.initialization_error))
+            if st.button("Reintentar"):
+                get_shared_agent.clear()
+                st.rerun()
+        elif chat_interface.agent and not chat_interface.agent.is_ready():
+            st.write("Estado: Cargando modelo e índice...")
+            st.write(f"Modelo: {chat_interface.agent.llm_model}")
+        elif chat_interface.agent:
             st.write("Estado: Conectado")
             st.write(f"Modelo: {chat_interface.agent.llm_model}")
         else:
@@ -198,9 +297,11 @@ def main():
     
     chat_interface = st.session_state.chat_interface
     
+    agent_available = chat_interface.initialize_agent()
+    
     create_sidebar(chat_interface)
     
-    if not chat_interface.initialize_agent():
+    if not agent_available:
         st.error("No se pudo inicializar el agente")
         return
     
@@ -213,8 +314,12 @@ def main():
     if prompt := st.chat_input(CHAT_CONFIG["placeholder"]):
         chat_interface.add_message("user", prompt)
         
-        with st.spinner("Procesando..."):
-            result = chat_interface.ask_question(prompt)
+        if CHAT_CONFIG["stream_responses"]:
+            display_message(chat_interface.conversation_history[-1])
+            result = stream_answer(chat_interface, prompt)
+        else:
+            with st.spinner("Procesando..."):
+                result = chat_interface.ask_question(prompt)
         
         metadata = result.get("metadata", {})
         chat_interface.add_message("assistant", result["answer"], metadata)
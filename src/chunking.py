@@ -0,0 +1,257 @@
+import json
+import logging
+import os
+import re
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+CHUNK_UNITS = ["chars", "tokens"]
+TOKENIZE_BLOCK_SIZE = 1 << 14
+CHARS_PER_TOKEN = 4
+# Al trocear por páginas, las ventanas que acaban a menos de esto del final del
+# texto acumulado esperan a la página siguiente: la última palabra y el último
+# límite de frase aún pueden cambiar
+STREAM_MARGIN_CHARS = 128
+
+SENTENCE_BOUNDARY = re.compile(r"[.?!] ")
+
+
+def sentence_boundaries(text: str) -> List[int]:
+    # Posición justo después del signo de puntuación de cada ". ", "? " o "! "
+    return [match.start() + 1 for match in SENTENCE_BOUNDARY.finditer(text)]
+
+
+@lru_cache(maxsize=4)
+def load_tokenizer(model_name: str) -> Any:
+    from transformers import AutoTokenizer
+
+    return AutoTokenizer.from_pretrained(model_name)
+
+
+@lru_cache(maxsize=4)
+def _llm_encoding(model_name: str) -> Any:
+    try:
+        import tiktoken
+
+        return tiktoken.encoding_for_model(model_name)
+    except Exception as e:
+        logger.warning(f"Sin tokenizer para {model_name}, se estiman los tokens por caracteres: {e}")
+        return None
+
+
+@lru_cache(maxsize=4)
+def max_chunk_tokens(model_name: str) -> Optional[int]:
+    """Tokens de texto que caben en una pasada del modelo de embeddings.
+
+    Es el ``max_seq_length`` de sentence-transformers menos los tokens
+    especiales que añade el tokenizer ([CLS] y [SEP]); con más, el final del
+    chunk se trunca al calcular su embedding.
+    """
+    tokenizer = load_tokenizer(model_name)
+    max_seq_length = None
+
+    try:
+        if os.path.isdir(model_name):
+            config_path = os.path.join(model_name, "sentence_bert_config.json")
+        else:
+            from huggingface_hub import hf_hub_download
+
+            config_path = hf_hub_download(model_name, "sentence_bert_config.json")
+        with open(config_path, "r", encoding="utf-8") as f:
+            max_seq_length = json.load(f).get("max_seq_length")
+    except Exception as e:
+        logger.debug(f"Sin sentence_bert_config.json para {model_name}: {e}")
+
+    # model_max_length es un valor enorme cuando el tokenizer no define límite
+    if not max_seq_length and tokenizer.model_max_length < 1_000_000:
+        max_seq_length = tokenizer.model_max_length
+    if not max_seq_length:
+        return None
+    return max_seq_length - tokenizer.num_special_tokens_to_add()
+
+
+def count_llm_tokens(text: str, model_name: str) -> int:
+    encoding = _llm_encoding(model_name)
+    if encoding is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def _split_blocks(text: str, block_size: int) -> Tuple[List[str], List[int]]:
+    blocks = []
+    offsets = []
+    position = 0
+
+    while position < len(text):
+        end = min(position + block_size, len(text))
+        if end < len(text):
+            cut = text.rfind(" ", position, end)
+            if cut > position:
+                end = cut
+        blocks.append(text[position:end])
+        offsets.append(position)
+        position = end
+
+    return blocks, offsets
+
+
+def token_starts(text: str, tokenizer: Any, block_size: int = TOKENIZE_BLOCK_SIZE) -> List[int]:
+    # Se tokeniza por bloques cortados en espacios: el tokenizer rápido procesa el
+    # lote en paralelo y los offsets se trasladan de vuelta al texto completo
+    blocks, offsets = _split_blocks(text, block_size)
+    if not blocks:
+        return []
+
+    encoding = tokenizer(
+        blocks,
+        add_special_tokens=False,
+        return_offsets_mapping=True,
+        return_attention_mask=False,
+        return_token_type_ids=False,
+        verbose=False
+    )
+    return [
+        offset + start
+        for offset, mapping in zip(offsets, encoding["offset_mapping"])
+        for start, _ in mapping
+    ]
+
+
+def _strip(text: str, start: int, end: int) -> Tuple[int, int]:
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+def _chunk_windows(
+    text: str,
+    chunk_size: int,
+    chunk_overlap: int,
+    units: Optional[Sequence[int]] = None,
+    safe_end: Optional[int] = None
+) -> Iterator[Tuple[int, int, int]]:
+    # (inicio, fin, inicio de la siguiente ventana); con safe_end se detiene antes
+    # de la primera ventana que acabe más allá, sin consumirla
+    if chunk_size <= 0:
+        raise ValueError("chunk_size debe ser mayor que 0")
+
+    length = len(text)
+    boundaries = sentence_boundaries(text)
+
+    if units is None:
+        def to_unit(offset: int) -> int:
+            return offset
+
+        def to_offset(unit: int) -> int:
+            return min(unit, length)
+    else:
+        def to_unit(offset: int) -> int:
+            return bisect_left(units, offset)
+
+        def to_offset(unit: int) -> int:
+            return units[unit] if unit < len(units) else length
+
+    start = 0
+
+    while start < length:
+        start_unit = to_unit(start)
+        end = to_offset(start_unit + chunk_size)
+        if safe_end is not None and end > safe_end:
+            return
+
+        if end < length:
+            # El separador completo (". ") debe caber en la ventana
+            i = bisect_right(boundaries, end - 1) - 1
+            if i >= 0 and boundaries[i] > start + 1:
+                end = boundaries[i]
+
+        chunk_start, chunk_end = _strip(text, start, end)
+
+        if end >= length:
+            next_start = length
+        else:
+            next_start = to_offset(max(to_unit(end) - chunk_overlap, 0))
+            if next_start <= start:
+                # Chunk más corto que el solape: se continúa sin solape para no saltar texto
+                next_start = max(end, start + 1)
+
+        yield chunk_start, chunk_end, next_start
+        start = next_start
+
+
+def iter_chunk_offsets(
+    text: str,
+    chunk_size: int,
+    chunk_overlap: int,
+    units: Optional[Sequence[int]] = None
+) -> Iterator[Tuple[int, int]]:
+    """Genera (inicio, fin) de cada chunk sobre ``text`` en una sola pasada.
+
+    ``chunk_size`` y ``chunk_overlap`` se miden en caracteres o, si se pasa
+    ``units`` (offset de inicio de cada token), en tokens. El fin de cada chunk
+    se ajusta al último límite de frase dentro de la ventana.
+    """
+    for chunk_start, chunk_end, _ in _chunk_windows(text, chunk_size, chunk_overlap, units):
+        if chunk_start < chunk_end:
+            yield chunk_start, chunk_end
+
+
+def iter_chunks_stream(
+    parts: Iterable[str],
+    chunk_size: int,
+    chunk_overlap: int,
+    tokenize: Optional[Callable[[str], Sequence[int]]] = None
+) -> Iterator[Tuple[str, int, int]]:
+    """Trocea la concatenación de ``parts`` (páginas) sin unir el documento.
+
+    Genera (texto, inicio, fin) con offsets sobre el documento completo, igual
+    que ``iter_chunk_offsets``. Solo se guarda la cola que aún no forma un chunk
+    completo (más la página en curso), así que la memoria no crece con el PDF.
+    ``tokenize`` devuelve los offsets de inicio de cada token de un texto; sin
+    él se trocea por caracteres.
+    """
+    buffer = ""
+    base = 0
+    parts = iter(parts)
+    finished = False
+
+    while not finished:
+        part = next(parts, None)
+        if part is None:
+            finished = True
+        else:
+            buffer += part
+            if len(buffer) <= STREAM_MARGIN_CHARS:
+                continue
+
+        units = tokenize(buffer) if tokenize is not None else None
+        safe_end = None if finished else len(buffer) - STREAM_MARGIN_CHARS
+        resume = 0
+        for chunk_start, chunk_end, next_start in _chunk_windows(buffer, chunk_size, chunk_overlap, units, safe_end):
+            if chunk_start < chunk_end:
+                yield buffer[chunk_start:chunk_end], base + chunk_start, base + chunk_end
+            resume = next_start
+
+        buffer = buffer[resume:]
+        base += resume
+
+
+def uncovered_ranges(text: str, offsets: Sequence[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Tramos con texto no vacío que no aparecen en ningún chunk."""
+    missing = []
+    covered = 0
+
+    for start, end in sorted(offsets):
+        if start > covered and text[covered:start].strip():
+            missing.append((covered, start))
+        covered = max(covered, end)
+
+    if text[covered:].strip():
+        missing.append((covered, len(text)))
+
+    return missing
@@ -4,6 +4,8 @@ from pathlib import Path
 PROJECT_ROOT = Path(__file__).parent.parent
 DATA_DIR = PROJECT_ROOT / "data"
 VECTORSTORE_DIR = DATA_DIR / "vectorstore"
+EMBEDDING_CACHE_DIR = DATA_DIR / "embedding_cache"
+PAGE_CACHE_DIR = DATA_DIR / "page_cache"
 LOGS_DIR = PROJECT_ROOT / "logs"
 
 PDF_PATH = str(DATA_DIR / "AWS-ML.pdf")
@@ -11,14 +13,83 @@ ENV_FILE = str(PROJECT_ROOT / ".env")
 VECTORSTORE_PATH = str(VECTORSTORE_DIR)
 
 EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+# "torch", "onnx" u "onnx-int8" (ONNX Runtime en CPU; el modelo exportado se guarda en ONNX_MODEL_DIR)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+ONNX_MODEL_DIR = str(DATA_DIR / "onnx_models")
 LLM_MODEL = "gpt-3.5-turbo"
 LLM_TEMPERATURE = 0.1
 LLM_MAX_TOKENS = 500
+# "openai", "local" (servidor compatible con OpenAI en LLM_BASE_URL) o "fake" (sin red)
+LLM_BACKEND = os.getenv("LLM_BACKEND", "openai")
+LLM_BASE_URL = os.getenv("LLM_BASE_URL")
+LLM_MAX_CONNECTIONS = 20
+FAKE_LLM_LATENCY = 0.3
+FAKE_LLM_TOKENS_PER_SECOND = 50
 
 CHUNK_SIZE = 1500
 CHUNK_OVERLAP = 300
+CHUNK_UNIT = "tokens"
+# Se limita a max_seq_length del modelo menos los tokens especiales (254 en all-MiniLM-L6-v2)
+CHUNK_SIZE_TOKENS = 256
+CHUNK_OVERLAP_TOKENS = 48
 MAX_SOURCES = 3
 
+EMBEDDING_BATCH_SIZE = 256
+EMBEDDING_CACHE_MEMORY_ENTRIES = 4096
+EMBEDDING_CACHE_MAX_MB = 256
+# Preguntas concurrentes comparten una pasada del modelo de embeddings
+QUERY_BATCHING_ENABLED = True
+QUERY_BATCH_WINDOW_MS = 2.0
+QUERY_BATCH_MAX_SIZE = 32
+
+ANSWER_CACHE_ENABLED = True
+ANSWER_CACHE_THRESHOLD = 0.95
+ANSWER_CACHE_TTL = 3600
+ANSWER_CACHE_MAX_ENTRIES = 256
+# Preguntas idénticas en curso comparten una recuperación y una llamada al LLM
+COALESCE_REQUESTS = True
+
+INDEX_BACKEND = "auto"
+# Snapshot portable del índice (run_snapshot.py export/import). Con INDEX_SNAPSHOT_PATH el agente
+# lo mapea en solo lectura en lugar de abrir Chroma; sin valor se usa el vectorstore
+SNAPSHOT_PATH = str(DATA_DIR / "index.ragsnap")
+INDEX_SNAPSHOT_PATH = os.getenv("INDEX_SNAPSHOT_PATH")
+INDEX_SNAPSHOT_VERIFY = False
+RETRIEVAL_MODE = "hybrid"
+HYBRID_CANDIDATES = 20
+RRF_K = 60
+
+RERANK_ENABLED = False
+RERANK_MODEL = "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"
+RERANK_CANDIDATES = 30
+RERANK_BATCH_SIZE = 32
+CONTEXT_TOKEN_BUDGET = 1500
+
+METRICS_ENABLED = True
+METRICS_HOST = "127.0.0.1"
+# Puerto del endpoint Prometheus (/metrics). Solo se abre si se define METRICS_PORT: un puerto
+# fijo por defecto choca en cuanto se arranca un segundo proceso en la misma máquina
+METRICS_PORT = int(os.getenv("METRICS_PORT")) if os.getenv("METRICS_PORT") else None
+
+LLM_MAX_CONCURRENCY = 4
+LLM_MAX_RETRIES = 5
+
+PDF_EXTRACTION_WORKERS = max(1, min(4, (os.cpu_count() or 1) - 1))
+# "pdfplumber" (texto más fiel) o "pypdf" (más rápido)
+PDF_EXTRACTOR = os.getenv("PDF_EXTRACTOR", "pdfplumber")
+# Texto extraído por página: reindexar con otros chunks o embeddings no vuelve a parsear el PDF
+PAGE_CACHE_ENABLED = True
+
+# Directorio con varias guías PDF (una colección por documento); sin valor se usa solo PDF_PATH
+CORPUS_DIR = os.getenv("CORPUS_DIR")
+CORPUS_VECTORSTORE_PATH = str(DATA_DIR / "corpus")
+CORPUS_ROUTE_TOP_N = 2
+CORPUS_ROUTING_CENTROIDS = 4
+CORPUS_BUILD_WORKERS = max(1, min(4, (os.cpu_count() or 1) - 1))
+# Backend del índice por colección (nombre del PDF sin extensión), p. ej. {"guia_grande": "int8"};
+# las que no aparecen usan INDEX_BACKEND
+CORPUS_INDEX_BACKENDS = {}
+
 LOG_LEVEL = "INFO"
 LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 
@@ -33,6 +104,9 @@ REQUIRED_ENV_VARS = ["OPENAI_API_KEY"]
 
 
 def validate_environment():
+    if LLM_BACKEND != "openai":
+        return
+    
     missing_vars = []
     
     for var in REQUIRED_ENV_VARS:
@@ -45,6 +119,74 @@ def validate_environment():
         )
 
 
+def agent_settings() -> dict:
+    """Argumentos de ``create_certification_agent`` según esta configuración."""
+    return {
+        "pdf_path": PDF_PATH,
+        "vectorstore_path": VECTORSTORE_PATH,
+        "chunk_unit": CHUNK_UNIT,
+        "chunk_size": CHUNK_SIZE_TOKENS if CHUNK_UNIT == "tokens" else CHUNK_SIZE,
+        "chunk_overlap": CHUNK_OVERLAP_TOKENS if CHUNK_UNIT == "tokens" else CHUNK_OVERLAP,
+        "extraction_workers": PDF_EXTRACTION_WORKERS,
+        "pdf_extractor": PDF_EXTRACTOR,
+        "page_cache_dir": str(PAGE_CACHE_DIR),
+        "use_page_cache": PAGE_CACHE_ENABLED,
+        "embedding_model": EMBEDDING_MODEL,
+        "embedding_backend": EMBEDDING_BACKEND,
+        "onnx_model_dir": ONNX_MODEL_DIR,
+        "embedding_batch_size": EMBEDDING_BATCH_SIZE,
+        "embedding_cache_dir": str(EMBEDDING_CACHE_DIR),
+        "embedding_cache_memory_entries": EMBEDDING_CACHE_MEMORY_ENTRIES,
+        "embedding_cache_max_mb": EMBEDDING_CACHE_MAX_MB,
+        "batch_query_embeddings": QUERY_BATCHING_ENABLED,
+        "query_batch_window_ms": QUERY_BATCH_WINDOW_MS,
+        "query_batch_max_size": QUERY_BATCH_MAX_SIZE,
+        "use_answer_cache": ANSWER_CACHE_ENABLED,
+        "answer_cache_threshold": ANSWER_CACHE_THRESHOLD,
+        "answer_cache_ttl": ANSWER_CACHE_TTL,
+        "answer_cache_max_entries": ANSWER_CACHE_MAX_ENTRIES,
+        "coalesce_requests": COALESCE_REQUESTS,
+        "llm_model": LLM_MODEL,
+        "temperature": LLM_TEMPERATURE,
+        "llm_backend": LLM_BACKEND,
+        "llm_base_url": LLM_BASE_URL,
+        "llm_max_tokens": LLM_MAX_TOKENS,
+        "llm_max_connections": LLM_MAX_CONNECTIONS,
+        "fake_llm_latency": FAKE_LLM_LATENCY,
+        "fake_llm_tokens_per_second": FAKE_LLM_TOKENS_PER_SECOND,
+        "llm_max_concurrency": LLM_MAX_CONCURRENCY,
+        "llm_max_retries": LLM_MAX_RETRIES,
+        "index_backend": INDEX_BACKEND,
+        "snapshot_path": INDEX_SNAPSHOT_PATH,
+        "verify_snapshot": INDEX_SNAPSHOT_VERIFY,
+        "retrieval_mode": RETRIEVAL_MODE,
+        "hybrid_candidates": HYBRID_CANDIDATES,
+        "rrf_k": RRF_K,
+        "use_reranker": RERANK_ENABLED,
+        "rerank_model": RERANK_MODEL,
+        "rerank_candidates": RERANK_CANDIDATES,
+        "rerank_batch_size": RERANK_BATCH_SIZE,
+        "context_token_budget": CONTEXT_TOKEN_BUDGET,
+        "enable_metrics": METRICS_ENABLED
+    }
+
+
+def corpus_settings() -> dict:
+    """Argumentos de ``create_corpus_agent`` para el directorio ``CORPUS_DIR``."""
+    settings = agent_settings()
+    for name in ("pdf_path", "snapshot_path", "verify_snapshot"):
+        del settings[name]
+    settings.update({
+        "pdf_dir": CORPUS_DIR,
+        "vectorstore_path": CORPUS_VECTORSTORE_PATH,
+        "route_top_n": CORPUS_ROUTE_TOP_N,
+        "routing_centroids": CORPUS_ROUTING_CENTROIDS,
+        "build_workers": CORPUS_BUILD_WORKERS,
+        "collection_index_backends": CORPUS_INDEX_BACKENDS
+    })
+    return settings
+
+
 def get_openai_api_key():
     api_key = os.getenv("OPENAI_API_KEY")
     if not api_key:
@@ -82,6 +224,8 @@ Instrucciones:
 Respuesta:
 """
 
+EVALUATION_CONCURRENCY = 4
+
 EVALUATION_QUESTIONS = [
     "¿Qué es la certificación AWS Machine Learning?",
     "¿Cuáles son los requisitos para obtener la certificación?",
@@ -99,5 +243,6 @@ CHAT_CONFIG = {
     "placeholder": "Escribe tu pregunta...",
     "max_history": 50,
     "show_sources": True,
-    "show_stats": True
+    "show_stats": True,
+    "stream_responses": True
 }
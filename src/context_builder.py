@@ -0,0 +1,132 @@
+import re
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+CONTEXT_SEPARATOR = "\n\n"
+DUPLICATE_THRESHOLD = 0.85
+SHINGLE_SIZE = 3
+
+WORD_PATTERN = re.compile(r"\w+")
+
+
+def _shingles(text: str) -> set:
+    words = WORD_PATTERN.findall(text.lower())
+    if len(words) < SHINGLE_SIZE:
+        return {tuple(words)}
+    return {tuple(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def _is_near_duplicate(shingles: set, kept: Sequence[set], threshold: float) -> bool:
+    for other in kept:
+        overlap = len(shingles & other)
+        # Contención respecto al span más corto: un fragmento incluido en otro también cuenta
+        if overlap and overlap / min(len(shingles), len(other)) >= threshold:
+            return True
+    return False
+
+
+def merge_spans(documents: Sequence[Any]) -> List[Dict[str, Any]]:
+    """Une chunks solapados o consecutivos del mismo documento en spans contiguos.
+
+    Cada span conserva el mejor rango de recuperación de sus chunks para
+    mantener el orden por relevancia.
+    """
+    spans = []
+    located = []
+
+    for rank, document in enumerate(documents):
+        metadata = document.metadata or {}
+        start = metadata.get("start_offset")
+        end = metadata.get("end_offset")
+        if start is None or end is None:
+            spans.append({"text": document.page_content, "rank": rank, "chunks": 1})
+        else:
+            located.append((metadata.get("source"), start, end, metadata.get("chunk_id"), rank, document.page_content))
+
+    located.sort(key=lambda item: (str(item[0]), item[1]))
+    current = None
+
+    for source, start, end, chunk_id, rank, text in located:
+        if current is not None and current["source"] == source and (
+            start <= current["end"]
+            or (chunk_id is not None and current["chunk_id"] is not None and chunk_id == current["chunk_id"] + 1)
+        ):
+            if start < current["end"]:
+                text = text[current["end"] - start:]
+                separator = ""
+            else:
+                separator = " "
+            if end > current["end"]:
+                current["text"] += separator + text
+                current["end"] = end
+            current["chunk_id"] = chunk_id
+            current["rank"] = min(current["rank"], rank)
+            current["chunks"] += 1
+        else:
+            current = {"source": source, "start": start, "end": end, "chunk_id": chunk_id, "rank": rank, "text": text, "chunks": 1}
+            spans.append(current)
+
+    spans.sort(key=lambda span: span["rank"])
+    return [{"text": span["text"], "rank": span["rank"], "chunks": span["chunks"]} for span in spans]
+
+
+def _truncate_to_budget(text: str, budget: int, count_tokens: Callable[[str], int]) -> str:
+    tokens = count_tokens(text)
+    while text and tokens > budget:
+        text = text[:max(1, int(len(text) * budget / tokens * 0.95))]
+        tokens = count_tokens(text)
+    return text
+
+
+def build_context(
+    documents: Sequence[Any],
+    count_tokens: Callable[[str], int],
+    token_budget: Optional[int] = None,
+    duplicate_threshold: float = DUPLICATE_THRESHOLD
+) -> Tuple[str, Dict[str, Any]]:
+    naive_tokens = count_tokens(CONTEXT_SEPARATOR.join(document.page_content for document in documents))
+    separator_tokens = count_tokens(CONTEXT_SEPARATOR)
+
+    parts = []
+    kept_shingles = []
+    used_tokens = 0
+    duplicates = 0
+    omitted = 0
+    truncated = False
+
+    spans = merge_spans(documents)
+    for span in spans:
+        shingles = _shingles(span["text"])
+        if _is_near_duplicate(shingles, kept_shingles, duplicate_threshold):
+            duplicates += 1
+            continue
+
+        text = span["text"]
+        tokens = count_tokens(text) + (separator_tokens if parts else 0)
+        if token_budget is not None and used_tokens + tokens > token_budget:
+            if parts:
+                omitted += 1
+                continue
+            # El span más relevante no cabe entero: se recorta en lugar de dejar el contexto vacío
+            text = _truncate_to_budget(text, token_budget, count_tokens)
+            tokens = count_tokens(text)
+            truncated = True
+
+        parts.append(text)
+        kept_shingles.append(shingles)
+        used_tokens += tokens
+
+    context = CONTEXT_SEPARATOR.join(parts)
+    context_tokens = count_tokens(context)
+
+    return context, {
+        "chunks": len(documents),
+        "spans": len(parts),
+        "merged_chunks": len(documents) - len(spans),
+        "duplicates_dropped": duplicates,
+        "spans_omitted": omitted,
+        "truncated": truncated,
+        "naive_tokens": naive_tokens,
+        "context_tokens": context_tokens,
+        "tokens_saved": naive_tokens - context_tokens,
+        "token_budget": token_budget
+    }
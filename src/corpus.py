@@ -0,0 +1,430 @@
+import json
+import logging
+import multiprocessing
+import os
+import re
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.documents import Document
+
+try:
+    from .rag_agent import RAGAgent
+    from .index_manifest import hash_file, hash_text, load_manifest, manifest_fingerprint
+    from .lexical_index import reciprocal_rank_fusion
+    from .vector_index import INDEX_BACKENDS, VectorIndex, _normalize_rows
+except ImportError:
+    from rag_agent import RAGAgent
+    from index_manifest import hash_file, hash_text, load_manifest, manifest_fingerprint
+    from lexical_index import reciprocal_rank_fusion
+    from vector_index import INDEX_BACKENDS, VectorIndex, _normalize_rows
+
+logger = logging.getLogger(__name__)
+
+ROUTING_FILENAME = "routing.npz"
+DEFAULT_ROUTE_TOP_N = 2
+DEFAULT_ROUTING_CENTROIDS = 4
+KMEANS_ITERATIONS = 10
+
+# Parámetros del agente que determinan cómo se indexa y consulta cada colección
+COLLECTION_SETTINGS = {
+    "embedding_model": "embedding_model_name",
+    "embedding_backend": "embedding_backend",
+    "onnx_model_dir": "onnx_model_dir",
+    "chunk_size": "chunk_size",
+    "chunk_overlap": "chunk_overlap",
+    "chunk_unit": "chunk_unit",
+    "pdf_extractor": "pdf_extractor",
+    "page_cache_dir": "page_cache_dir",
+    "use_page_cache": "use_page_cache",
+    "embedding_batch_size": "embedding_batch_size",
+    "use_embedding_cache": "use_embedding_cache",
+    "embedding_cache_dir": "embedding_cache_dir",
+    "embedding_cache_max_mb": "embedding_cache_max_mb",
+    "index_backend": "index_backend",
+    "retrieval_mode": "retrieval_mode",
+    "hybrid_candidates": "hybrid_candidates",
+    "rrf_k": "rrf_k"
+}
+
+
+def list_pdfs(pdf_dir: str) -> List[str]:
+    return sorted(
+        os.path.join(pdf_dir, name) for name in os.listdir(pdf_dir) if name.lower().endswith(".pdf")
+    )
+
+
+def collection_name(pdf_path: str) -> str:
+    stem = os.path.splitext(os.path.basename(pdf_path))[0]
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", stem)
+
+
+def routing_centroids(embeddings: np.ndarray, n_centroids: int, seed: int = 0) -> np.ndarray:
+    """Resumen de una colección: centroides de un k-means esférico sobre sus chunks.
+
+    Con un solo centroide es la media normalizada; con varios, una guía que
+    trata temas distintos no queda representada por un punto intermedio.
+    """
+    vectors = _normalize_rows(embeddings)
+    n_centroids = max(1, min(n_centroids, len(vectors)))
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_centroids, replace=False)].copy()
+
+    for _ in range(KMEANS_ITERATIONS):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        for cluster in range(n_centroids):
+            members = vectors[assignment == cluster]
+            if len(members):
+                centroids[cluster] = members.sum(axis=0)
+        centroids = _normalize_rows(centroids)
+
+    return centroids
+
+
+def save_routing(vectorstore_path: str, centroids: np.ndarray, fingerprint: str):
+    path = os.path.join(vectorstore_path, ROUTING_FILENAME)
+    tmp_path = path + ".tmp.npz"
+    np.savez(tmp_path, centroids=centroids.astype(np.float32), fingerprint=np.array(fingerprint))
+    os.replace(tmp_path, path)
+
+
+def load_routing(vectorstore_path: str, fingerprint: Optional[str] = None) -> Optional[np.ndarray]:
+    path = os.path.join(vectorstore_path, ROUTING_FILENAME)
+    if not os.path.exists(path):
+        return None
+
+    try:
+        with np.load(path) as stored:
+            if fingerprint is not None and str(stored["fingerprint"]) != fingerprint:
+                return None
+            return stored["centroids"]
+    except Exception as e:
+        logger.warning(f"Centroides de enrutado ilegibles en {path}: {e}")
+        return None
+
+
+def _collection_embeddings(index: VectorIndex) -> np.ndarray:
+    embeddings = getattr(index, "embeddings", None)
+    if embeddings is not None:
+        return np.asarray(embeddings, dtype=np.float32)
+    return np.asarray(index.vectorstore._collection.get(include=["embeddings"])["embeddings"], dtype=np.float32)
+
+
+def _collection_agent(pdf_path: str, vectorstore_path: str, settings: Dict[str, Any], **overrides) -> RAGAgent:
+    # Las colecciones solo recuperan: el LLM, las cachés de respuesta, el reranker
+    # y las métricas son del agente del corpus
+    return RAGAgent(
+        pdf_path=pdf_path,
+        vectorstore_path=vectorstore_path,
+        llm_backend="fake",
+        use_answer_cache=False,
+        use_reranker=False,
+        enable_metrics=False,
+        **settings,
+        **overrides
+    )
+
+
+def _build_collection(pdf_path: str, vectorstore_path: str, settings: Dict[str, Any], n_centroids: int) -> Dict[str, Any]:
+    """Indexa un PDF en su propia colección; se ejecuta en un proceso aparte."""
+    start_time = time.perf_counter()
+    # Un proceso por documento: sin procesos anidados para extraer páginas. La caché
+    # de embeddings en disco se comparte con el resto de procesos (bloqueo fcntl)
+    agent = _collection_agent(pdf_path, vectorstore_path, settings, extraction_workers=1)
+    agent.initialize()
+
+    centroids = routing_centroids(_collection_embeddings(agent.index), n_centroids)
+    save_routing(vectorstore_path, centroids, agent.index_fingerprint)
+
+    return {
+        "pdf_path": pdf_path,
+        "chunks": len(agent.index),
+        "chunks_embedded": agent.stats["chunks_embedded"],
+        "seconds": time.perf_counter() - start_time
+    }
+
+
+class CorpusIndex(VectorIndex):
+    """Vista única sobre las colecciones de un corpus con enrutado por centroides.
+
+    Cada consulta se compara con los centroides de todas las colecciones (una
+    multiplicación de matrices pequeña) y solo se busca en las ``route_top_n``
+    más parecidas; sus resultados se combinan con reciprocal-rank fusion.
+    """
+
+    def __init__(
+        self,
+        collections: Dict[str, RAGAgent],
+        centroids: Dict[str, np.ndarray],
+        route_top_n: int = DEFAULT_ROUTE_TOP_N,
+        rrf_k: int = 60
+    ):
+        self.collections = collections
+        self.names = list(collections)
+        self.route_top_n = route_top_n
+        self.rrf_k = rrf_k
+        # Cada colección puede tener su propio backend (collection_index_backends)
+        self.backend = "+".join(sorted({agent.index.backend for agent in collections.values()}))
+
+        self.centroids = np.concatenate([centroids[name] for name in self.names])
+        counts = [len(centroids[name]) for name in self.names]
+        self.centroid_starts = np.concatenate([[0], np.cumsum(counts)[:-1]]).astype(np.int64)
+
+        self.routed_queries = dict.fromkeys(self.names, 0)
+        self.lock = threading.Lock()
+
+    def route(self, query_embeddings: Sequence[Sequence[float]]) -> List[List[str]]:
+        scores = _normalize_rows(query_embeddings) @ self.centroids.T
+        collection_scores = np.maximum.reduceat(scores, self.centroid_starts, axis=1)
+        top_n = min(self.route_top_n, len(self.names))
+        order = np.argsort(-collection_scores, axis=1)[:, :top_n]
+
+        routes = [[self.names[i] for i in row] for row in order.tolist()]
+        with self.lock:
+            for names in routes:
+                for name in names:
+                    self.routed_queries[name] += 1
+        return routes
+
+    def search_routed(
+        self,
+        query_embeddings: Sequence[Sequence[float]],
+        k: int,
+        search: Callable[[RAGAgent, List[int]], List[List[Document]]]
+    ) -> List[List[Document]]:
+        """``search(colección, filas)`` busca las consultas ``filas`` en una colección."""
+        routes = self.route(query_embeddings)
+
+        rows_by_collection = {}
+        for row, names in enumerate(routes):
+            for name in names:
+                rows_by_collection.setdefault(name, []).append(row)
+
+        found = {}
+        for name, rows in rows_by_collection.items():
+            for row, documents in zip(rows, search(self.collections[name], rows)):
+                found[row, name] = documents
+
+        results = []
+        for row, names in enumerate(routes):
+            # Las colecciones van en orden de similitud: en caso de empate gana la más afín
+            by_id = {}
+            rankings = []
+            for name in names:
+                documents = found[row, name]
+                by_id.update((doc.id, doc) for doc in documents)
+                rankings.append([doc.id for doc in documents])
+            results.append([by_id[doc_id] for doc_id in reciprocal_rank_fusion(rankings, k=self.rrf_k)[:k]])
+        return results
+
+    def search_many(self, query_embeddings: Sequence[Sequence[float]], k: int) -> List[List[Document]]:
+        return self.search_routed(
+            query_embeddings, k,
+            lambda agent, rows: agent.index.search_many([query_embeddings[row] for row in rows], k)
+        )
+
+    def contents(self) -> tuple:
+        ids, documents = [], []
+        for agent in self.collections.values():
+            collection_ids, collection_documents = agent.index.contents()
+            ids.extend(collection_ids)
+            documents.extend(collection_documents)
+        return ids, documents
+
+    def get_documents(self, ids: Sequence[str]) -> List[Document]:
+        by_id = {}
+        for agent in self.collections.values():
+            by_id.update((doc.id, doc) for doc in agent.index.get_documents(ids))
+        return [by_id[doc_id] for doc_id in ids if doc_id in by_id]
+
+    def collection_stats(self) -> Dict[str, Dict[str, Any]]:
+        with self.lock:
+            routed = dict(self.routed_queries)
+        return {
+            name: {"chunks": len(agent.index), "routed_queries": routed[name]}
+            for name, agent in self.collections.items()
+        }
+
+    def __len__(self) -> int:
+        return sum(len(agent.index) for agent in self.collections.values())
+
+
+class CorpusAgent(RAGAgent):
+    """Agente sobre un directorio de PDFs, con una colección por documento.
+
+    Las colecciones desactualizadas se indexan en procesos en paralelo; luego
+    se cargan en este proceso compartiendo el modelo de embeddings. Las
+    preguntas se enrutan a las colecciones más afines antes de la búsqueda,
+    así que su coste no crece con el número de documentos.
+    """
+
+    def __init__(
+        self,
+        pdf_dir: str,
+        vectorstore_path: str,
+        route_top_n: int = DEFAULT_ROUTE_TOP_N,
+        routing_centroids: int = DEFAULT_ROUTING_CENTROIDS,
+        build_workers: int = 1,
+        collection_index_backends: Optional[Dict[str, str]] = None,
+        **agent_kwargs
+    ):
+        super().__init__(pdf_path=pdf_dir, vectorstore_path=vectorstore_path, **agent_kwargs)
+        for name, backend in (collection_index_backends or {}).items():
+            if backend not in INDEX_BACKENDS:
+                raise ValueError(
+                    f"Backend de índice desconocido para la colección {name}: {backend}. "
+                    f"Disponibles: {', '.join(INDEX_BACKENDS)}"
+                )
+        # Colección (nombre del PDF sin extensión) -> backend del índice; el resto usa index_backend
+        self.collection_index_backends = dict(collection_index_backends or {})
+        self.pdf_dir = pdf_dir
+        self.route_top_n = route_top_n
+        self.routing_centroids = routing_centroids
+        self.build_workers = build_workers
+        self.collections = {}
+        self.stats["collections_built"] = 0
+
+    def _collection_settings(self, pdf_path: str) -> Dict[str, Any]:
+        settings = {name: getattr(self, attribute) for name, attribute in COLLECTION_SETTINGS.items()}
+        settings["index_backend"] = self.collection_index_backends.get(collection_name(pdf_path), self.index_backend)
+        return settings
+
+    def _collection_path(self, pdf_path: str) -> str:
+        return os.path.join(self.vectorstore_path, collection_name(pdf_path))
+
+    def _collection_is_current(self, pdf_path: str) -> bool:
+        vectorstore_path = self._collection_path(pdf_path)
+        manifest = load_manifest(vectorstore_path)
+        return (
+            self._manifest_is_current(manifest, hash_file(pdf_path))
+            and load_routing(vectorstore_path, manifest_fingerprint(manifest)) is not None
+        )
+
+    def _build_collections(self, pdf_paths: List[str]):
+        stale = [pdf_path for pdf_path in pdf_paths if not self._collection_is_current(pdf_path)]
+        if not stale:
+            logger.info(f"Las {len(pdf_paths)} colecciones del corpus están al día")
+            return
+
+        workers = max(1, min(self.build_workers, len(stale)))
+        logger.info(f"Indexando {len(stale)} de {len(pdf_paths)} documentos con {workers} procesos")
+
+        # spawn: el proceso principal ya tiene hilos cargando modelos
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            futures = [
+                executor.submit(
+                    _build_collection,
+                    pdf_path,
+                    self._collection_path(pdf_path),
+                    self._collection_settings(pdf_path),
+                    self.routing_centroids
+                )
+                for pdf_path in stale
+            ]
+            for future in futures:
+                report = future.result()
+                logger.info(
+                    f"Colección {collection_name(report['pdf_path'])}: {report['chunks']} chunks "
+                    f"({report['chunks_embedded']} nuevos) en {report['seconds']:.1f}s"
+                )
+                self.stats["chunks_embedded"] += report["chunks_embedded"]
+
+        self.stats["collections_built"] = len(stale)
+
+    def _load_collection(self, pdf_path: str) -> RAGAgent:
+        agent = _collection_agent(
+            pdf_path, self._collection_path(pdf_path), self._collection_settings(pdf_path), embeddings=self.embedding_model
+        )
+        agent.initialize()
+        return agent
+
+    def _load_centroids(self, agent: RAGAgent) -> np.ndarray:
+        centroids = load_routing(agent.vectorstore_path, agent.index_fingerprint)
+        if centroids is None:
+            centroids = routing_centroids(_collection_embeddings(agent.index), self.routing_centroids)
+            save_routing(agent.vectorstore_path, centroids, agent.index_fingerprint)
+        return centroids
+
+    def initialize(self):
+        logger.info(f"Iniciando configuración del corpus: {self.pdf_dir}")
+
+        try:
+            if not os.path.isdir(self.pdf_dir):
+                raise FileNotFoundError(f"Directorio de PDFs no encontrado: {self.pdf_dir}")
+            pdf_paths = list_pdfs(self.pdf_dir)
+            if not pdf_paths:
+                raise FileNotFoundError(f"No hay PDFs en {self.pdf_dir}")
+
+            with self.metrics.span("init_total"), \
+                    ThreadPoolExecutor(max_workers=3, thread_name_prefix="rag-warmup") as executor:
+                embeddings_future = executor.submit(self._spanned, "init_embeddings", self._initialize_embeddings)
+                llm_future = executor.submit(self._spanned, "init_llm", self._initialize_llm)
+                reranker_future = executor.submit(
+                    self._spanned, "init_reranker", self.reranker.load
+                ) if self.reranker is not None else None
+
+                with self.metrics.span("init_index"):
+                    if self.embedding_backend != "torch":
+                        # El modelo ONNX se exporta una sola vez aquí y no en cada proceso;
+                        # si no está disponible, los procesos reciben ya el backend "torch"
+                        embeddings_future.result()
+                    self._build_collections(pdf_paths)
+                    embeddings_future.result()
+                    with ThreadPoolExecutor(max_workers=4, thread_name_prefix="rag-corpus") as loader:
+                        agents = list(loader.map(self._load_collection, pdf_paths))
+                    self.collections = {collection_name(agent.pdf_path): agent for agent in agents}
+
+                with self.metrics.span("init_routing"):
+                    centroids = {name: self._load_centroids(agent) for name, agent in self.collections.items()}
+                    self.index = CorpusIndex(self.collections, centroids, route_top_n=self.route_top_n, rrf_k=self.rrf_k)
+
+                self.index_fingerprint = hash_text(json.dumps(
+                    {name: agent.index_fingerprint for name, agent in self.collections.items()}, sort_keys=True
+                ))
+                self.stats["vectorstore_loaded"] = True
+                self.stats["chunks_reused"] = len(self.index) - self.stats["chunks_embedded"]
+
+                if reranker_future is not None:
+                    reranker_future.result()
+                self._initialize_qa_chain()
+                llm_future.result()
+
+            logger.info(f"Corpus inicializado: {len(self.collections)} colecciones, {len(self.index)} chunks")
+
+        except Exception as e:
+            logger.error(f"Error durante la inicialización del corpus: {e}")
+            raise
+
+    def _search(self, questions: List[str], query_embeddings: List[List[float]], k: int) -> List[List[Document]]:
+        # Cada colección aplica su propio modo de recuperación (denso o híbrido)
+        return self.index.search_routed(
+            query_embeddings, k,
+            lambda agent, rows: agent._search(
+                [questions[row] for row in rows], [query_embeddings[row] for row in rows], k
+            )
+        )
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = super().get_stats()
+        if isinstance(self.index, CorpusIndex):
+            stats["collections"] = self.index.collection_stats()
+        return stats
+
+
+def create_corpus_agent(
+    pdf_dir: str,
+    vectorstore_path: str,
+    background: bool = False,
+    **agent_kwargs
+) -> CorpusAgent:
+    agent = CorpusAgent(pdf_dir=pdf_dir, vectorstore_path=vectorstore_path, **agent_kwargs)
+
+    if background:
+        agent.start_background_initialization()
+    else:
+        agent.initialize()
+
+    return agent
@@ -0,0 +1,255 @@
+import json
+import logging
+import os
+import re
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+try:
+    from .embedding_cache import LockedEmbeddings
+except ImportError:
+    from embedding_cache import LockedEmbeddings
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_BACKENDS = ["torch", "onnx", "onnx-int8"]
+
+ONNX_FILENAME = "model.onnx"
+QUANTIZED_FILENAME = "model-int8.onnx"
+TOKENIZER_FILENAME = "tokenizer.json"
+CONFIG_FILENAME = "onnx_config.json"
+ONNX_EXPORT_VERSION = 1
+ONNX_OPSET = 17
+DEFAULT_ONNX_BATCH_SIZE = 32
+
+# Coseno mínimo frente a PyTorch para reutilizar el índice construido con él
+PARITY_MIN_COSINE = {"onnx": 0.999, "onnx-int8": 0.98}
+PARITY_SENTENCES = [
+    "¿Qué es la certificación AWS Machine Learning?",
+    "¿Cuánto cuesta el examen y cuánto dura?",
+    "Amazon SageMaker permite entrenar y desplegar modelos",
+    "Dominio 1: ingeniería de datos para machine learning",
+    "What services are used to train models on AWS?",
+    "Feature engineering, hyperparameter tuning and model evaluation",
+    "ok",
+    "El candidato debe tener uno o dos años de experiencia desarrollando, diseñando y ejecutando "
+    "cargas de trabajo de machine learning en la nube de AWS, incluidos pipelines de datos y despliegue."
+]
+
+
+def _model_slug(model_name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+
+
+def onnx_model_directory(cache_dir: str, model_name: str) -> str:
+    return os.path.join(cache_dir, _model_slug(model_name))
+
+
+def _pool(hidden: np.ndarray, mask: np.ndarray, mode: str) -> np.ndarray:
+    if mode == "cls":
+        return hidden[:, 0]
+    if mode == "max":
+        return np.where(mask[:, :, None] > 0, hidden, -1e9).max(axis=1)
+
+    weights = mask[:, :, None].astype(np.float32)
+    return (hidden * weights).sum(axis=1) / np.clip(weights.sum(axis=1), 1e-9, None)
+
+
+def embedding_parity(reference: np.ndarray, candidate: np.ndarray) -> Dict[str, float]:
+    reference = np.asarray(reference, dtype=np.float32)
+    candidate = np.asarray(candidate, dtype=np.float32)
+    cosines = (reference * candidate).sum(axis=1) / (
+        np.linalg.norm(reference, axis=1) * np.linalg.norm(candidate, axis=1)
+    )
+    return {"min_cosine": float(cosines.min()), "mean_cosine": float(cosines.mean())}
+
+
+def load_onnx_config(directory: str) -> Optional[Dict[str, Any]]:
+    path = os.path.join(directory, CONFIG_FILENAME)
+    if not os.path.exists(path):
+        return None
+
+    with open(path, "r", encoding="utf-8") as f:
+        config = json.load(f)
+    if config.get("version") != ONNX_EXPORT_VERSION:
+        return None
+    return config
+
+
+def export_onnx_model(model_name: str, directory: str) -> Dict[str, Any]:
+    """Exporta el transformer de ``model_name`` a ONNX (float32 e int8 dinámico).
+
+    El pooling y la normalización de sentence-transformers se hacen en NumPy.
+    Se guarda la paridad de cada variante frente a PyTorch, medida con
+    ``PARITY_SENTENCES``.
+    """
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from sentence_transformers import SentenceTransformer
+
+    logger.info(f"Exportando {model_name} a ONNX en {directory}")
+    model = SentenceTransformer(model_name, device="cpu")
+    modules = list(model)
+    pooling = next((module for module in modules if type(module).__name__ == "Pooling"), None)
+    if pooling is None:
+        raise ValueError(f"{model_name} no tiene capa de pooling de sentence-transformers")
+    pooling_config = pooling.get_config_dict()
+    pooling_mode = pooling_config.get("pooling_mode") or pooling.get_pooling_mode_str()
+    if pooling_mode not in ("mean", "cls", "max"):
+        raise ValueError(f"Pooling no soportado en ONNX: {pooling_mode}")
+
+    tokenizer = model.tokenizer
+    sample = tokenizer(PARITY_SENTENCES[:2], padding=True, return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+
+    class _Transformer(torch.nn.Module):
+        def __init__(self, auto_model):
+            super().__init__()
+            self.auto_model = auto_model
+
+        def forward(self, *inputs):
+            return self.auto_model(**dict(zip(input_names, inputs))).last_hidden_state
+
+    os.makedirs(directory, exist_ok=True)
+    onnx_path = os.path.join(directory, ONNX_FILENAME)
+    quantized_path = os.path.join(directory, QUANTIZED_FILENAME)
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names + ["last_hidden_state"]}
+
+    with torch.no_grad():
+        torch.onnx.export(
+            _Transformer(modules[0].auto_model).eval(),
+            tuple(sample[name] for name in input_names),
+            onnx_path + ".tmp",
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=ONNX_OPSET,
+            dynamo=False
+        )
+    os.replace(onnx_path + ".tmp", onnx_path)
+    quantize_dynamic(onnx_path, quantized_path + ".tmp", weight_type=QuantType.QInt8)
+    os.replace(quantized_path + ".tmp", quantized_path)
+
+    tokenizer.backend_tokenizer.save(os.path.join(directory, TOKENIZER_FILENAME))
+    config = {
+        "version": ONNX_EXPORT_VERSION,
+        "model_name": model_name,
+        "input_names": input_names,
+        "pooling_mode": pooling_mode,
+        "normalize": any(type(module).__name__ == "Normalize" for module in modules),
+        "max_seq_length": model.max_seq_length,
+        "pad_token": tokenizer.pad_token,
+        "pad_token_id": tokenizer.pad_token_id,
+        "dimension": model.get_sentence_embedding_dimension()
+    }
+
+    reference = model.encode(PARITY_SENTENCES, convert_to_numpy=True)
+    config["parity"] = {}
+    for backend in ("onnx", "onnx-int8"):
+        onnx_embeddings = OnnxEmbeddings(model_name, directory, quantize=backend == "onnx-int8", config=config)
+        config["parity"][backend] = embedding_parity(reference, onnx_embeddings.embed_documents(PARITY_SENTENCES))
+    logger.info(f"Paridad ONNX frente a PyTorch: {config['parity']}")
+
+    tmp_path = os.path.join(directory, CONFIG_FILENAME + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(config, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, os.path.join(directory, CONFIG_FILENAME))
+    return config
+
+
+class OnnxEmbeddings(Embeddings):
+    """Modelo sentence-transformers exportado a ONNX Runtime (CPU).
+
+    No importa PyTorch ni transformers: tokeniza con ``tokenizers`` y hace el
+    pooling en NumPy, así que arranca mucho antes y ocupa menos memoria. Con
+    ``quantize`` usa la variante con pesos int8. Las llamadas concurrentes son
+    seguras: la sesión de ONNX Runtime y el tokenizer no cambian de estado.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        directory: str,
+        quantize: bool = False,
+        batch_size: int = DEFAULT_ONNX_BATCH_SIZE,
+        threads: Optional[int] = None,
+        config: Optional[Dict[str, Any]] = None
+    ):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        self.model_name = model_name
+        self.config = config or load_onnx_config(directory)
+        if self.config is None:
+            raise FileNotFoundError(f"No hay modelo ONNX exportado en {directory}")
+        self.batch_size = batch_size
+
+        options = onnxruntime.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(
+            os.path.join(directory, QUANTIZED_FILENAME if quantize else ONNX_FILENAME),
+            options,
+            providers=["CPUExecutionProvider"]
+        )
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(directory, TOKENIZER_FILENAME))
+        self.tokenizer.enable_truncation(self.config["max_seq_length"])
+        self.tokenizer.enable_padding(pad_id=self.config["pad_token_id"], pad_token=self.config["pad_token"])
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        inputs = {
+            "input_ids": np.array([encoding.ids for encoding in encodings], dtype=np.int64),
+            "attention_mask": np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64),
+            "token_type_ids": np.array([encoding.type_ids for encoding in encodings], dtype=np.int64)
+        }
+        hidden = self.session.run(None, {name: inputs[name] for name in self.config["input_names"]})[0]
+        vectors = _pool(hidden, inputs["attention_mask"], self.config["pooling_mode"])
+        if self.config["normalize"]:
+            vectors = vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+        return vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+
+        # Lotes de longitudes parecidas: menos padding
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vectors = np.empty((len(texts), self.config["dimension"]), dtype=np.float32)
+        for start in range(0, len(order), self.batch_size):
+            rows = order[start:start + self.batch_size]
+            vectors[rows] = self._encode([texts[i] for i in rows])
+        return vectors.tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._encode([text])[0].tolist()
+
+
+def create_embeddings(backend: str, model_name: str, onnx_cache_dir: Optional[str] = None) -> Embeddings:
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Backend de embeddings desconocido: {backend}. Disponibles: {', '.join(EMBEDDING_BACKENDS)}")
+
+    if backend == "torch":
+        from langchain_community.embeddings import SentenceTransformerEmbeddings
+
+        return LockedEmbeddings(SentenceTransformerEmbeddings(model_name=model_name))
+
+    if onnx_cache_dir is None:
+        raise ValueError(f"El backend {backend} necesita un directorio para el modelo exportado")
+
+    directory = onnx_model_directory(onnx_cache_dir, model_name)
+    config = load_onnx_config(directory)
+    if config is None or config["model_name"] != model_name:
+        config = export_onnx_model(model_name, directory)
+
+    parity = config["parity"][backend]
+    if parity["min_cosine"] < PARITY_MIN_COSINE[backend]:
+        raise ValueError(
+            f"Embeddings {backend} demasiado distintos de PyTorch (coseno mínimo {parity['min_cosine']:.4f}); "
+            "el índice existente no sería compatible"
+        )
+
+    return OnnxEmbeddings(model_name, directory, quantize=backend == "onnx-int8", config=config)
@@ -0,0 +1,123 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, List
+
+from langchain_core.embeddings import Embeddings
+
+try:
+    from .metrics import MetricsRegistry
+except ImportError:
+    from metrics import MetricsRegistry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_WINDOW_MS = 2.0
+DEFAULT_MAX_BATCH_SIZE = 32
+
+BATCH_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128, 256]
+
+
+class BatchingEmbeddings(Embeddings):
+    """Agrupa los ``embed_query`` concurrentes en una sola pasada del modelo.
+
+    La primera consulta que llega con el modelo libre abre un lote que espera
+    como mucho ``window_ms`` (o hasta ``max_batch_size`` consultas); mientras
+    el modelo calcula un lote, las siguientes se acumulan en la cola y salen
+    juntas en el próximo. Si el lote anterior fue de una sola consulta no se
+    espera la ventana. Un hilo propio hace todas las pasadas de consultas;
+    ``embed_documents`` (indexación) llama directamente al modelo.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        window_ms: float = DEFAULT_BATCH_WINDOW_MS,
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE
+    ):
+        self.embeddings = embeddings
+        self.window = window_ms / 1000
+        self.max_batch_size = max(1, max_batch_size)
+        self.queue = queue.Queue()
+        self.last_batch_size = 0
+        self.batch_sizes = MetricsRegistry(
+            buckets=BATCH_SIZE_BUCKETS,
+            name="rag_embedding_batch_size",
+            help_text="Consultas por pasada del modelo de embeddings"
+        )
+        self.queue_wait = MetricsRegistry(
+            name="rag_embedding_queue_wait_seconds",
+            help_text="Espera de cada consulta hasta entrar en una pasada del modelo"
+        )
+        self.worker = threading.Thread(target=self._run, name="rag-embedding-batcher", daemon=True)
+        self.worker.start()
+
+    def embed_query(self, text: str) -> List[float]:
+        future = Future()
+        self.queue.put((text, future, time.perf_counter()))
+        return future.result()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        # Ya es un lote: no pasa por la cola
+        return self.embeddings.embed_documents(texts)
+
+    def _collect(self) -> List[tuple]:
+        batch = [self.queue.get()]
+        deadline = batch[0][2] + self.window
+
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+                continue
+            except queue.Empty:
+                pass
+
+            # Sin carga (el lote anterior fue de una consulta) esperar solo añade latencia
+            if len(batch) == 1 and self.last_batch_size == 1:
+                break
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        self.last_batch_size = len(batch)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            for _, _, enqueued in batch:
+                self.queue_wait.observe("query", started - enqueued)
+            self.batch_sizes.observe("query", len(batch))
+
+            try:
+                # Modelos sentence-transformers simétricos: embed_documents da los mismos vectores que embed_query
+                vectors = self.embeddings.embed_documents([text for text, _, _ in batch])
+            except Exception as e:
+                logger.error(f"Error al calcular un lote de {len(batch)} embeddings: {e}")
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, future, _), vector in zip(batch, vectors):
+                future.set_result(vector)
+
+    def batch_stats(self) -> Dict[str, Any]:
+        return {
+            "window_ms": self.window * 1000,
+            "max_batch_size": self.max_batch_size,
+            "batch_size": self.batch_sizes.snapshot().get("query", {}),
+            "queue_wait": self.queue_wait.snapshot().get("query", {})
+        }
+
+    def prometheus_text(self) -> str:
+        return self.batch_sizes.prometheus_text() + self.queue_wait.prometheus_text()
@@ -0,0 +1,394 @@
+import atexit
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: sin bloqueo entre procesos
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MEMORY_ENTRIES = 4096
+DEFAULT_DISK_MAX_MB = 256
+FLUSH_EVERY_ENTRIES = 256
+FLUSH_EVERY_SECONDS = 5.0
+
+
+def _model_slug(model_name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+
+
+def _key_hash(key: str) -> int:
+    # 0 marca una fila vacía o a medio escribir
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little") or 1
+
+
+class DiskEmbeddingStore:
+    """Vectores en un memmap float32 con un índice JSON clave -> fila.
+
+    Varios procesos (los de indexación del corpus, varias instancias del chat)
+    pueden compartir los ficheros: abrirlos, ocupar filas y reescribir el
+    índice se hace con un bloqueo ``fcntl`` sobre ``<modelo>.lock``; una fila
+    está libre si su hash de clave es 0, y al guardar el índice se combina con
+    el que haya en disco. Los ficheros nunca se truncan en su sitio: si hay que
+    recrearlos se escriben aparte y se sustituyen con ``os.replace``.
+    """
+
+    def __init__(self, cache_dir: str, model_name: str, max_bytes: int, backend: str = "torch"):
+        self.cache_dir = cache_dir
+        self.model_name = model_name
+        self.backend = backend
+        self.max_bytes = max_bytes
+        # El backend forma parte del nombre: torch, onnx y onnx-int8 no dan exactamente los mismos vectores
+        slug = f"{_model_slug(model_name)}.{_model_slug(backend)}"
+        self.vectors_path = os.path.join(cache_dir, f"{slug}.f32")
+        self.index_path = os.path.join(cache_dir, f"{slug}.index.json")
+        # Hash de la clave de cada fila: el índice se guarda cada FLUSH_EVERY_ENTRIES
+        # escrituras, así que tras una caída puede apuntar a filas ya reutilizadas
+        self.keys_path = os.path.join(cache_dir, f"{slug}.keys")
+        self.lock_path = os.path.join(cache_dir, f"{slug}.lock")
+
+        self.dim = None
+        self.capacity = 0
+        self.vectors = None
+        self.row_keys = None
+        self.inode = None
+        self.slots = OrderedDict()
+        self.free_slots = []
+        self.dirty_entries = 0
+        self.last_flush = time.monotonic()
+
+        with self._locked():
+            self._load()
+
+    @contextmanager
+    def _locked(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        if fcntl is None:
+            yield
+            return
+
+        with open(self.lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_index(self) -> Dict[str, Any]:
+        with open(self.index_path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+        if index.get("model") != self.model_name:
+            raise ValueError(f"modelo {index.get('model')}")
+        if index.get("backend") != self.backend:
+            raise ValueError(f"backend {index.get('backend')}")
+
+        expected_rows = self.max_bytes // (index["dim"] * 4)
+        if not os.path.exists(self.vectors_path) or os.path.getsize(self.vectors_path) != expected_rows * index["dim"] * 4:
+            raise ValueError("tamaño máximo modificado")
+        if not os.path.exists(self.keys_path) or os.path.getsize(self.keys_path) != expected_rows * 8:
+            raise ValueError("sin hashes de clave")
+        return index
+
+    def _valid_slots(self, entries) -> OrderedDict:
+        return OrderedDict(
+            (key, slot) for key, slot in entries
+            if slot < self.capacity and int(self.row_keys[slot]) == _key_hash(key)
+        )
+
+    def _load(self):
+        if not os.path.exists(self.index_path):
+            return
+
+        try:
+            index = self._read_index()
+            self._open(index["dim"])
+            self.slots = self._valid_slots(index["slots"])
+            self.free_slots = np.flatnonzero(np.asarray(self.row_keys) == 0)[::-1].tolist()
+            logger.info(f"Caché de embeddings en disco cargada: {len(self.slots)} vectores")
+        except Exception as e:
+            logger.warning(f"Caché de embeddings en disco inválida ({e}), se descarta")
+            self._close()
+
+    def _open(self, dim: int):
+        self.dim = dim
+        self.capacity = max(1, self.max_bytes // (dim * 4))
+        self.vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r+", shape=(self.capacity, dim))
+        self.row_keys = np.memmap(self.keys_path, dtype=np.uint64, mode="r+", shape=(self.capacity,))
+        self.inode = os.stat(self.vectors_path).st_ino
+
+    def _close(self):
+        self.vectors = None
+        self.row_keys = None
+        self.inode = None
+        self.slots = OrderedDict()
+        self.free_slots = []
+        self.dim = None
+        self.capacity = 0
+
+    def _create(self, dim: int):
+        # Ficheros nuevos aparte y os.replace: un proceso que aún tenga mapeados
+        # los anteriores sigue leyendo un fichero completo
+        capacity = max(1, self.max_bytes // (dim * 4))
+        for path, dtype, shape in [
+            (self.keys_path, np.uint64, (capacity,)),
+            (self.vectors_path, np.float32, (capacity, dim))
+        ]:
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            np.memmap(tmp_path, dtype=dtype, mode="w+", shape=shape).flush()
+            os.replace(tmp_path, path)
+
+        self._open(dim)
+        self.slots = OrderedDict()
+        self.free_slots = list(range(self.capacity - 1, -1, -1))
+        self._write_index()
+
+    def _write_index(self):
+        tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"model": self.model_name, "backend": self.backend, "dim": self.dim, "slots": list(self.slots.items())}, f)
+        os.replace(tmp_path, self.index_path)
+
+    def _files_replaced(self) -> bool:
+        try:
+            return os.stat(self.vectors_path).st_ino != self.inode
+        except OSError:
+            return True
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        slot = self.slots.get(key)
+        if slot is None:
+            return None
+
+        expected = _key_hash(key)
+        if int(self.row_keys[slot]) == expected:
+            vector = np.array(self.vectors[slot])
+            # Otro proceso puede haber reutilizado la fila mientras se copiaba
+            if int(self.row_keys[slot]) == expected:
+                self.slots.move_to_end(key)
+                return vector
+
+        # La fila es ahora de otra clave (otro proceso o un índice anterior a una caída)
+        del self.slots[key]
+        return None
+
+    def _claim_slot(self, key: str) -> int:
+        while self.free_slots:
+            slot = self.free_slots.pop()
+            if int(self.row_keys[slot]) == 0:
+                return slot
+
+        # Sin filas libres: se desaloja la entrada propia menos usada que siga siendo propia
+        while self.slots:
+            old_key, slot = self.slots.popitem(last=False)
+            if int(self.row_keys[slot]) == _key_hash(old_key):
+                return slot
+
+        # Todas las filas son de otros procesos
+        return _key_hash(key) % self.capacity
+
+    def put_many(self, items: List[tuple]):
+        with self._locked():
+            if self.vectors is None:
+                # Otro proceso puede haber creado los ficheros desde que se abrió este
+                self._load()
+            if self.vectors is None and items:
+                self._create(len(items[0][1]))
+
+            for key, vector in items:
+                if len(vector) != self.dim:
+                    continue
+
+                slot = self.slots.get(key)
+                if slot is not None and int(self.row_keys[slot]) != _key_hash(key):
+                    slot = None
+                if slot is None:
+                    slot = self._claim_slot(key)
+                self.slots[key] = slot
+                self.slots.move_to_end(key)
+                # Se invalida la fila antes de sobrescribirla: una caída a medias deja un fallo, no un vector ajeno
+                self.row_keys[slot] = 0
+                self.vectors[slot] = vector
+                self.row_keys[slot] = _key_hash(key)
+                self.dirty_entries += 1
+
+    def put(self, key: str, vector: np.ndarray):
+        self.put_many([(key, vector)])
+
+    def should_flush(self) -> bool:
+        return self.dirty_entries >= FLUSH_EVERY_ENTRIES or (
+            self.dirty_entries > 0 and time.monotonic() - self.last_flush >= FLUSH_EVERY_SECONDS
+        )
+
+    def flush(self):
+        if self.vectors is None or self.dirty_entries == 0:
+            return
+
+        with self._locked():
+            self.vectors.flush()
+            self.row_keys.flush()
+            if self._files_replaced():
+                logger.warning("Otro proceso recreó la caché de embeddings en disco; se vuelve a cargar")
+                self._close()
+                self._load()
+            else:
+                # Se combina con el índice de los demás procesos; las entradas propias van
+                # al final (más recientes) y solo se guardan las filas cuyo hash sigue cuadrando
+                try:
+                    entries = self._read_index()["slots"]
+                except (OSError, ValueError, KeyError):
+                    entries = []
+                merged = OrderedDict(entries)
+                for key, slot in self.slots.items():
+                    merged.pop(key, None)
+                    merged[key] = slot
+                self.slots = self._valid_slots(merged.items())
+                self._write_index()
+
+        self.dirty_entries = 0
+        self.last_flush = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+
+class LockedEmbeddings(Embeddings):
+    # Los tokenizers rápidos de HuggingFace no admiten llamadas concurrentes
+    # ("Already borrowed"), así que un modelo compartido entre sesiones se serializa.
+    def __init__(self, embeddings: Embeddings):
+        self.embeddings = embeddings
+        self.lock = threading.Lock()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with self.lock:
+            return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        with self.lock:
+            return self.embeddings.embed_query(text)
+
+
+class CachedEmbeddings(Embeddings):
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        model_name: str,
+        cache_dir: Optional[str] = None,
+        memory_entries: int = DEFAULT_MEMORY_ENTRIES,
+        disk_max_mb: int = DEFAULT_DISK_MAX_MB,
+        backend: str = "torch"
+    ):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.backend = backend
+        self.memory_entries = memory_entries
+        self.memory = OrderedDict()
+        self.disk = (
+            DiskEmbeddingStore(cache_dir, model_name, disk_max_mb * 1024 * 1024, backend=backend) if cache_dir else None
+        )
+        self.lock = threading.Lock()
+        self.stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0
+        }
+
+        if self.disk is not None:
+            atexit.register(self.flush)
+
+    def _key(self, kind: str, text: str) -> str:
+        return f"{kind}:{hashlib.sha256(text.encode('utf-8')).hexdigest()}"
+
+    def _lookup(self, key: str) -> Optional[np.ndarray]:
+        vector = self.memory.get(key)
+        if vector is not None:
+            self.memory.move_to_end(key)
+            self.stats["memory_hits"] += 1
+            return vector
+
+        if self.disk is not None:
+            vector = self.disk.get(key)
+            if vector is not None:
+                self.stats["disk_hits"] += 1
+                self._remember(key, vector)
+                return vector
+
+        self.stats["misses"] += 1
+        return None
+
+    def _remember(self, key: str, vector: np.ndarray):
+        self.memory[key] = vector
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_entries:
+            self.memory.popitem(last=False)
+
+    def _store(self, keys: List[str], vectors: List[List[float]]):
+        items = []
+        for key, values in zip(keys, vectors):
+            vector = np.asarray(values, dtype=np.float32)
+            self._remember(key, vector)
+            items.append((key, vector))
+        if self.disk is not None:
+            # Un solo bloqueo entre procesos por lote
+            self.disk.put_many(items)
+
+        if self.disk is not None and self.disk.should_flush():
+            self.disk.flush()
+
+    def _embed_cached(self, kind: str, texts: List[str], compute) -> List[List[float]]:
+        keys = [self._key(kind, text) for text in texts]
+        results = [None] * len(texts)
+
+        with self.lock:
+            for i, key in enumerate(keys):
+                results[i] = self._lookup(key)
+
+        missing = [i for i, vector in enumerate(results) if vector is None]
+        if missing:
+            computed = compute([texts[i] for i in missing])
+            with self.lock:
+                self._store([keys[i] for i in missing], computed)
+            for i, vector in zip(missing, computed):
+                results[i] = vector
+
+        return [vector.tolist() if isinstance(vector, np.ndarray) else list(vector) for vector in results]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed_cached("doc", texts, self.embeddings.embed_documents)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed_cached("query", [text], lambda texts: [self.embeddings.embed_query(texts[0])])[0]
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        # Los modelos sentence-transformers son simétricos: una sola pasada de
+        # embed_documents produce los mismos vectores que embed_query.
+        return self._embed_cached("query", texts, self.embeddings.embed_documents)
+
+    def flush(self):
+        if self.disk is None:
+            return
+        with self.lock:
+            self.disk.flush()
+
+    def cache_stats(self) -> Dict[str, Any]:
+        with self.lock:
+            stats = self.stats.copy()
+            stats["memory_entries"] = len(self.memory)
+            stats["disk_entries"] = len(self.disk) if self.disk is not None else 0
+
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
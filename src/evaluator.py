@@ -5,7 +5,8 @@ from datetime import datetime
 import json
 
 from .rag_agent import RAGAgent
-from .config import EVALUATION_QUESTIONS, LOGS_DIR
+from .config import EVALUATION_QUESTIONS, EVALUATION_CONCURRENCY, LOGS_DIR
+from .retrieval_eval import LABELLED_SET_PATH, DEFAULT_KS, load_labelled_set, evaluate_agent
 
 logging.basicConfig(
     filename=LOGS_DIR / "evaluation.log",
@@ -20,26 +21,35 @@ class RAGEvaluator:
         self.agent = agent
         self.evaluation_results = []
 
-    def evaluate_questions(self, questions: List[str] = None) -> Dict[str, Any]:
+    def _ask_all(self, questions: List[str], concurrency: int, use_shortcuts: bool = True) -> List[Dict[str, Any]]:
+        if concurrency > 1 and hasattr(self.agent, "ask_many"):
+            return self.agent.ask_many(questions, max_concurrency=concurrency, use_shortcuts=use_shortcuts)
+        
+        responses = []
+        for question in questions:
+            start_time = time.time()
+            response = self.agent.ask(question, use_shortcuts=use_shortcuts)
+            response.setdefault("metadata", {})["response_time"] = time.time() - start_time
+            responses.append(response)
+        return responses
+
+    def evaluate_questions(self, questions: List[str] = None, concurrency: int = None) -> Dict[str, Any]:
         if questions is None:
             questions = EVALUATION_QUESTIONS
+        if concurrency is None:
+            concurrency = EVALUATION_CONCURRENCY
         
-        logger.info(f"Iniciando evaluación con {len(questions)} preguntas")
+        logger.info(f"Iniciando evaluación con {len(questions)} preguntas (concurrencia: {concurrency})")
         
         results = []
-        total_time = 0
         successful = 0
         failed = 0
         
-        for i, question in enumerate(questions, 1):
-            logger.info(f"Evaluando pregunta {i}/{len(questions)}: {question}")
-            
-            start_time = time.time()
-            response = self.agent.ask(question)
-            response_time = time.time() - start_time
-            
-            total_time += response_time
-            
+        start_time = time.time()
+        responses = self._ask_all(questions, concurrency)
+        total_time = time.time() - start_time
+        
+        for question, response in zip(questions, responses):
             if response["success"]:
                 successful += 1
             else:
@@ -49,7 +59,7 @@ class RAGEvaluator:
                 "question": question,
                 "answer": response["answer"],
                 "success": response["success"],
-                "response_time": response_time,
+                "response_time": response.get("metadata", {}).get("response_time", 0),
                 "num_sources": response.get("metadata", {}).get("num_sources", 0),
                 "timestamp": str(datetime.now())
             }
@@ -62,8 +72,9 @@ class RAGEvaluator:
             "successful": successful,
             "failed": failed,
             "success_rate": successful / len(questions) * 100,
-            "avg_response_time": total_time / len(questions),
+            "avg_response_time": sum(r["response_time"] for r in results) / len(questions),
             "total_time": total_time,
+            "concurrency": concurrency,
             "results": results,
             "timestamp": str(datetime.now())
         }
@@ -140,9 +151,11 @@ class RAGEvaluator:
         
         return filename
 
-    def measure_retrieval_quality(self, questions: List[str] = None) -> Dict[str, Any]:
+    def measure_retrieval_quality(self, questions: List[str] = None, concurrency: int = None) -> Dict[str, Any]:
         if questions is None:
             questions = EVALUATION_QUESTIONS[:5]
+        if concurrency is None:
+            concurrency = EVALUATION_CONCURRENCY
         
         retrieval_stats = {
             "avg_sources": 0,
@@ -153,8 +166,7 @@ class RAGEvaluator:
         
         total_sources = 0
         
-        for question in questions:
-            response = self.agent.ask(question)
+        for question, response in zip(questions, self._ask_all(questions, concurrency)):
             num_sources = response.get("metadata", {}).get("num_sources", 0)
             
             total_sources += num_sources
@@ -171,22 +183,31 @@ class RAGEvaluator:
         
         return retrieval_stats
 
-    def measure_response_time(self, iterations: int = 10) -> Dict[str, Any]:
-        question = "¿Qué es la certificación AWS Machine Learning?"
+    def evaluate_retrieval(self, labelled_path: str = LABELLED_SET_PATH, ks: List[int] = None) -> Dict[str, Any]:
+        labelled = load_labelled_set(labelled_path)
+        logger.info(f"Evaluando recuperación con {len(labelled)} preguntas etiquetadas")
         
-        times = []
+        metrics = evaluate_agent(self.agent, labelled, ks=ks or DEFAULT_KS)
+        metrics["timestamp"] = str(datetime.now())
+        return metrics
+
+    def measure_response_time(self, iterations: int = 10, concurrency: int = 1) -> Dict[str, Any]:
+        question = "¿Qué es la certificación AWS Machine Learning?"
         
-        for _ in range(iterations):
-            start_time = time.time()
-            self.agent.ask(question)
-            response_time = time.time() - start_time
-            times.append(response_time)
+        start_time = time.time()
+        # La misma pregunta repetida saldría de la caché de respuestas o se agruparía con
+        # la que ya está en curso: se omiten ambas para medir el pipeline completo
+        responses = self._ask_all([question] * iterations, concurrency, use_shortcuts=False)
+        wall_time = time.time() - start_time
+        times = [response.get("metadata", {}).get("response_time", 0) for response in responses]
         
         return {
             "iterations": iterations,
+            "concurrency": concurrency,
             "avg_time": sum(times) / len(times),
             "min_time": min(times),
             "max_time": max(times),
             "total_time": sum(times),
+            "wall_time": wall_time,
             "times": times
         }
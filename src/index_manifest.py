@@ -0,0 +1,124 @@
+import hashlib
+import json
+import logging
+import os
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILENAME = "index_manifest.json"
+MANIFEST_VERSION = 1
+
+
+def hash_text(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def hash_file(path: str, block_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def manifest_path(vectorstore_path: str) -> str:
+    return os.path.join(vectorstore_path, MANIFEST_FILENAME)
+
+
+def load_manifest(vectorstore_path: str) -> Optional[Dict[str, Any]]:
+    path = manifest_path(vectorstore_path)
+    if not os.path.exists(path):
+        return None
+
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Manifest ilegible en {path}: {e}")
+        return None
+
+    if manifest.get("version") != MANIFEST_VERSION:
+        logger.warning(f"Versión de manifest no soportada: {manifest.get('version')}")
+        return None
+
+    return manifest
+
+
+def save_manifest(vectorstore_path: str, manifest: Dict[str, Any]):
+    os.makedirs(vectorstore_path, exist_ok=True)
+    path = manifest_path(vectorstore_path)
+    tmp_path = path + ".tmp"
+
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+    logger.info(f"Manifest guardado en {path} ({len(manifest['chunks'])} chunks)")
+
+
+def build_manifest(
+    pdf_path: str,
+    pdf_hash: str,
+    embedding_model: str,
+    chunk_params: Dict[str, Any],
+    chunks: List[Dict[str, Any]]
+) -> Dict[str, Any]:
+    return {
+        "version": MANIFEST_VERSION,
+        "pdf_path": pdf_path,
+        "pdf_hash": pdf_hash,
+        "embedding_model": embedding_model,
+        "chunk_params": chunk_params,
+        "chunks": chunks
+    }
+
+
+def manifest_fingerprint(manifest: Optional[Dict[str, Any]]) -> Optional[str]:
+    if manifest is None:
+        return None
+
+    return hash_text(json.dumps(
+        [manifest["pdf_hash"], manifest["embedding_model"], manifest["chunk_params"], [entry["id"] for entry in manifest["chunks"]]],
+        sort_keys=True
+    ))
+
+
+def manifest_entry(doc_id: str, content: str, metadata: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": doc_id,
+        "hash": hash_text(content),
+        "metadata": metadata
+    }
+
+
+def plan_sync(
+    previous_chunks: List[Dict[str, Any]],
+    contents: List[str],
+    metadatas: List[Dict[str, Any]]
+) -> Tuple[List[Dict[str, Any]], List[int], List[str], List[int]]:
+    available = {}
+    for entry in previous_chunks:
+        available.setdefault(entry["hash"], []).append(entry)
+
+    entries = []
+    to_add = []
+    to_update = []
+
+    for i, (content, metadata) in enumerate(zip(contents, metadatas)):
+        content_hash = hash_text(content)
+        candidates = available.get(content_hash)
+
+        if candidates:
+            previous = candidates.pop(0)
+            entries.append({"id": previous["id"], "hash": content_hash, "metadata": metadata})
+            if previous.get("metadata") != metadata:
+                to_update.append(i)
+        else:
+            entries.append({"id": str(uuid.uuid4()), "hash": content_hash, "metadata": metadata})
+            to_add.append(i)
+
+    to_delete = [entry["id"] for remaining in available.values() for entry in remaining]
+
+    return entries, to_add, to_delete, to_update
@@ -0,0 +1,278 @@
+import hashlib
+import json
+import logging
+import mmap
+import os
+import shutil
+import struct
+import time
+from collections.abc import Sequence
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+try:
+    from .index_manifest import manifest_fingerprint
+    from .lexical_index import BM25Index
+    from .vector_index import NumpyIndex, _normalize_rows
+except ImportError:
+    from index_manifest import manifest_fingerprint
+    from lexical_index import BM25Index
+    from vector_index import NumpyIndex, _normalize_rows
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_MAGIC = b"RAGSNAP\x00"
+SNAPSHOT_VERSION = 1
+# Secciones alineadas a página: cada proceso mapea solo lo que lee y comparte las páginas
+SNAPSHOT_ALIGNMENT = 4096
+_PREAMBLE = struct.Struct("<8sQ")
+_CHECKSUM_BLOCK = 1 << 20
+
+
+class SnapshotError(ValueError):
+    pass
+
+
+class PackedStrings(Sequence):
+    """Lista de cadenas UTF-8 sobre un buffer mapeado; se decodifican al leerlas."""
+
+    def __init__(self, buffer: Any, data_offset: int, offsets: np.ndarray, decode=None):
+        self.buffer = buffer
+        self.data_offset = data_offset
+        self.offsets = offsets
+        self.decode = decode
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+
+        start = self.data_offset + int(self.offsets[i])
+        end = self.data_offset + int(self.offsets[i + 1])
+        value = self.buffer[start:end].decode("utf-8")
+        return value if self.decode is None else self.decode(value)
+
+
+def _pack_strings(values: List[str]) -> tuple:
+    encoded = [value.encode("utf-8") for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum(np.fromiter((len(value) for value in encoded), dtype=np.int64, count=len(encoded)), out=offsets[1:])
+    return offsets, b"".join(encoded)
+
+
+def _align(offset: int) -> int:
+    return -(-offset // SNAPSHOT_ALIGNMENT) * SNAPSHOT_ALIGNMENT
+
+
+def _section_bytes(value: Any) -> memoryview:
+    if isinstance(value, np.ndarray):
+        return memoryview(np.ascontiguousarray(value)).cast("B")
+    return memoryview(value)
+
+
+def export_snapshot(
+    path: str,
+    index: NumpyIndex,
+    manifest: Dict[str, Any],
+    lexical_index: Optional[BM25Index] = None
+) -> Dict[str, Any]:
+    """Empaqueta el índice, sus chunks, el BM25 y el manifest en un único fichero.
+
+    Cada sección guarda su sha256 en la cabecera; la matriz de embeddings es
+    float32 contigua y se puede mapear sin copiarla.
+    """
+    ids, documents = index.contents()
+    ids, documents = list(ids), list(documents)
+    fingerprint = manifest_fingerprint(manifest)
+    if lexical_index is None:
+        lexical_index = BM25Index.build(ids, documents, fingerprint=fingerprint)
+    if list(lexical_index.ids) != ids:
+        raise SnapshotError("El índice BM25 no corresponde a los chunks del índice vectorial")
+
+    embeddings = np.ascontiguousarray(_normalize_rows(index.embeddings), dtype=np.float32)
+    id_offsets, id_data = _pack_strings(ids)
+    document_offsets, document_data = _pack_strings(documents)
+    metadata_offsets, metadata_data = _pack_strings(
+        [json.dumps(index.metadatas[i], ensure_ascii=False) for i in range(len(ids))]
+    )
+    term_offsets, term_data = _pack_strings(list(lexical_index.terms))
+
+    payload = {
+        "embeddings": embeddings,
+        "ids.offsets": id_offsets,
+        "ids.data": id_data,
+        "documents.offsets": document_offsets,
+        "documents.data": document_data,
+        "metadatas.offsets": metadata_offsets,
+        "metadatas.data": metadata_data,
+        "bm25.indptr": np.asarray(lexical_index.indptr, dtype=np.int64),
+        "bm25.rows": np.asarray(lexical_index.rows, dtype=np.int32),
+        "bm25.weights": np.asarray(lexical_index.weights, dtype=np.float32),
+        "bm25.terms.offsets": term_offsets,
+        "bm25.terms.data": term_data,
+        "manifest": json.dumps(manifest, ensure_ascii=False).encode("utf-8")
+    }
+
+    sections = {}
+    relative_offset = 0
+    for name, value in payload.items():
+        data = _section_bytes(value)
+        relative_offset = _align(relative_offset)
+        sections[name] = {
+            "offset": relative_offset,
+            "length": data.nbytes,
+            "sha256": hashlib.sha256(data).hexdigest()
+        }
+        if isinstance(value, np.ndarray):
+            sections[name].update(dtype=value.dtype.str, shape=list(value.shape))
+        relative_offset += data.nbytes
+
+    header = {
+        "version": SNAPSHOT_VERSION,
+        "created_at": time.time(),
+        "backend": "numpy",
+        "count": len(ids),
+        "dim": int(embeddings.shape[1]) if embeddings.ndim == 2 else 0,
+        "fingerprint": fingerprint,
+        "pdf_path": manifest["pdf_path"],
+        "pdf_hash": manifest["pdf_hash"],
+        "embedding_model": manifest["embedding_model"],
+        "chunk_params": manifest["chunk_params"],
+        "bm25": {"k1": lexical_index.k1, "b": lexical_index.b},
+        "sections": sections
+    }
+    header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    data_start = _align(_PREAMBLE.size + len(header_bytes))
+    header_bytes += b" " * (data_start - _PREAMBLE.size - len(header_bytes))
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_PREAMBLE.pack(SNAPSHOT_MAGIC, len(header_bytes)))
+        f.write(header_bytes)
+        for name, value in payload.items():
+            f.seek(data_start + sections[name]["offset"])
+            f.write(_section_bytes(value))
+        f.truncate(data_start + relative_offset)
+    os.replace(tmp_path, path)
+
+    logger.info(f"Snapshot del índice guardado en {path} ({len(ids)} chunks, {os.path.getsize(path) / 1e6:.1f} MB)")
+    return header
+
+
+class IndexSnapshot:
+    """Snapshot mapeado en solo lectura.
+
+    Abrirlo solo lee la cabecera: los embeddings, los textos y las postings
+    BM25 son vistas sobre el mismo ``mmap``, y el sistema operativo comparte
+    sus páginas entre todos los procesos que abren el mismo fichero.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            magic, header_length = _PREAMBLE.unpack(f.read(_PREAMBLE.size))
+            if magic != SNAPSHOT_MAGIC:
+                raise SnapshotError(f"{path} no es un snapshot del índice")
+            self.header = json.loads(f.read(header_length))
+            if self.header.get("version") != SNAPSHOT_VERSION:
+                raise SnapshotError(f"Versión de snapshot no soportada: {self.header.get('version')}")
+
+            self.data_start = _PREAMBLE.size + header_length
+            size = os.fstat(f.fileno()).st_size
+            expected = max(
+                (self.data_start + section["offset"] + section["length"] for section in self.header["sections"].values()),
+                default=self.data_start
+            )
+            if size < expected:
+                raise SnapshotError(f"Snapshot truncado: {size} bytes, se esperaban {expected}")
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self._manifest = None
+
+    @property
+    def fingerprint(self) -> str:
+        return self.header["fingerprint"]
+
+    def _section(self, name: str) -> Dict[str, Any]:
+        return self.header["sections"][name]
+
+    def _array(self, name: str) -> np.ndarray:
+        section = self._section(name)
+        dtype = np.dtype(section["dtype"])
+        count = int(np.prod(section["shape"])) if section["shape"] else 1
+        return np.frombuffer(
+            self.buffer, dtype=dtype, count=count, offset=self.data_start + section["offset"]
+        ).reshape(section["shape"])
+
+    def _strings(self, name: str, decode=None) -> PackedStrings:
+        return PackedStrings(
+            self.buffer, self.data_start + self._section(f"{name}.data")["offset"], self._array(f"{name}.offsets"), decode
+        )
+
+    def verify(self):
+        for name, section in self.header["sections"].items():
+            digest = hashlib.sha256()
+            start = self.data_start + section["offset"]
+            end = start + section["length"]
+            for block_start in range(start, end, _CHECKSUM_BLOCK):
+                digest.update(self.buffer[block_start:min(block_start + _CHECKSUM_BLOCK, end)])
+            if digest.hexdigest() != section["sha256"]:
+                raise SnapshotError(f"Checksum incorrecto en la sección {name} de {self.path}")
+
+    @property
+    def manifest(self) -> Dict[str, Any]:
+        # Solo se decodifica si se pide: el arranque usa la cabecera
+        if self._manifest is None:
+            section = self._section("manifest")
+            start = self.data_start + section["offset"]
+            self._manifest = json.loads(self.buffer[start:start + section["length"]])
+        return self._manifest
+
+    def vector_index(self) -> NumpyIndex:
+        return NumpyIndex(
+            self._array("embeddings"),
+            self._strings("ids"),
+            self._strings("documents"),
+            self._strings("metadatas", decode=json.loads),
+            fingerprint=self.fingerprint
+        )
+
+    def lexical_index(self) -> BM25Index:
+        return BM25Index(
+            self._strings("ids"),
+            list(self._strings("bm25.terms")),
+            self._array("bm25.indptr"),
+            self._array("bm25.rows"),
+            self._array("bm25.weights"),
+            fingerprint=self.fingerprint,
+            k1=self.header["bm25"]["k1"],
+            b=self.header["bm25"]["b"]
+        )
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "bytes": os.path.getsize(self.path),
+            **{key: value for key, value in self.header.items() if key != "sections"},
+            "sections": {name: section["length"] for name, section in self.header["sections"].items()}
+        }
+
+
+def import_snapshot(source: str, destination: str) -> Dict[str, Any]:
+    """Comprueba los checksums de ``source`` y lo instala en ``destination`` de forma atómica."""
+    IndexSnapshot(source).verify()
+
+    os.makedirs(os.path.dirname(os.path.abspath(destination)), exist_ok=True)
+    tmp_path = f"{destination}.{os.getpid()}.tmp"
+    shutil.copyfile(source, tmp_path)
+    os.replace(tmp_path, destination)
+
+    info = IndexSnapshot(destination).info()
+    logger.info(f"Snapshot importado en {destination} ({info['count']} chunks)")
+    return info
@@ -0,0 +1,128 @@
+import logging
+import queue
+import threading
+import time
+from typing import Any, Dict, List
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EMBED_BATCH_SIZE = 256
+DEFAULT_CHROMA_MAX_BATCH_SIZE = 5461
+
+
+def chroma_max_batch_size(client: Any) -> int:
+    getter = getattr(client, "get_max_batch_size", None)
+    if callable(getter):
+        return getter()
+    return getattr(client, "max_batch_size", DEFAULT_CHROMA_MAX_BATCH_SIZE)
+
+
+class BulkIndexer:
+    def __init__(
+        self,
+        collection: Any,
+        embedding_model: Any,
+        embed_batch_size: int = DEFAULT_EMBED_BATCH_SIZE,
+        write_batch_size: int = DEFAULT_CHROMA_MAX_BATCH_SIZE
+    ):
+        self.collection = collection
+        self.embedding_model = embedding_model
+        self.embed_batch_size = max(1, embed_batch_size)
+        self.write_batch_size = max(1, write_batch_size)
+
+    def index(self, ids: List[str], texts: List[str], metadatas: List[Dict[str, Any]]) -> Dict[str, Any]:
+        total = len(texts)
+        report = {
+            "chunks": total,
+            "embed_batches": 0,
+            "write_batches": 0,
+            "embed_seconds": 0.0,
+            "write_seconds": 0.0,
+            "wall_seconds": 0.0,
+            "chunks_per_second": 0.0
+        }
+        if total == 0:
+            return report
+
+        start_time = time.perf_counter()
+        order = sorted(range(total), key=lambda i: len(texts[i]))
+        pending = queue.Queue(maxsize=2)
+        errors = []
+
+        writer = threading.Thread(
+            target=self._write_loop,
+            args=(pending, report, errors),
+            name="chroma-bulk-writer",
+            daemon=True
+        )
+        writer.start()
+
+        try:
+            for batch_start in range(0, total, self.embed_batch_size):
+                if errors:
+                    break
+
+                batch = order[batch_start:batch_start + self.embed_batch_size]
+                embed_start = time.perf_counter()
+                embeddings = self.embedding_model.embed_documents([texts[i] for i in batch])
+                report["embed_seconds"] += time.perf_counter() - embed_start
+                report["embed_batches"] += 1
+
+                pending.put((
+                    [ids[i] for i in batch],
+                    embeddings,
+                    [texts[i] for i in batch],
+                    [metadatas[i] for i in batch]
+                ))
+                logger.info(f"Embebidos {min(batch_start + len(batch), total)}/{total} chunks")
+        finally:
+            pending.put(None)
+            writer.join()
+
+        if errors:
+            raise errors[0]
+
+        report["wall_seconds"] = time.perf_counter() - start_time
+        report["chunks_per_second"] = total / report["wall_seconds"] if report["wall_seconds"] > 0 else 0.0
+
+        logger.info(
+            f"Indexados {total} chunks en {report['wall_seconds']:.2f}s "
+            f"({report['chunks_per_second']:.1f} chunks/s; embeddings {report['embed_seconds']:.2f}s, "
+            f"escritura {report['write_seconds']:.2f}s)"
+        )
+        return report
+
+    def _write_loop(self, pending: queue.Queue, report: Dict[str, Any], errors: List[Exception]):
+        buffered = []
+
+        while True:
+            item = pending.get()
+            if item is None:
+                break
+            if errors:
+                continue
+
+            try:
+                buffered.extend(zip(*item))
+                # Se escribe en cuanto no hay otro lote esperando, para solapar la escritura
+                # del lote N con el embedding del N+1; write_batch_size (el máximo de Chroma)
+                # solo limita el tamaño de cada upsert cuando la escritura se queda atrás
+                while buffered and (len(buffered) >= self.write_batch_size or pending.empty()):
+                    self._write(buffered[:self.write_batch_size], report)
+                    del buffered[:self.write_batch_size]
+            except Exception as e:
+                errors.append(e)
+
+        if buffered and not errors:
+            try:
+                self._write(buffered, report)
+            except Exception as e:
+                errors.append(e)
+
+    def _write(self, rows: List[tuple], report: Dict[str, Any]):
+        ids, embeddings, documents, metadatas = (list(column) for column in zip(*rows))
+
+        write_start = time.perf_counter()
+        self.collection.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+        report["write_seconds"] += time.perf_counter() - write_start
+        report["write_batches"] += 1
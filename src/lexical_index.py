@@ -0,0 +1,226 @@
+import json
+import logging
+import os
+import re
+import unicodedata
+from collections import Counter
+from typing import Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+RETRIEVAL_MODES = ["dense", "hybrid"]
+
+LEXICAL_INDEX_VERSION = 1
+POSTINGS_FILENAME = "postings.npz"
+VOCABULARY_FILENAME = "vocabulary.json"
+
+DEFAULT_K1 = 1.5
+DEFAULT_B = 0.75
+DEFAULT_RRF_K = 60
+
+TOKEN_PATTERN = re.compile(r"\w+(?:[-./]\w+)*")
+COMBINING_MARKS = re.compile(r"[\u0300-\u036f]")
+COMPOUND_SEPARATORS = re.compile(r"[-./]")
+
+
+def tokenize(text: str) -> List[str]:
+    # Minúsculas y sin tildes; los términos compuestos ("mls-c01") se indexan
+    # completos y también por partes para que "MLS C01" los encuentre
+    text = COMBINING_MARKS.sub("", unicodedata.normalize("NFKD", text.lower()))
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text):
+        tokens.append(token)
+        if COMPOUND_SEPARATORS.search(token):
+            tokens.extend(part for part in COMPOUND_SEPARATORS.split(token) if part)
+    return tokens
+
+
+def lexical_index_directory(vectorstore_path: str) -> str:
+    return os.path.join(vectorstore_path, "bm25_index")
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = DEFAULT_RRF_K) -> List[str]:
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+class BM25Index:
+    def __init__(
+        self,
+        ids: List[str],
+        terms: List[str],
+        indptr: np.ndarray,
+        rows: np.ndarray,
+        weights: np.ndarray,
+        fingerprint: Optional[str] = None,
+        k1: float = DEFAULT_K1,
+        b: float = DEFAULT_B
+    ):
+        self.ids = ids
+        self.terms = terms
+        self.vocabulary = {term: i for i, term in enumerate(terms)}
+        self.indptr = indptr
+        self.rows = rows
+        self.weights = weights
+        self.fingerprint = fingerprint
+        self.k1 = k1
+        self.b = b
+
+    @classmethod
+    def build(
+        cls,
+        ids: List[str],
+        texts: List[str],
+        fingerprint: Optional[str] = None,
+        k1: float = DEFAULT_K1,
+        b: float = DEFAULT_B
+    ) -> "BM25Index":
+        vocabulary = {}
+        term_ids = []
+        rows = []
+        frequencies = []
+        lengths = np.zeros(len(texts), dtype=np.float32)
+
+        for row, text in enumerate(texts):
+            tokens = tokenize(text)
+            lengths[row] = len(tokens)
+            for term, frequency in Counter(tokens).items():
+                term_ids.append(vocabulary.setdefault(term, len(vocabulary)))
+                rows.append(row)
+                frequencies.append(frequency)
+
+        term_ids = np.asarray(term_ids, dtype=np.int64)
+        order = np.argsort(term_ids, kind="stable")
+        term_ids = term_ids[order]
+        rows = np.asarray(rows, dtype=np.int32)[order]
+        frequencies = np.asarray(frequencies, dtype=np.float32)[order]
+
+        document_frequency = np.bincount(term_ids, minlength=len(vocabulary))
+        indptr = np.concatenate([[0], np.cumsum(document_frequency)]).astype(np.int64)
+
+        # Pesos BM25 precalculados por posting: una consulta solo suma pesos
+        idf = np.log1p((len(texts) - document_frequency + 0.5) / (document_frequency + 0.5)).astype(np.float32)
+        average_length = float(lengths.mean()) if len(texts) and lengths.mean() > 0 else 1.0
+        normalization = k1 * (1 - b + b * lengths[rows] / average_length)
+        weights = idf[term_ids] * frequencies * (k1 + 1) / (frequencies + normalization)
+
+        terms = [None] * len(vocabulary)
+        for term, i in vocabulary.items():
+            terms[i] = term
+
+        return cls(list(ids), terms, indptr, rows, weights.astype(np.float32), fingerprint=fingerprint, k1=k1, b=b)
+
+    def search(self, query: str, k: int) -> List[Tuple[str, float]]:
+        term_ids = {self.vocabulary[term] for term in tokenize(query) if term in self.vocabulary}
+        if not term_ids or k <= 0:
+            return []
+
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        for term_id in term_ids:
+            start, end = self.indptr[term_id], self.indptr[term_id + 1]
+            scores[self.rows[start:end]] += self.weights[start:end]
+
+        candidates = np.flatnonzero(scores)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+
+        return [(self.ids[row], float(scores[row])) for row in candidates]
+
+    def save(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+
+        postings_tmp = os.path.join(directory, POSTINGS_FILENAME + ".tmp")
+        with open(postings_tmp, "wb") as f:
+            np.savez(f, indptr=self.indptr, rows=self.rows, weights=self.weights)
+        os.replace(postings_tmp, os.path.join(directory, POSTINGS_FILENAME))
+
+        vocabulary_tmp = os.path.join(directory, VOCABULARY_FILENAME + ".tmp")
+        with open(vocabulary_tmp, "w", encoding="utf-8") as f:
+            json.dump({
+                "version": LEXICAL_INDEX_VERSION,
+                "fingerprint": self.fingerprint,
+                "k1": self.k1,
+                "b": self.b,
+                "ids": self.ids,
+                "terms": self.terms
+            }, f, ensure_ascii=False)
+        os.replace(vocabulary_tmp, os.path.join(directory, VOCABULARY_FILENAME))
+
+        logger.info(f"Índice BM25 guardado en {directory} ({len(self.terms)} términos, {len(self.rows)} postings)")
+
+    @classmethod
+    def load(cls, directory: str) -> Optional["BM25Index"]:
+        postings_path = os.path.join(directory, POSTINGS_FILENAME)
+        vocabulary_path = os.path.join(directory, VOCABULARY_FILENAME)
+        if not (os.path.exists(postings_path) and os.path.exists(vocabulary_path)):
+            return None
+
+        with open(vocabulary_path, "r", encoding="utf-8") as f:
+            sidecar = json.load(f)
+        if sidecar.get("version") != LEXICAL_INDEX_VERSION:
+            return None
+
+        with np.load(postings_path) as postings:
+            return cls(
+                sidecar["ids"],
+                sidecar["terms"],
+                postings["indptr"],
+                postings["rows"],
+                postings["weights"],
+                fingerprint=sidecar.get("fingerprint"),
+                k1=sidecar["k1"],
+                b=sidecar["b"]
+            )
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+def load_lexical_index(vectorstore_path: str, fingerprint: Optional[str] = None) -> Optional[BM25Index]:
+    directory = lexical_index_directory(vectorstore_path)
+
+    try:
+        index = BM25Index.load(directory)
+    except Exception as e:
+        logger.warning(f"No se pudo cargar el índice BM25 desde {directory}: {e}")
+        return None
+
+    if index is None:
+        return None
+    if fingerprint is not None and index.fingerprint != fingerprint:
+        logger.info("Índice BM25 desactualizado respecto al manifest")
+        return None
+
+    return index
+
+
+def hybrid_search_many(
+    vector_index: Any,
+    lexical_index: BM25Index,
+    questions: Sequence[str],
+    query_embeddings: Sequence[Sequence[float]],
+    k: int,
+    candidates: int = 20,
+    rrf_k: int = DEFAULT_RRF_K
+) -> List[List[Any]]:
+    dense_results = vector_index.search_many(query_embeddings, max(k, candidates))
+    results = []
+
+    for question, dense_documents in zip(questions, dense_results):
+        lexical_ids = [doc_id for doc_id, _ in lexical_index.search(question, candidates)]
+        fused_ids = reciprocal_rank_fusion([[doc.id for doc in dense_documents], lexical_ids], k=rrf_k)[:k]
+
+        by_id = {doc.id: doc for doc in dense_documents}
+        missing = [doc_id for doc_id in fused_ids if doc_id not in by_id]
+        if missing:
+            by_id.update((doc.id, doc) for doc in vector_index.get_documents(missing))
+
+        results.append([by_id[doc_id] for doc_id in fused_ids if doc_id in by_id])
+
+    return results
@@ -0,0 +1,209 @@
+import asyncio
+import logging
+import re
+import threading
+import time
+import weakref
+from typing import Any, AsyncIterator, Iterator, List, Optional, Protocol
+
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+logger = logging.getLogger(__name__)
+
+LLM_BACKENDS = ["openai", "local", "fake"]
+
+DEFAULT_MAX_CONNECTIONS = 20
+DEFAULT_KEEPALIVE_EXPIRY = 30.0
+DEFAULT_REQUEST_TIMEOUT = 60.0
+
+
+class LLMBackend(Protocol):
+    def invoke(self, prompt: str) -> Any: ...
+
+    def stream(self, prompt: str) -> Iterator[Any]: ...
+
+    async def ainvoke(self, prompt: str) -> Any: ...
+
+    def astream(self, prompt: str) -> AsyncIterator[Any]: ...
+
+
+DEFAULT_FAKE_RESPONSE = (
+    "Según el documento, la información solicitada se encuentra en el contexto proporcionado. "
+    "Esta es una respuesta simulada generada sin conexión para pruebas de rendimiento."
+)
+
+
+class FakeStreamingLLM:
+    def __init__(
+        self,
+        response: str = DEFAULT_FAKE_RESPONSE,
+        first_token_latency: float = 0.0,
+        tokens_per_second: float = 0.0
+    ):
+        self.response = response
+        self.first_token_latency = first_token_latency
+        self.tokens_per_second = tokens_per_second
+        self.model_name = "fake-streaming-llm"
+
+    def _tokens(self) -> List[str]:
+        return re.findall(r"\S+\s*", self.response)
+
+    def _token_delay(self) -> float:
+        return 1.0 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+    def invoke(self, prompt: str) -> AIMessage:
+        return AIMessage(content="".join(chunk.content for chunk in self.stream(prompt)))
+
+    def stream(self, prompt: str) -> Iterator[AIMessageChunk]:
+        if self.first_token_latency > 0:
+            time.sleep(self.first_token_latency)
+        delay = self._token_delay()
+
+        for i, token in enumerate(self._tokens()):
+            if i > 0 and delay > 0:
+                time.sleep(delay)
+            yield AIMessageChunk(content=token)
+
+    async def ainvoke(self, prompt: str) -> AIMessage:
+        chunks = [chunk.content async for chunk in self.astream(prompt)]
+        return AIMessage(content="".join(chunks))
+
+    async def astream(self, prompt: str) -> AsyncIterator[AIMessageChunk]:
+        if self.first_token_latency > 0:
+            await asyncio.sleep(self.first_token_latency)
+        delay = self._token_delay()
+
+        for i, token in enumerate(self._tokens()):
+            if i > 0 and delay > 0:
+                await asyncio.sleep(delay)
+            yield AIMessageChunk(content=token)
+
+
+_http_clients = {}
+_http_clients_lock = threading.Lock()
+
+
+def _loop_local_async_client(**client_kwargs) -> Any:
+    """``httpx.AsyncClient`` con un pool de conexiones por event loop.
+
+    Las conexiones de un ``AsyncClient`` quedan ligadas al loop que las abrió, y
+    ``ask_many`` ejecuta cada lote en un loop nuevo: un único pool compartido
+    falla con "Event loop is closed" a partir del segundo lote. ``ChatOpenAI``
+    solo llama a ``send`` y ``aclose``, que se delegan al cliente del loop en
+    curso. Quien crea el loop debe cerrar su pool antes de cerrarlo (ver
+    ``aclose_loop_http_clients``); si no, se descarta sin cerrar al liberarse.
+    """
+    import httpx
+
+    class LoopLocalAsyncClient(httpx.AsyncClient):
+        def __init__(self, **kwargs):
+            super().__init__(**kwargs)
+            self._client_kwargs = kwargs
+            self._loop_clients = weakref.WeakKeyDictionary()
+            self._loop_clients_lock = threading.Lock()
+
+        def _loop_client(self) -> httpx.AsyncClient:
+            loop = asyncio.get_running_loop()
+            with self._loop_clients_lock:
+                client = self._loop_clients.get(loop)
+                if client is None:
+                    client = httpx.AsyncClient(**self._client_kwargs)
+                    self._loop_clients[loop] = client
+                return client
+
+        async def send(self, request, **kwargs):
+            return await self._loop_client().send(request, **kwargs)
+
+        async def aclose(self):
+            with self._loop_clients_lock:
+                client = self._loop_clients.pop(asyncio.get_running_loop(), None)
+            if client is not None:
+                await client.aclose()
+
+    return LoopLocalAsyncClient(**client_kwargs)
+
+
+def shared_http_clients(max_connections: int = DEFAULT_MAX_CONNECTIONS) -> Any:
+    """Par (cliente síncrono, cliente asíncrono) httpx compartido por todos los agentes.
+
+    Las conexiones keep-alive se reutilizan entre peticiones y entre agentes en
+    lugar de abrir un pool por cada instancia de ``ChatOpenAI``. El cliente
+    asíncrono mantiene un pool por event loop (ver ``_loop_local_async_client``).
+    """
+    import httpx
+
+    with _http_clients_lock:
+        clients = _http_clients.get(max_connections)
+        if clients is None:
+            limits = httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+                keepalive_expiry=DEFAULT_KEEPALIVE_EXPIRY
+            )
+            timeout = httpx.Timeout(DEFAULT_REQUEST_TIMEOUT, connect=10.0)
+            clients = (
+                httpx.Client(limits=limits, timeout=timeout),
+                _loop_local_async_client(limits=limits, timeout=timeout)
+            )
+            _http_clients[max_connections] = clients
+        return clients
+
+
+async def aclose_loop_http_clients():
+    """Cierra los pools asíncronos compartidos abiertos en el event loop en curso.
+
+    Se llama antes de cerrar un loop propio (p. ej. el de cada ``ask_many``) para
+    que sus conexiones keep-alive no queden abiertas al descartar el loop.
+    """
+    with _http_clients_lock:
+        async_clients = [async_client for _, async_client in _http_clients.values()]
+    for async_client in async_clients:
+        await async_client.aclose()
+
+
+def create_llm(
+    backend: str = "openai",
+    model: str = "gpt-3.5-turbo",
+    temperature: float = 0.1,
+    max_tokens: int = 500,
+    api_key: Optional[str] = None,
+    base_url: Optional[str] = None,
+    max_connections: int = DEFAULT_MAX_CONNECTIONS,
+    fake_first_token_latency: float = 0.0,
+    fake_tokens_per_second: float = 0.0
+) -> Any:
+    """Crea el cliente LLM del agente.
+
+    Todos los backends exponen ``invoke``, ``stream``, ``ainvoke`` y ``astream``
+    devolviendo mensajes con ``content``, que es lo único que usa ``RAGAgent``.
+    ``local`` apunta a cualquier servidor compatible con la API de OpenAI
+    (vLLM, llama.cpp, Ollama...) y ``fake`` no hace ninguna llamada de red.
+    """
+    if backend not in LLM_BACKENDS:
+        raise ValueError(f"Backend LLM desconocido: {backend}. Disponibles: {', '.join(LLM_BACKENDS)}")
+
+    if backend == "fake":
+        logger.info("Usando LLM simulado sin conexión")
+        return FakeStreamingLLM(
+            first_token_latency=fake_first_token_latency,
+            tokens_per_second=fake_tokens_per_second
+        )
+
+    if backend == "local" and not base_url:
+        raise ValueError("El backend 'local' necesita la URL del servidor (base_url)")
+
+    from langchain_openai import ChatOpenAI
+
+    http_client, http_async_client = shared_http_clients(max_connections)
+    logger.info(f"Inicializando cliente LLM ({backend}): {model}" + (f" en {base_url}" if base_url else ""))
+
+    return ChatOpenAI(
+        model=model,
+        temperature=temperature,
+        # Los servidores locales suelen ignorar la clave, pero el cliente exige una
+        openai_api_key=api_key or ("not-needed" if backend == "local" else None),
+        openai_api_base=base_url,
+        max_tokens=max_tokens,
+        http_client=http_client,
+        http_async_client=http_async_client
+    )
@@ -0,0 +1,214 @@
+import json
+import logging
+import random
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from .config import PROJECT_ROOT, EVALUATION_QUESTIONS
+from .metrics import MetricsRegistry
+
+logger = logging.getLogger(__name__)
+
+QUESTION_MIXES = ["uniform", "zipf", "sequential"]
+
+
+def load_questions(path: Optional[str] = None) -> List[str]:
+    """Preguntas de ``EVALUATION_QUESTIONS`` o de un JSONL (``{"question": ...}`` o cadenas)."""
+    if path is None:
+        return list(EVALUATION_QUESTIONS)
+
+    questions = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            questions.append(record["question"] if isinstance(record, dict) else str(record))
+
+    if not questions:
+        raise ValueError(f"No hay preguntas en {path}")
+    return questions
+
+
+def question_sequence(questions: List[str], requests: int, mix: str = "uniform", seed: int = 0) -> List[str]:
+    if mix not in QUESTION_MIXES:
+        raise ValueError(f"Mezcla de preguntas desconocida: {mix}. Disponibles: {', '.join(QUESTION_MIXES)}")
+
+    rng = random.Random(seed)
+    if mix == "sequential":
+        return [questions[i % len(questions)] for i in range(requests)]
+    if mix == "zipf":
+        # Pocas preguntas muy populares y una cola larga, como en el chat compartido
+        weights = [1.0 / (rank + 1) for rank in range(len(questions))]
+        return rng.choices(questions, weights=weights, k=requests)
+    return [rng.choice(questions) for _ in range(requests)]
+
+
+def _max_rss_mb() -> Optional[float]:
+    try:
+        import resource
+    except ImportError:
+        return None
+    # ru_maxrss está en KB en Linux y en bytes en macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1024 / 1024 if rss > 1 << 32 else rss / 1024
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=PROJECT_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def _ask(agent: Any, question: str, stream: bool) -> Dict[str, Any]:
+    if not stream:
+        return agent.ask(question)
+
+    result = None
+    for event in agent.ask_stream(question):
+        if event["type"] == "end":
+            result = event
+    return result
+
+
+def run_load_test(
+    agent: Any,
+    questions: List[str],
+    requests: int = 200,
+    concurrency: int = 8,
+    rate: Optional[float] = None,
+    mix: str = "uniform",
+    stream: bool = False,
+    seed: int = 0
+) -> Dict[str, Any]:
+    """Lanza ``requests`` preguntas contra ``agent`` y resume rendimiento y latencias.
+
+    Sin ``rate`` es un bucle cerrado: ``concurrency`` usuarios que preguntan en
+    cuanto reciben respuesta. Con ``rate`` (peticiones/s) las llegadas siguen un
+    proceso de Poisson y la latencia incluye la espera en cola, así que se ve la
+    saturación en lugar de quedar oculta por la propia carga.
+    """
+    sequence = question_sequence(questions, requests, mix=mix, seed=seed)
+    stats_before = agent.get_stats()
+    stages = MetricsRegistry()
+    latencies = MetricsRegistry()
+    lock = threading.Lock()
+    outcome = {"errors": 0, "cache_hits": 0, "coalesced": 0}
+
+    def handle(question: str, scheduled: float):
+        result = _ask(agent, question, stream)
+        latency = time.perf_counter() - scheduled
+        metadata = result.get("metadata", {})
+
+        with lock:
+            if not result.get("success"):
+                outcome["errors"] += 1
+                return
+            outcome["cache_hits"] += bool(metadata.get("cache_hit"))
+            outcome["coalesced"] += bool(metadata.get("coalesced"))
+
+        latencies.observe("end_to_end", latency)
+        stages.observe_many(metadata.get("stage_latency", {}))
+        if "time_to_first_token" in metadata:
+            stages.observe("ttft", metadata["time_to_first_token"])
+
+    rng = random.Random(seed)
+    start_time = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="rag-load") as executor:
+        if rate is None:
+            futures = [executor.submit(lambda q=q: handle(q, time.perf_counter())) for q in sequence]
+        else:
+            futures = []
+            arrival = start_time
+            for question in sequence:
+                arrival += rng.expovariate(rate)
+                delay = arrival - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                futures.append(executor.submit(handle, question, arrival))
+        for future in futures:
+            future.result()
+
+    wall_seconds = time.perf_counter() - start_time
+    stats_after = agent.get_stats()
+    successful = requests - outcome["errors"]
+
+    report = {
+        "requests": requests,
+        "concurrency": concurrency,
+        "arrival_rate": rate,
+        "mix": mix,
+        "stream": stream,
+        "distinct_questions": len(set(sequence)),
+        "wall_seconds": wall_seconds,
+        "qps": successful / wall_seconds if wall_seconds > 0 else 0.0,
+        "errors": outcome["errors"],
+        "answer_cache_hit_rate": outcome["cache_hits"] / successful if successful else 0.0,
+        "coalesced_rate": outcome["coalesced"] / successful if successful else 0.0,
+        "latency": latencies.snapshot().get("end_to_end", {}),
+        "stage_latency": stages.snapshot(),
+        "max_rss_mb": _max_rss_mb()
+    }
+
+    embedding_before = stats_before.get("embedding_cache", {})
+    embedding_after = stats_after.get("embedding_cache", {})
+    if embedding_after:
+        hits = embedding_after.get("memory_hits", 0) - embedding_before.get("memory_hits", 0)
+        hits += embedding_after.get("disk_hits", 0) - embedding_before.get("disk_hits", 0)
+        misses = embedding_after.get("misses", 0) - embedding_before.get("misses", 0)
+        report["embedding_cache_hit_rate"] = hits / (hits + misses) if hits + misses else 0.0
+
+    return report
+
+
+def run_load_suite(
+    agent: Any,
+    questions: List[str],
+    concurrency_levels: List[int],
+    requests: int = 200,
+    rate: Optional[float] = None,
+    mix: str = "uniform",
+    stream: bool = False,
+    seed: int = 0,
+    warmup: int = 10
+) -> Dict[str, Any]:
+    agent.wait_until_ready()
+    if warmup:
+        # Calienta modelos y tokenizers; no cuenta en los resultados
+        run_load_test(agent, questions, requests=warmup, concurrency=1, mix=mix, seed=seed + 1)
+
+    results = []
+    for concurrency in concurrency_levels:
+        logger.info(f"Carga: {requests} peticiones, concurrencia {concurrency}")
+        results.append(run_load_test(
+            agent, questions, requests=requests, concurrency=concurrency,
+            rate=rate, mix=mix, stream=stream, seed=seed
+        ))
+
+    stats = agent.get_stats()
+    return {
+        "benchmark": "load",
+        "git_revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "agent": {
+            "llm_backend": stats.get("llm_backend"),
+            "index_backend": stats.get("index_backend"),
+            "retrieval_mode": stats.get("retrieval_mode"),
+            "reranker": getattr(agent, "reranker", None) is not None,
+            "answer_cache": getattr(agent, "answer_cache", None) is not None,
+            "vectorstore_documents": stats.get("vectorstore_documents")
+        },
+        "startup_latency": {
+            stage: summary["mean"] for stage, summary in stats.get("latency", {}).items() if stage.startswith("init_")
+        },
+        "results": results
+    }
@@ -0,0 +1,177 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+METRIC_NAME = "rag_stage_latency_seconds"
+METRIC_HELP = "Latencia por etapa del agente RAG"
+QUANTILES = [0.5, 0.95, 0.99]
+
+# Buckets geométricos (factor 1.5) de 0.5 ms a ~2 min: el error de los percentiles
+# interpolados está acotado por el ancho de un bucket
+DEFAULT_BUCKETS = [0.0005 * 1.5 ** i for i in range(31)]
+
+_DISABLED_SPAN = nullcontext()
+
+
+class LatencyHistogram:
+    def __init__(self, buckets: List[float] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+
+        rank = q * self.count
+        cumulative = 0
+        for i, count in enumerate(self.counts):
+            if cumulative + count >= rank and count:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.max
+                value = lower + (upper - lower) * (rank - cumulative) / count
+                return min(max(value, self.min), self.max)
+            cumulative += count
+        return self.max
+
+    def summary(self) -> Dict[str, float]:
+        summary = {"count": self.count, "mean": self.sum / self.count if self.count else 0.0}
+        for q in QUANTILES:
+            summary[f"p{int(q * 100)}"] = self.quantile(q)
+        return summary
+
+
+class MetricsRegistry:
+    """Histogramas de latencia por etapa (embedding, búsqueda, LLM...).
+
+    Desactivado, ``observe`` y ``span`` retornan sin tomar el lock ni medir.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        buckets: List[float] = DEFAULT_BUCKETS,
+        name: str = METRIC_NAME,
+        help_text: str = METRIC_HELP
+    ):
+        self.enabled = enabled
+        self.buckets = buckets
+        self.name = name
+        self.help_text = help_text
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float):
+        if not self.enabled:
+            return
+        with self.lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = LatencyHistogram(self.buckets)
+            histogram.observe(seconds)
+
+    def observe_many(self, timings: Dict[str, float]):
+        if not self.enabled:
+            return
+        for stage, seconds in timings.items():
+            self.observe(stage, seconds)
+
+    def span(self, stage: str) -> Any:
+        if not self.enabled:
+            return _DISABLED_SPAN
+        return self._span(stage)
+
+    @contextmanager
+    def _span(self, stage: str) -> Iterator[None]:
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start_time)
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self.lock:
+            return {stage: histogram.summary() for stage, histogram in sorted(self.histograms.items())}
+
+    def prometheus_text(self, counters: Optional[Dict[str, float]] = None) -> str:
+        lines = []
+
+        for name, value in (counters or {}).items():
+            lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name} {value}")
+
+        name = self.name
+        lines.append(f"# HELP {name} {self.help_text}")
+        lines.append(f"# TYPE {name} histogram")
+        with self.lock:
+            for stage, histogram in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{stage="{stage}",le="{bound:.6g}"}} {cumulative}')
+                lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+                lines.append(f'{name}_sum{{stage="{stage}"}} {histogram.sum:.6f}')
+                lines.append(f'{name}_count{{stage="{stage}"}} {histogram.count}')
+
+        return "\n".join(lines) + "\n"
+
+
+_servers = {}
+_servers_lock = threading.Lock()
+
+
+def start_metrics_server(render: Callable[[], str], host: str = "127.0.0.1", port: int = 9108) -> Optional[ThreadingHTTPServer]:
+    """Sirve ``render()`` en ``http://host:port/metrics`` desde un hilo daemon.
+
+    Llamarla de nuevo con el mismo puerto solo cambia la función que genera
+    el texto (p. ej. cuando Streamlit recrea el agente compartido).
+    """
+    with _servers_lock:
+        server = _servers.get((host, port))
+        if server is not None:
+            server.render = render
+            return server
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = self.server.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        try:
+            server = ThreadingHTTPServer((host, port), Handler)
+        except OSError as e:
+            logger.warning(f"No se pudo iniciar el endpoint de métricas en {host}:{port}: {e}")
+            return None
+
+        server.daemon_threads = True
+        server.render = render
+        threading.Thread(target=server.serve_forever, name="rag-metrics", daemon=True).start()
+        _servers[(host, port)] = server
+        logger.info(f"Métricas Prometheus en http://{host}:{port}/metrics")
+        return server
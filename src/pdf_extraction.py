@@ -0,0 +1,186 @@
+import gzip
+import json
+import logging
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional, Tuple
+
+try:
+    from .index_manifest import hash_file
+except ImportError:
+    from index_manifest import hash_file
+
+logger = logging.getLogger(__name__)
+
+PAGES_PER_SHARD = 8
+
+# "pdfplumber" conserva mejor el orden y los espacios del texto; "pypdf" es varias veces más rápido
+PDF_EXTRACTORS = ["pdfplumber", "pypdf"]
+
+PAGE_CACHE_VERSION = 1
+
+
+def _validate_extractor(extractor: str):
+    if extractor not in PDF_EXTRACTORS:
+        raise ValueError(f"Extractor de PDF desconocido: {extractor}. Disponibles: {', '.join(PDF_EXTRACTORS)}")
+
+
+def count_pdf_pages(pdf_path: str, extractor: str = "pdfplumber") -> int:
+    if extractor == "pypdf":
+        from pypdf import PdfReader
+
+        return len(PdfReader(pdf_path).pages)
+
+    import pdfplumber
+
+    with pdfplumber.open(pdf_path) as pdf:
+        return len(pdf.pages)
+
+
+def _extract_page_range(
+    pdf_path: str,
+    start: int,
+    end: int,
+    extractor: str = "pdfplumber"
+) -> List[Tuple[int, str]]:
+    if extractor == "pypdf":
+        from pypdf import PdfReader
+
+        reader = PdfReader(pdf_path)
+        return [(index + 1, reader.pages[index].extract_text() or "") for index in range(start, end)]
+
+    import pdfplumber
+
+    pages = []
+    with pdfplumber.open(pdf_path) as pdf:
+        for index in range(start, end):
+            page = pdf.pages[index]
+            pages.append((index + 1, page.extract_text() or ""))
+            page.close()
+    return pages
+
+
+def _iter_pages_serial(pdf_path: str, extractor: str = "pdfplumber") -> Iterator[Tuple[int, str]]:
+    if extractor == "pypdf":
+        from pypdf import PdfReader
+
+        for index, page in enumerate(PdfReader(pdf_path).pages):
+            yield index + 1, page.extract_text() or ""
+        return
+
+    import pdfplumber
+
+    with pdfplumber.open(pdf_path) as pdf:
+        for index, page in enumerate(pdf.pages):
+            yield index + 1, page.extract_text() or ""
+            page.close()
+
+
+def _extract_pages(
+    pdf_path: str,
+    workers: int,
+    pages_per_shard: int,
+    extractor: str
+) -> Iterator[Tuple[int, str]]:
+    if workers <= 1:
+        yield from _iter_pages_serial(pdf_path, extractor)
+        return
+
+    total_pages = count_pdf_pages(pdf_path, extractor)
+    pages_per_shard = max(1, min(pages_per_shard, -(-total_pages // workers)))
+    if pages_per_shard >= total_pages:
+        yield from _iter_pages_serial(pdf_path, extractor)
+        return
+
+    shards = [
+        (start, min(start + pages_per_shard, total_pages))
+        for start in range(0, total_pages, pages_per_shard)
+    ]
+    logger.info(f"Extrayendo {total_pages} páginas en {len(shards)} rangos con {workers} procesos ({extractor})")
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        next_shard = 0
+        max_in_flight = workers * 2
+
+        while next_shard < len(shards) or pending:
+            while next_shard < len(shards) and len(pending) < max_in_flight:
+                start, end = shards[next_shard]
+                pending.append(executor.submit(_extract_page_range, pdf_path, start, end, extractor))
+                next_shard += 1
+
+            for page in pending.popleft().result():
+                yield page
+
+
+class PageTextCache:
+    """Texto extraído por página, en disco, por hash del PDF y extractor.
+
+    Cada PDF ocupa un único fichero gzip con la lista de páginas (la posición
+    es el índice de página), así que reindexar con otro tamaño de chunk u otro
+    modelo de embeddings no vuelve a parsear el PDF. Un PDF modificado cambia
+    de hash y no reutiliza nada.
+    """
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+
+    def _path(self, pdf_hash: str, extractor: str) -> str:
+        return os.path.join(self.cache_dir, f"{pdf_hash}.{extractor}.json.gz")
+
+    def load(self, pdf_hash: str, extractor: str) -> Optional[List[str]]:
+        path = self._path(pdf_hash, extractor)
+        if not os.path.exists(path):
+            return None
+
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Caché de páginas ilegible en {path}: {e}")
+            return None
+
+        if entry.get("version") != PAGE_CACHE_VERSION or entry.get("pdf_hash") != pdf_hash:
+            return None
+        return entry["pages"]
+
+    def save(self, pdf_hash: str, extractor: str, pages: List[str]):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(pdf_hash, extractor)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+
+        entry = {"version": PAGE_CACHE_VERSION, "pdf_hash": pdf_hash, "extractor": extractor, "pages": pages}
+        with gzip.open(tmp_path, "wt", encoding="utf-8", compresslevel=6) as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+        logger.info(f"Caché de páginas guardada en {path} ({len(pages)} páginas)")
+
+
+def iter_pdf_pages(
+    pdf_path: str,
+    workers: int = 1,
+    pages_per_shard: int = PAGES_PER_SHARD,
+    extractor: str = "pdfplumber",
+    cache: Optional[PageTextCache] = None,
+    pdf_hash: Optional[str] = None
+) -> Iterator[Tuple[int, str]]:
+    _validate_extractor(extractor)
+    if cache is None:
+        yield from _extract_pages(pdf_path, workers, pages_per_shard, extractor)
+        return
+
+    pdf_hash = pdf_hash or hash_file(pdf_path)
+    cached_pages = cache.load(pdf_hash, extractor)
+    if cached_pages is not None:
+        logger.info(f"Texto de {len(cached_pages)} páginas leído de la caché ({extractor})")
+        yield from enumerate(cached_pages, start=1)
+        return
+
+    # Solo se guarda si se consumen todas las páginas
+    pages = []
+    for page_number, page_text in _extract_pages(pdf_path, workers, pages_per_shard, extractor):
+        pages.append(page_text)
+        yield page_number, page_text
+    cache.save(pdf_hash, extractor, pages)
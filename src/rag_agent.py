@@ -1,24 +1,84 @@
 import os
+import time
+import random
+import asyncio
 import logging
+import threading
+import uuid
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterable, Iterator, Tuple, AsyncIterator
 import warnings
 warnings.filterwarnings('ignore')
 
-import pdfplumber
-from langchain_community.embeddings import SentenceTransformerEmbeddings
-from langchain_community.vectorstores import Chroma
-from langchain_openai import ChatOpenAI
-from langchain_core.prompts import PromptTemplate
 from langchain_core.documents import Document
 import numpy as np
 from dotenv import load_dotenv
 
+try:
+    from .pdf_extraction import PDF_EXTRACTORS, PageTextCache, iter_pdf_pages
+    from .chunking import (
+        CHUNK_UNITS, iter_chunk_offsets, iter_chunks_stream, load_tokenizer, max_chunk_tokens, token_starts, count_llm_tokens
+    )
+    from .reranker import CrossEncoderReranker, DEFAULT_RERANK_MODEL
+    from .context_builder import build_context
+    from .single_flight import SingleFlight, normalize_question
+    from .metrics import MetricsRegistry
+    from .llm_backends import (
+        LLM_BACKENDS, LLMBackend, create_llm, aclose_loop_http_clients, DEFAULT_MAX_CONNECTIONS, DEFAULT_REQUEST_TIMEOUT
+    )
+    from .lexical_index import (
+        RETRIEVAL_MODES, BM25Index, load_lexical_index, lexical_index_directory, hybrid_search_many
+    )
+    from .index_manifest import (
+        hash_file, load_manifest, save_manifest, build_manifest, manifest_entry, manifest_fingerprint, plan_sync
+    )
+    from .indexing import BulkIndexer, chroma_max_batch_size
+    from .embedding_cache import CachedEmbeddings
+    from .embedding_backends import EMBEDDING_BACKENDS, create_embeddings
+    from .embedding_batcher import BatchingEmbeddings, DEFAULT_BATCH_WINDOW_MS, DEFAULT_MAX_BATCH_SIZE
+    from .answer_cache import AnswerCache
+    from .index_snapshot import IndexSnapshot, export_snapshot
+    from .vector_index import (
+        VectorIndex, ChromaIndex, NumpyIndex, INDEX_CLASSES, resolve_backend, load_index, index_directory
+    )
+except ImportError:
+    from pdf_extraction import PDF_EXTRACTORS, PageTextCache, iter_pdf_pages
+    from chunking import (
+        CHUNK_UNITS, iter_chunk_offsets, iter_chunks_stream, load_tokenizer, max_chunk_tokens, token_starts, count_llm_tokens
+    )
+    from reranker import CrossEncoderReranker, DEFAULT_RERANK_MODEL
+    from context_builder import build_context
+    from single_flight import SingleFlight, normalize_question
+    from metrics import MetricsRegistry
+    from llm_backends import (
+        LLM_BACKENDS, LLMBackend, create_llm, aclose_loop_http_clients, DEFAULT_MAX_CONNECTIONS, DEFAULT_REQUEST_TIMEOUT
+    )
+    from lexical_index import (
+        RETRIEVAL_MODES, BM25Index, load_lexical_index, lexical_index_directory, hybrid_search_many
+    )
+    from index_manifest import (
+        hash_file, load_manifest, save_manifest, build_manifest, manifest_entry, manifest_fingerprint, plan_sync
+    )
+    from indexing import BulkIndexer, chroma_max_batch_size
+    from embedding_cache import CachedEmbeddings
+    from embedding_backends import EMBEDDING_BACKENDS, create_embeddings
+    from embedding_batcher import BatchingEmbeddings, DEFAULT_BATCH_WINDOW_MS, DEFAULT_MAX_BATCH_SIZE
+    from answer_cache import AnswerCache
+    from index_snapshot import IndexSnapshot, export_snapshot
+    from vector_index import (
+        VectorIndex, ChromaIndex, NumpyIndex, INDEX_CLASSES, resolve_backend, load_index, index_directory
+    )
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 load_dotenv()
 
+# (embedding de la pregunta, chunks recuperados, latencia por etapa en segundos)
+Retrieved = Tuple[List[float], List[Document], Dict[str, float]]
+
 
 class RAGAgent:
     def __init__(
@@ -26,43 +86,174 @@ class RAGAgent:
         pdf_path: str,
         vectorstore_path: str = "./data/vectorstore",
         embedding_model: str = "sentence-transformers/all-MiniLM-L6-v2",
+        embedding_backend: str = "torch",
+        onnx_model_dir: Optional[str] = None,
         llm_model: str = "gpt-3.5-turbo",
         chunk_size: int = 1500,
         chunk_overlap: int = 300,
+        chunk_unit: str = "chars",
         temperature: float = 0.1,
-        openai_api_key: Optional[str] = None
+        openai_api_key: Optional[str] = None,
+        extraction_workers: int = 1,
+        pdf_extractor: str = "pdfplumber",
+        page_cache_dir: Optional[str] = None,
+        use_page_cache: bool = True,
+        embedding_batch_size: int = 256,
+        embedding_cache_dir: Optional[str] = None,
+        embedding_cache_memory_entries: int = 4096,
+        embedding_cache_max_mb: int = 256,
+        use_embedding_cache: bool = True,
+        batch_query_embeddings: bool = False,
+        query_batch_window_ms: float = DEFAULT_BATCH_WINDOW_MS,
+        query_batch_max_size: int = DEFAULT_MAX_BATCH_SIZE,
+        use_answer_cache: bool = True,
+        answer_cache_threshold: float = 0.95,
+        answer_cache_ttl: float = 3600,
+        answer_cache_max_entries: int = 256,
+        coalesce_requests: bool = True,
+        embeddings: Optional[Any] = None,
+        llm: Optional[LLMBackend] = None,
+        llm_backend: str = "openai",
+        llm_base_url: Optional[str] = None,
+        llm_max_tokens: int = 500,
+        llm_max_connections: int = DEFAULT_MAX_CONNECTIONS,
+        fake_llm_latency: float = 0.0,
+        fake_llm_tokens_per_second: float = 0.0,
+        llm_max_concurrency: int = 4,
+        llm_max_retries: int = 5,
+        index_backend: str = "chroma",
+        snapshot_path: Optional[str] = None,
+        verify_snapshot: bool = False,
+        retrieval_mode: str = "dense",
+        hybrid_candidates: int = 20,
+        rrf_k: int = 60,
+        use_reranker: bool = False,
+        rerank_model: str = DEFAULT_RERANK_MODEL,
+        rerank_candidates: int = 30,
+        rerank_batch_size: int = 32,
+        context_token_budget: Optional[int] = None,
+        enable_metrics: bool = False
     ):
         self.pdf_path = pdf_path
         self.vectorstore_path = vectorstore_path
         self.embedding_model_name = embedding_model
+        if embedding_backend not in EMBEDDING_BACKENDS:
+            raise ValueError(
+                f"Backend de embeddings desconocido: {embedding_backend}. Disponibles: {', '.join(EMBEDDING_BACKENDS)}"
+            )
+        self.embedding_backend = embedding_backend
+        self.onnx_model_dir = onnx_model_dir or os.path.join(
+            os.path.dirname(os.path.abspath(vectorstore_path)), "onnx_models"
+        )
         self.llm_model = llm_model
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
+        if chunk_unit not in CHUNK_UNITS:
+            raise ValueError(f"Unidad de chunk desconocida: {chunk_unit}. Disponibles: {', '.join(CHUNK_UNITS)}")
+        self.chunk_unit = chunk_unit
         self.temperature = temperature
         self.openai_api_key = openai_api_key or os.getenv("OPENAI_API_KEY")
+        self.extraction_workers = extraction_workers
+        if pdf_extractor not in PDF_EXTRACTORS:
+            raise ValueError(f"Extractor de PDF desconocido: {pdf_extractor}. Disponibles: {', '.join(PDF_EXTRACTORS)}")
+        self.pdf_extractor = pdf_extractor
+        self.page_cache_dir = page_cache_dir or os.path.join(
+            os.path.dirname(os.path.abspath(vectorstore_path)), "page_cache"
+        )
+        self.use_page_cache = use_page_cache
+        self.page_cache = PageTextCache(self.page_cache_dir) if use_page_cache else None
+        self.embedding_batch_size = embedding_batch_size
+        self.embedding_cache_dir = embedding_cache_dir or os.path.join(
+            os.path.dirname(os.path.abspath(vectorstore_path)), "embedding_cache"
+        )
+        self.embedding_cache_memory_entries = embedding_cache_memory_entries
+        self.embedding_cache_max_mb = embedding_cache_max_mb
+        self.use_embedding_cache = use_embedding_cache
+        self.batch_query_embeddings = batch_query_embeddings
+        self.query_batch_window_ms = query_batch_window_ms
+        self.query_batch_max_size = query_batch_max_size
+        self.query_batcher = None
+        self.answer_cache = AnswerCache(
+            similarity_threshold=answer_cache_threshold,
+            ttl_seconds=answer_cache_ttl,
+            max_entries=answer_cache_max_entries
+        ) if use_answer_cache else None
         
-        self.embedding_model = None
+        self.embedding_model = embeddings
         self.vectorstore = None
+        self.index = None
         self.qa_chain = None
+        self.retriever = None
+        self.llm = llm
+        if llm_backend not in LLM_BACKENDS:
+            raise ValueError(f"Backend LLM desconocido: {llm_backend}. Disponibles: {', '.join(LLM_BACKENDS)}")
+        self.llm_backend = llm_backend
+        self.llm_base_url = llm_base_url
+        self.llm_max_tokens = llm_max_tokens
+        self.llm_max_connections = llm_max_connections
+        self.fake_llm_latency = fake_llm_latency
+        self.fake_llm_tokens_per_second = fake_llm_tokens_per_second
+        self.llm_max_concurrency = llm_max_concurrency
+        self.llm_max_retries = llm_max_retries
+        self.index_backend = index_backend
+        self.snapshot_path = snapshot_path
+        self.verify_snapshot = verify_snapshot
+        self.snapshot = None
+        if retrieval_mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Modo de recuperación desconocido: {retrieval_mode}. Disponibles: {', '.join(RETRIEVAL_MODES)}")
+        self.retrieval_mode = retrieval_mode
+        self.hybrid_candidates = hybrid_candidates
+        self.rrf_k = rrf_k
+        self.lexical_index = None
+        self.reranker = CrossEncoderReranker(rerank_model, batch_size=rerank_batch_size) if use_reranker else None
+        self.rerank_candidates = rerank_candidates
+        self.context_token_budget = context_token_budget
+        # Preguntas idénticas en curso comparten una recuperación y una llamada al LLM
+        self.retrieval_flights = SingleFlight(enabled=coalesce_requests)
+        # Si el LLM del líder se cuelga, los seguidores no esperan más que una petición HTTP
+        self.generation_flights = SingleFlight(enabled=coalesce_requests, timeout=DEFAULT_REQUEST_TIMEOUT)
+        # Para las llamadas con use_shortcuts=False (p. ej. medir latencias): cada una hace su trabajo
+        self._uncoalesced_flights = SingleFlight(enabled=False)
+        self.metrics = MetricsRegistry(enabled=enable_metrics)
         self.documents = []
+        self.manifest = None
+        self.index_fingerprint = None
+        self._ready = {component: threading.Event() for component in ("embeddings", "index", "llm")}
+        self._init_thread = None
+        self._init_error = None
+        self._created_at = time.perf_counter()
+        self.stats_lock = threading.Lock()
         self.stats = {
             "pdf_processed": False,
             "chunks_created": 0,
+            "chunks_embedded": 0,
+            "chunks_deleted": 0,
+            "chunks_reused": 0,
             "vectorstore_loaded": False,
-            "total_questions_answered": 0
+            "total_questions_answered": 0,
+            "context_tokens_saved": 0,
+            "coalesced_requests": 0,
+            "startup_seconds": {}
         }
         
         logger.info(f"Inicializado agente RAG para PDF: {pdf_path}")
         logger.info(f"Modelo embeddings: {embedding_model}, LLM: {llm_model}")
 
+    def _iter_pdf_pages(self, pdf_path: str, pdf_hash: Optional[str] = None) -> Iterator[Tuple[int, str]]:
+        logger.info(f"Extrayendo páginas del PDF: {pdf_path} ({self.pdf_extractor}, procesos: {self.extraction_workers})")
+        return iter_pdf_pages(
+            pdf_path,
+            workers=self.extraction_workers,
+            extractor=self.pdf_extractor,
+            cache=self.page_cache,
+            pdf_hash=pdf_hash
+        )
+
     def _extract_text_from_pdf(self, pdf_path: str) -> str:
         logger.info(f"Extrayendo texto del PDF: {pdf_path}")
         
         try:
-            with pdfplumber.open(pdf_path) as pdf:
-                text = ""
-                for page in pdf.pages:
-                    text += page.extract_text() or ""
+            text = "".join(page_text for _, page_text in self._iter_pdf_pages(pdf_path))
             
             logger.info(f"Texto extraído. Longitud: {len(text)} caracteres")
             return text
@@ -74,47 +265,103 @@ class RAGAgent:
         if not text:
             return []
         
-        logger.info(f"Creando chunks (tamaño: {self.chunk_size}, overlap: {self.chunk_overlap})")
-        
-        chunks = []
-        start = 0
-        iterations = 0
-        max_iterations = 10000
+        logger.info(f"Creando chunks (tamaño: {self.chunk_size}, overlap: {self.chunk_overlap}, unidad: {self.chunk_unit})")
         
-        while start < len(text) and iterations < max_iterations:
-            iterations += 1
-            end = start + self.chunk_size
-            
-            if end < len(text):
-                for char in ['. ', '? ', '! ']:
-                    last_pos = text.rfind(char, start, end)
-                    if last_pos != -1 and last_pos > start:
-                        end = last_pos + 1
-                        break
-            
-            chunk = text[start:end].strip()
-            if chunk:
-                chunks.append(chunk)
-            
-            next_start = end - self.chunk_overlap
-            if next_start <= start:
-                next_start = start + max(1, self.chunk_size - self.chunk_overlap)
-            start = next_start
+        chunks = [
+            text[start:end]
+            for start, end in iter_chunk_offsets(text, self._effective_chunk_size(), self.chunk_overlap, self._chunk_units(text))
+        ]
         
         logger.info(f"Creados {len(chunks)} chunks")
         return chunks
 
+    def _chunk_units(self, text: str) -> Optional[List[int]]:
+        if self.chunk_unit == "chars":
+            return None
+        return token_starts(text, load_tokenizer(self.embedding_model_name))
+
+    def _effective_chunk_size(self) -> int:
+        if self.chunk_unit == "chars":
+            return self.chunk_size
+        
+        # Los tokens especiales ([CLS], [SEP]) también ocupan max_seq_length
+        limit = max_chunk_tokens(self.embedding_model_name)
+        if limit is not None and self.chunk_size > limit:
+            logger.warning(f"chunk_size {self.chunk_size} supera lo que admite {self.embedding_model_name}; se usan {limit} tokens")
+            return limit
+        return self.chunk_size
+
+    def _iter_text_chunks(self, pages: Iterable[Tuple[int, str]]) -> Iterator[Tuple[str, int, int, int]]:
+        page_offsets = []
+        page_numbers = []
+        
+        def page_texts() -> Iterator[str]:
+            length = 0
+            for page_number, page_text in pages:
+                page_offsets.append(length)
+                page_numbers.append(page_number)
+                length += len(page_text)
+                yield page_text
+        
+        # Por páginas: solo se guarda la cola aún sin trocear, no el documento entero
+        chunks = iter_chunks_stream(
+            page_texts(),
+            self._effective_chunk_size(),
+            self.chunk_overlap,
+            tokenize=None if self.chunk_unit == "chars" else self._chunk_units
+        )
+        for chunk, start, end in chunks:
+            yield chunk, page_numbers[bisect_right(page_offsets, start) - 1], start, end
+
     def _initialize_embeddings(self):
-        logger.info(f"Inicializando embeddings: {self.embedding_model_name}")
+        if self.embedding_model is not None:
+            # Modelo compartido con otro agente (p. ej. las colecciones de un corpus)
+            self._mark_ready("embeddings")
+            return
+        
+        logger.info(f"Inicializando embeddings: {self.embedding_model_name} ({self.embedding_backend})")
         
         try:
-            self.embedding_model = SentenceTransformerEmbeddings(model_name=self.embedding_model_name)
+            try:
+                self.embedding_model = create_embeddings(
+                    self.embedding_backend, self.embedding_model_name, onnx_cache_dir=self.onnx_model_dir
+                )
+            except Exception as e:
+                if self.embedding_backend == "torch":
+                    raise
+                logger.warning(f"Backend de embeddings {self.embedding_backend} no disponible ({e}), se usa PyTorch")
+                self.embedding_backend = "torch"
+                self.embedding_model = create_embeddings("torch", self.embedding_model_name)
+            if self.batch_query_embeddings:
+                # Por debajo de la caché: solo las preguntas nuevas esperan a un lote
+                self.embedding_model = self.query_batcher = BatchingEmbeddings(
+                    self.embedding_model,
+                    window_ms=self.query_batch_window_ms,
+                    max_batch_size=self.query_batch_max_size
+                )
+                logger.info(
+                    f"Lotes de embeddings de consulta: ventana {self.query_batch_window_ms} ms, "
+                    f"máximo {self.query_batch_max_size}"
+                )
+            if self.use_embedding_cache:
+                self.embedding_model = CachedEmbeddings(
+                    self.embedding_model,
+                    self.embedding_model_name,
+                    cache_dir=self.embedding_cache_dir,
+                    memory_entries=self.embedding_cache_memory_entries,
+                    disk_max_mb=self.embedding_cache_max_mb,
+                    backend=self.embedding_backend
+                )
+                logger.info(f"Caché de embeddings activa en: {self.embedding_cache_dir}")
             logger.info("Modelo de embeddings cargado")
+            self._mark_ready("embeddings")
         except Exception as e:
             logger.error(f"Error al cargar embeddings: {e}")
             raise
 
-    def _initialize_vectorstore(self, documents: List[Document]):
+    def _initialize_vectorstore(self, documents: List[Document], ids: Optional[List[str]] = None):
+        from langchain_community.vectorstores import Chroma
+        
         try:
             if len(documents) == 0:
                 logger.info(f"Cargando vectorstore desde: {self.vectorstore_path}")
@@ -124,27 +371,31 @@ class RAGAgent:
                 )
                 logger.info("Vectorstore cargado")
             else:
-                logger.info(f"Creando vectorstore en: {self.vectorstore_path}")
-                logger.info(f"Procesando {len(documents)} documentos en lotes")
+                logger.info(f"Indexando {len(documents)} documentos en: {self.vectorstore_path}")
                 os.makedirs(self.vectorstore_path, exist_ok=True)
                 
-                batch_size = 5
-                total_docs = len(documents)
+                if self.vectorstore is None:
+                    self.vectorstore = Chroma(
+                        persist_directory=self.vectorstore_path,
+                        embedding_function=self.embedding_model
+                    )
                 
-                for i in range(0, total_docs, batch_size):
-                    batch = documents[i:i+batch_size]
-                    logger.info(f"Procesando lote {i//batch_size + 1}/{(total_docs + batch_size - 1)//batch_size}")
-                    
-                    if i == 0:
-                        self.vectorstore = Chroma.from_documents(
-                            documents=batch,
-                            embedding=self.embedding_model,
-                            persist_directory=self.vectorstore_path
-                        )
-                    else:
-                        self.vectorstore.add_documents(batch)
+                indexer = BulkIndexer(
+                    self.vectorstore._collection,
+                    self.embedding_model,
+                    embed_batch_size=self.embedding_batch_size,
+                    write_batch_size=chroma_max_batch_size(self.vectorstore._client)
+                )
+                self.stats["indexing"] = indexer.index(
+                    ids or [str(uuid.uuid4()) for _ in documents],
+                    [doc.page_content for doc in documents],
+                    [doc.metadata for doc in documents]
+                )
                 
-                logger.info(f"Vectorstore creado con {total_docs} documentos")
+                if isinstance(self.embedding_model, CachedEmbeddings):
+                    self.embedding_model.flush()
+                
+                logger.info(f"Vectorstore actualizado con {len(documents)} documentos")
             
             try:
                 if hasattr(self.vectorstore, 'persist'):
@@ -161,15 +412,95 @@ class RAGAgent:
             logger.error(f"Error al inicializar vectorstore: {e}")
             raise
 
+    def _chunk_params(self) -> Dict[str, Any]:
+        return {
+            "chunk_size": self.chunk_size,
+            "chunk_overlap": self.chunk_overlap,
+            "chunk_unit": self.chunk_unit,
+            "pdf_extractor": self.pdf_extractor
+        }
+
+    def _load_documents(self, pdf_hash: Optional[str] = None) -> List[Document]:
+        logger.info("Procesando PDF por páginas")
+        documents = [
+            Document(
+                page_content=chunk,
+                metadata={
+                    "source": self.pdf_path,
+                    "chunk_id": i,
+                    "page": page_number,
+                    "start_offset": start,
+                    "end_offset": end
+                }
+            )
+            for i, (chunk, page_number, start, end) in enumerate(
+                self._iter_text_chunks(self._iter_pdf_pages(self.pdf_path, pdf_hash))
+            )
+        ]
+        self.stats["chunks_created"] = len(documents)
+        self.stats["pdf_processed"] = True
+        logger.info(f"{len(documents)} documentos creados")
+        return documents
+
+    def _manifest_from_vectorstore(self) -> List[Dict[str, Any]]:
+        logger.info("Vectorstore sin manifest, generando manifest a partir de su contenido")
+        stored = self.vectorstore.get(include=["documents", "metadatas"])
+        return [
+            manifest_entry(doc_id, content or "", metadata or {})
+            for doc_id, content, metadata in zip(stored["ids"], stored["documents"], stored["metadatas"])
+        ]
+
+    def _sync_vectorstore(self, documents: List[Document], previous_chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        entries, to_add, to_delete, to_update = plan_sync(
+            previous_chunks,
+            [doc.page_content for doc in documents],
+            [doc.metadata for doc in documents]
+        )
+        logger.info(
+            f"Sincronizando vectorstore: {len(to_add)} nuevos, {len(to_delete)} eliminados, "
+            f"{len(documents) - len(to_add)} reutilizados"
+        )
+        
+        if to_delete:
+            self.vectorstore.delete(ids=to_delete)
+        
+        if to_update:
+            self.vectorstore._collection.update(
+                ids=[entries[i]["id"] for i in to_update],
+                metadatas=[documents[i].metadata for i in to_update]
+            )
+        
+        if to_add:
+            self._initialize_vectorstore(
+                [documents[i] for i in to_add],
+                ids=[entries[i]["id"] for i in to_add]
+            )
+        
+        self.stats["chunks_embedded"] = len(to_add)
+        self.stats["chunks_deleted"] = len(to_delete)
+        self.stats["chunks_reused"] = len(documents) - len(to_add)
+        return entries
+
+    def _initialize_llm(self):
+        if self.llm is None:
+            self.llm = create_llm(
+                self.llm_backend,
+                model=self.llm_model,
+                temperature=self.temperature,
+                max_tokens=self.llm_max_tokens,
+                api_key=self.openai_api_key,
+                base_url=self.llm_base_url,
+                max_connections=self.llm_max_connections,
+                fake_first_token_latency=self.fake_llm_latency,
+                fake_tokens_per_second=self.fake_llm_tokens_per_second
+            )
+        
+        self._mark_ready("llm")
+
     def _initialize_qa_chain(self):
-        logger.info(f"Inicializando chain QA con modelo: {self.llm_model}")
+        from langchain_core.prompts import PromptTemplate
         
-        self.llm = ChatOpenAI(
-            model=self.llm_model,
-            temperature=self.temperature,
-            openai_api_key=self.openai_api_key,
-            max_tokens=500
-        )
+        logger.info(f"Inicializando chain QA con modelo: {self.llm_model}")
         
         qa_template = """Eres un asistente experto en certificaciones AWS Machine Learning.
 
@@ -188,62 +519,194 @@ Instrucciones:
 Respuesta:"""
         
         self.prompt = PromptTemplate.from_template(qa_template)
-        self.retriever = self.vectorstore.as_retriever(search_kwargs={"k": 3})
+        self.retriever = self.index.as_retriever(self.embedding_model, k=3)
         
         logger.info("Chain QA inicializado")
+        self._mark_ready("index")
+
+    def _manifest_is_current(self, manifest: Optional[Dict[str, Any]], pdf_hash: str) -> bool:
+        return (
+            manifest is not None
+            and manifest["pdf_hash"] == pdf_hash
+            and manifest["chunk_params"] == self._chunk_params()
+            and manifest["embedding_model"] == self.embedding_model_name
+        )
+
+    def _open_snapshot(self) -> Optional[IndexSnapshot]:
+        try:
+            snapshot = IndexSnapshot(self.snapshot_path)
+            if self.verify_snapshot:
+                snapshot.verify()
+        except (OSError, ValueError) as e:
+            logger.warning(f"No se pudo abrir el snapshot {self.snapshot_path}: {e}. Se usa el vectorstore")
+            return None
+        
+        if snapshot.header["embedding_model"] != self.embedding_model_name:
+            logger.warning(
+                f"Snapshot creado con {snapshot.header['embedding_model']}, configurado {self.embedding_model_name}. "
+                "Se usa el vectorstore"
+            )
+            return None
+        # En una réplica sin PDF manda el snapshot; si el PDF está, tiene que corresponder a él
+        if os.path.exists(self.pdf_path) and not self._manifest_is_current(snapshot.header, hash_file(self.pdf_path)):
+            logger.warning(f"Snapshot {self.snapshot_path} desactualizado respecto al PDF. Se usa el vectorstore")
+            return None
+        
+        return snapshot
+
+    def export_snapshot(self, path: str) -> Dict[str, Any]:
+        self._wait_for("index")
+        index = self.index
+        if isinstance(index, ChromaIndex):
+            index = NumpyIndex.from_chroma(self.vectorstore, fingerprint=self.index_fingerprint)
+        if not isinstance(index, NumpyIndex) or self.manifest is None:
+            raise ValueError("Solo se puede exportar el índice de un agente construido a partir de un PDF")
+        
+        return export_snapshot(path, index, self.manifest, lexical_index=self.lexical_index)
+
+    def _load_saved_index(self, manifest: Dict[str, Any]) -> Optional[VectorIndex]:
+        backend = resolve_backend(self.index_backend, len(manifest["chunks"]))
+        return load_index(self.vectorstore_path, backend, fingerprint=manifest_fingerprint(manifest))
+
+    def _build_index(self) -> VectorIndex:
+        backend = resolve_backend(self.index_backend, self.vectorstore._collection.count())
+        if backend == "chroma":
+            return ChromaIndex(self.vectorstore)
+        
+        fingerprint = manifest_fingerprint(self.manifest)
+        index = load_index(self.vectorstore_path, backend, fingerprint=fingerprint)
+        if index is not None:
+            return index
+        
+        logger.info(f"Construyendo índice {backend} a partir de los embeddings de Chroma")
+        index = INDEX_CLASSES[backend].from_chroma(self.vectorstore, fingerprint=fingerprint)
+        index.save(index_directory(self.vectorstore_path, backend))
+        return index
+
+    def _build_lexical_index(self) -> BM25Index:
+        if self.snapshot is not None:
+            return self.snapshot.lexical_index()
+        
+        index = load_lexical_index(self.vectorstore_path, fingerprint=self.index_fingerprint)
+        if index is not None:
+            return index
+        
+        logger.info("Construyendo índice BM25 a partir de los chunks indexados")
+        ids, texts = self.index.contents()
+        index = BM25Index.build(ids, texts, fingerprint=self.index_fingerprint)
+        index.save(lexical_index_directory(self.vectorstore_path))
+        return index
+
+    def _sync_with_pdf(self, pdf_hash: str, manifest: Optional[Dict[str, Any]]):
+        previous_chunks = None
+        
+        vectorstore_db_file = os.path.join(self.vectorstore_path, "chroma.sqlite3")
+        
+        if os.path.exists(vectorstore_db_file):
+            logger.info("Vectorstore existente encontrado")
+            try:
+                if manifest and manifest["embedding_model"] != self.embedding_model_name:
+                    raise ValueError(
+                        f"Vectorstore creado con {manifest['embedding_model']}, configurado {self.embedding_model_name}"
+                    )
+                self._initialize_vectorstore([])
+                doc_count = self.vectorstore._collection.count() if hasattr(self.vectorstore, '_collection') else 0
+                if doc_count == 0:
+                    raise ValueError("Vectorstore vacío")
+                logger.info(f"Vectorstore cargado con {doc_count} documentos")
+                previous_chunks = manifest["chunks"] if manifest else self._manifest_from_vectorstore()
+                if len(previous_chunks) != doc_count:
+                    logger.warning("Manifest desalineado con el vectorstore, regenerando manifest")
+                    manifest = None
+                    previous_chunks = self._manifest_from_vectorstore()
+            except Exception as e:
+                logger.warning(f"Error al cargar vectorstore: {e}. Recreando")
+                import shutil
+                self.vectorstore = None
+                manifest = None
+                previous_chunks = None
+                if os.path.exists(self.vectorstore_path):
+                    shutil.rmtree(self.vectorstore_path)
+        else:
+            logger.info("No se encontró vectorstore existente")
+        
+        if previous_chunks is not None and self._manifest_is_current(manifest, pdf_hash):
+            logger.info("Vectorstore al día con el PDF, no se requiere reindexar")
+            self.manifest = manifest
+            self.stats["chunks_reused"] = len(previous_chunks)
+        else:
+            self.documents = self._load_documents(pdf_hash)
+            
+            if previous_chunks is None:
+                logger.info("Creando vectorstore")
+                entries, _, _, _ = plan_sync(
+                    [],
+                    [doc.page_content for doc in self.documents],
+                    [doc.metadata for doc in self.documents]
+                )
+                self._initialize_vectorstore(self.documents, ids=[entry["id"] for entry in entries])
+                self.stats["chunks_embedded"] = len(self.documents)
+                logger.info("Vectorstore creado")
+            else:
+                entries = self._sync_vectorstore(self.documents, previous_chunks)
+            
+            self.manifest = build_manifest(
+                self.pdf_path, pdf_hash, self.embedding_model_name, self._chunk_params(), entries
+            )
+            save_manifest(self.vectorstore_path, self.manifest)
 
     def initialize(self):
         logger.info("Iniciando configuración del agente RAG")
         
         try:
-            if not os.path.exists(self.pdf_path):
+            if not os.path.exists(self.pdf_path) and not (self.snapshot_path and os.path.exists(self.snapshot_path)):
                 raise FileNotFoundError(f"PDF no encontrado: {self.pdf_path}")
             
-            self._initialize_embeddings()
-            
-            vectorstore_db_file = os.path.join(self.vectorstore_path, "chroma.sqlite3")
-            need_to_create_vectorstore = True
-            
-            if os.path.exists(vectorstore_db_file):
-                logger.info("Vectorstore existente encontrado")
-                try:
-                    self._initialize_vectorstore([])
-                    doc_count = self.vectorstore._collection.count() if hasattr(self.vectorstore, '_collection') else 0
-                    if doc_count == 0:
-                        raise ValueError("Vectorstore vacío")
-                    logger.info(f"Vectorstore cargado con {doc_count} documentos")
-                    need_to_create_vectorstore = False
-                except Exception as e:
-                    logger.warning(f"Error al cargar vectorstore: {e}. Recreando")
-                    import shutil
-                    if os.path.exists(self.vectorstore_path):
-                        shutil.rmtree(self.vectorstore_path)
-                    need_to_create_vectorstore = True
-            else:
-                logger.info("No se encontró vectorstore existente")
-            
-            if need_to_create_vectorstore:
-                logger.info("Procesando PDF")
-                pdf_text = self._extract_text_from_pdf(self.pdf_path)
+            # El modelo de embeddings y el cliente LLM se cargan en paralelo con el índice;
+            # solo la sincronización con el PDF necesita esperar a los embeddings
+            with self.metrics.span("init_total"), \
+                    ThreadPoolExecutor(max_workers=3, thread_name_prefix="rag-warmup") as executor:
+                embeddings_future = executor.submit(self._spanned, "init_embeddings", self._initialize_embeddings)
+                llm_future = executor.submit(self._spanned, "init_llm", self._initialize_llm)
+                reranker_future = executor.submit(
+                    self._spanned, "init_reranker", self.reranker.load
+                ) if self.reranker is not None else None
                 
-                logger.info("Creando chunks")
-                text_chunks = self._create_text_chunks(pdf_text)
-                self.stats["chunks_created"] = len(text_chunks)
-                logger.info(f"Chunks creados: {len(text_chunks)}")
+                with self.metrics.span("init_manifest"):
+                    self.snapshot = self._open_snapshot() if self.snapshot_path else None
+                    if self.snapshot is None:
+                        pdf_hash = hash_file(self.pdf_path)
+                        manifest = load_manifest(self.vectorstore_path)
                 
-                logger.info("Creando documentos")
-                self.documents = [
-                    Document(page_content=chunk, metadata={"source": self.pdf_path, "chunk_id": i})
-                    for i, chunk in enumerate(text_chunks)
-                ]
-                logger.info(f"{len(self.documents)} documentos creados")
+                with self.metrics.span("init_index"):
+                    if self.snapshot is not None:
+                        # Sin Chroma ni PDF: vistas de solo lectura sobre el fichero mapeado
+                        self.index = self.snapshot.vector_index()
+                        logger.info(f"Índice mapeado desde el snapshot {self.snapshot_path} ({len(self.index)} vectores)")
+                        self.stats["vectorstore_loaded"] = True
+                    elif self.index_backend != "chroma" and self._manifest_is_current(manifest, pdf_hash):
+                        self.index = self._load_saved_index(manifest)
+                    
+                    if self.index is None:
+                        embeddings_future.result()
+                        self._sync_with_pdf(pdf_hash, manifest)
+                        self.index = self._build_index()
+                    elif self.snapshot is None:
+                        logger.info(f"Índice {self.index.backend} cargado sin abrir Chroma ({len(self.index)} vectores)")
+                        self.manifest = manifest
+                        self.stats["vectorstore_loaded"] = True
                 
-                logger.info("Creando vectorstore")
-                self._initialize_vectorstore(self.documents)
-                self.stats["pdf_processed"] = True
-                logger.info("Vectorstore creado")
-            
-            self._initialize_qa_chain()
+                self.index_fingerprint = (
+                    self.snapshot.fingerprint if self.snapshot is not None else manifest_fingerprint(self.manifest)
+                )
+                if self.retrieval_mode == "hybrid":
+                    with self.metrics.span("init_lexical_index"):
+                        self.lexical_index = self._build_lexical_index()
+                embeddings_future.result()
+                if reranker_future is not None:
+                    reranker_future.result()
+                self._initialize_qa_chain()
+                llm_future.result()
             
             logger.info("Agente RAG inicializado correctamente")
             
@@ -251,70 +714,518 @@ Respuesta:"""
             logger.error(f"Error durante la inicialización: {e}")
             raise
 
-    def ask(self, question: str) -> Dict[str, Any]:
-        if not self.retriever:
+    def _spanned(self, stage: str, fn, *args):
+        with self.metrics.span(stage):
+            return fn(*args)
+
+    def _mark_ready(self, component: str):
+        self.stats["startup_seconds"][component] = time.perf_counter() - self._created_at
+        self._ready[component].set()
+
+    def _background_initialize(self):
+        try:
+            self.initialize()
+        except Exception as e:
+            self._init_error = e
+            for event in self._ready.values():
+                event.set()
+
+    def start_background_initialization(self) -> threading.Thread:
+        if self._init_thread is None:
+            self._init_thread = threading.Thread(
+                target=self._background_initialize, name="rag-agent-init", daemon=True
+            )
+            self._init_thread.start()
+            logger.info("Inicialización del agente en segundo plano")
+        return self._init_thread
+
+    @property
+    def initialization_error(self) -> Optional[Exception]:
+        return self._init_error
+
+    def is_ready(self) -> bool:
+        return self._init_error is None and all(event.is_set() for event in self._ready.values())
+
+    def _wait_for(self, *components: str, timeout: Optional[float] = None) -> bool:
+        pending = [self._ready[component] for component in components if not self._ready[component].is_set()]
+        
+        if pending and self._init_thread is None:
             raise RuntimeError("Agente no inicializado. Llama a initialize() primero")
         
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for event in pending:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if not event.wait(remaining):
+                return False
+        
+        if self._init_error is not None:
+            raise RuntimeError(f"Error durante la inicialización del agente: {self._init_error}") from self._init_error
+        return True
+
+    async def _await_ready(self, *components: str):
+        if all(self._ready[component].is_set() for component in components):
+            self._wait_for(*components)
+        else:
+            await asyncio.to_thread(self._wait_for, *components)
+
+    def wait_until_ready(self, timeout: Optional[float] = None) -> bool:
+        return self._wait_for(*self._ready, timeout=timeout)
+
+    def _search(self, questions: List[str], query_embeddings: List[List[float]], k: int) -> List[List[Document]]:
+        if self.lexical_index is None:
+            return self.index.search_many(query_embeddings, k)
+        
+        return hybrid_search_many(
+            self.index, self.lexical_index, questions, query_embeddings, k,
+            candidates=self.hybrid_candidates, rrf_k=self.rrf_k
+        )
+
+    def _count_tokens(self, text: str) -> int:
+        return count_llm_tokens(text, self.llm_model)
+
+    def _candidate_count(self) -> int:
+        k = self.retriever.search_kwargs["k"]
+        return max(k, self.rerank_candidates) if self.reranker is not None else k
+
+    def _rerank(self, question: str, documents: List[Document], timings: Dict[str, float]) -> List[Document]:
+        if self.reranker is None:
+            return documents
+        
+        start_time = time.perf_counter()
+        documents, _ = self.reranker.rerank(
+            question,
+            documents,
+            top_k=self.retriever.search_kwargs["k"],
+            token_budget=self.context_token_budget,
+            count_tokens=self._count_tokens
+        )
+        timings["rerank"] = time.perf_counter() - start_time
+        return documents
+
+    def _retrieve(self, question: str) -> Retrieved:
+        start_time = time.perf_counter()
+        query_embedding = self.embedding_model.embed_query(question)
+        embedded_time = time.perf_counter()
+        source_documents = self._search([question], [query_embedding], self._candidate_count())[0]
+        
+        timings = {"embedding": embedded_time - start_time, "search": time.perf_counter() - embedded_time}
+        return query_embedding, self._rerank(question, source_documents, timings), timings
+
+    def _embed_queries(self, questions: List[str]) -> List[List[float]]:
+        if hasattr(self.embedding_model, "embed_queries"):
+            return self.embedding_model.embed_queries(questions)
+        # El modelo es simétrico (sin prefijo de consulta): una sola pasada en lote
+        return self.embedding_model.embed_documents(questions)
+
+    def _retrieve_many(self, questions: List[str]) -> List[Retrieved]:
+        start_time = time.perf_counter()
+        query_embeddings = self._embed_queries(questions)
+        embedded_time = time.perf_counter()
+        
+        results = self._search(questions, query_embeddings, self._candidate_count())
+        searched_time = time.perf_counter()
+        
+        retrieved = []
+        for question, query_embedding, source_documents in zip(questions, query_embeddings, results):
+            # Embedding y búsqueda se hacen en lote: se reparte su coste entre las preguntas
+            timings = {
+                "embedding": (embedded_time - start_time) / len(questions),
+                "search": (searched_time - embedded_time) / len(questions)
+            }
+            retrieved.append((query_embedding, self._rerank(question, source_documents, timings), timings))
+        return retrieved
+
+    def retrieve(self, questions: List[str], k: Optional[int] = None) -> List[List[Document]]:
+        """Solo recuperación (sin LLM ni cachés de respuesta), en lote, con ``k`` chunks por pregunta."""
+        self._wait_for("embeddings", "index")
+        
+        k = k or self.retriever.search_kwargs["k"]
+        candidates = max(k, self.rerank_candidates) if self.reranker is not None else k
+        results = self._search(questions, self._embed_queries(questions), candidates)
+        
+        if self.reranker is not None:
+            results = [
+                self.reranker.rerank(question, documents, top_k=k)[0]
+                for question, documents in zip(questions, results)
+            ]
+        return results
+
+    def _retrieve_shared(self, question: str) -> Retrieved:
+        retrieved, _ = self.retrieval_flights.do(normalize_question(question), lambda: self._retrieve(question))
+        return retrieved
+
+    def _build_metadata(self, question: str, source_documents: List[Document]) -> Dict[str, Any]:
+        return {
+            "question": question,
+            "num_sources": len(source_documents),
+            "sources": [
+                {
+                    "chunk_id": doc.metadata.get("chunk_id"),
+                    "content_preview": doc.page_content[:400] if len(doc.page_content) > 400 else doc.page_content,
+                    "source": doc.metadata.get("source")
+                }
+                for doc in source_documents
+            ],
+            "timestamp": str(np.datetime64('now'))
+        }
+
+    def _prepare(
+        self,
+        question: str,
+        retrieved: Optional[Retrieved] = None,
+        use_shortcuts: bool = True
+    ) -> Dict[str, Any]:
+        # Sin use_shortcuts no se consulta ni se rellena la caché de respuestas y la
+        # pregunta no se agrupa con otras en curso; el agente compartido no cambia
+        logger.info(f"Procesando pregunta: {question}")
+        
+        if retrieved is None:
+            retrieved = self._retrieve_shared(question) if use_shortcuts else self._retrieve(question)
+        query_embedding, source_documents, timings = retrieved
+        timings = dict(timings)
+        # chunk_id es la posición dentro de un PDF y se repite entre colecciones; el id no
+        chunk_ids = [doc.id for doc in source_documents]
+        
+        answer_cache = self.answer_cache if use_shortcuts else None
+        cached = None
+        if answer_cache is not None:
+            cached = answer_cache.lookup(query_embedding, chunk_ids, self.index_fingerprint)
+        
+        prompt = None
+        context_report = None
+        if cached is None:
+            start_time = time.perf_counter()
+            context, context_report = build_context(
+                source_documents, self._count_tokens, token_budget=self.context_token_budget
+            )
+            prompt = self.prompt.format(context=context, question=question)
+            timings["prompt"] = time.perf_counter() - start_time
+            with self.stats_lock:
+                self.stats["context_tokens_saved"] += context_report["tokens_saved"]
+        
+        metadata = self._build_metadata(question, source_documents)
+        metadata["cache_hit"] = cached is not None
+        metadata["stage_latency"] = timings
+        if context_report is not None:
+            metadata["context"] = context_report
+        if cached is not None:
+            metadata["cached_question"] = cached["question"]
+            metadata["cache_similarity"] = cached["similarity"]
+            logger.info(f"Respuesta desde caché (similitud {cached['similarity']:.3f})")
+        
+        return {
+            "question": question,
+            "query_embedding": query_embedding,
+            "chunk_ids": chunk_ids,
+            "source_documents": source_documents,
+            "cached": cached,
+            "prompt": prompt,
+            "answer_cache": answer_cache,
+            "flights": self.generation_flights if use_shortcuts else self._uncoalesced_flights,
+            "flight_key": (normalize_question(question), tuple(chunk_ids)),
+            "coalesced": False,
+            "metadata": metadata
+        }
+
+    def _mark_coalesced(self, prepared: Dict[str, Any], coalesced: bool):
+        if not coalesced:
+            return
+        prepared["coalesced"] = True
+        prepared["metadata"]["coalesced"] = True
+        with self.stats_lock:
+            self.stats["coalesced_requests"] += 1
+
+    def _finalize(self, prepared: Dict[str, Any], answer: str) -> Dict[str, Any]:
+        # La respuesta agrupada ya la guarda la petición que llamó al LLM
+        if prepared["cached"] is None and not prepared["coalesced"] and prepared["answer_cache"] is not None:
+            prepared["answer_cache"].store(
+                prepared["question"], prepared["query_embedding"], prepared["chunk_ids"], answer, self.index_fingerprint
+            )
+        
+        with self.stats_lock:
+            self.stats["total_questions_answered"] += 1
+        logger.info(f"Respuesta generada. Fuentes consultadas: {len(prepared['source_documents'])}")
+        
+        return {
+            "success": True,
+            "answer": answer,
+            "metadata": prepared["metadata"]
+        }
+
+    def _observe(self, metadata: Dict[str, Any]):
+        if not self.metrics.enabled:
+            return
+        
+        self.metrics.observe_many(metadata["stage_latency"])
+        if "time_to_first_token" in metadata:
+            self.metrics.observe("ttft", metadata["time_to_first_token"])
+        self.metrics.observe("total", metadata["response_time"])
+
+    def _error_result(self, e: Exception) -> Dict[str, Any]:
+        logger.error(f"Error al procesar pregunta: {e}")
+        import traceback
+        logger.error(traceback.format_exc())
+        
+        return {
+            "success": False,
+            "error": str(e),
+            "answer": "Lo siento, ocurrió un error al procesar tu pregunta.",
+            "metadata": {}
+        }
+
+    def ask(self, question: str, use_shortcuts: bool = True) -> Dict[str, Any]:
+        self._wait_for("embeddings", "index")
+        
+        start_time = time.perf_counter()
+        
         try:
-            logger.info(f"Procesando pregunta: {question}")
+            prepared = self._prepare(question, use_shortcuts=use_shortcuts)
             
-            source_documents = self.retriever.invoke(question)
-            context = "\n\n".join([doc.page_content for doc in source_documents])
+            if prepared["cached"] is not None:
+                answer = prepared["cached"]["answer"]
+            else:
+                self._wait_for("llm")
+                llm_start = time.perf_counter()
+                answer, coalesced = prepared["flights"].do(
+                    prepared["flight_key"], lambda: self.llm.invoke(prepared["prompt"]).content
+                )
+                prepared["metadata"]["stage_latency"]["llm"] = time.perf_counter() - llm_start
+                self._mark_coalesced(prepared, coalesced)
             
-            formatted_prompt = self.prompt.format(context=context, question=question)
-            answer = self.llm.invoke(formatted_prompt).content
+            result = self._finalize(prepared, answer)
+            result["metadata"]["response_time"] = time.perf_counter() - start_time
+            self._observe(result["metadata"])
+            return result
             
-            metadata = {
-                "question": question,
-                "num_sources": len(source_documents),
-                "sources": [
-                    {
-                        "chunk_id": doc.metadata.get("chunk_id"),
-                        "content_preview": doc.page_content[:400] if len(doc.page_content) > 400 else doc.page_content,
-                        "source": doc.metadata.get("source")
-                    }
-                    for doc in source_documents
-                ],
-                "timestamp": str(np.datetime64('now'))
-            }
+        except Exception as e:
+            return self._error_result(e)
+
+    def ask_stream(self, question: str, use_shortcuts: bool = True) -> Iterator[Dict[str, Any]]:
+        self._wait_for("embeddings", "index")
+        
+        start_time = time.perf_counter()
+        
+        try:
+            prepared = self._prepare(question, use_shortcuts=use_shortcuts)
+            yield {"type": "metadata", "metadata": prepared["metadata"]}
             
-            self.stats["total_questions_answered"] += 1
-            logger.info(f"Respuesta generada. Fuentes consultadas: {len(source_documents)}")
+            llm_start = None
+            if prepared["cached"] is not None:
+                tokens = iter([prepared["cached"]["answer"]])
+            else:
+                self._wait_for("llm")
+                llm_start = time.perf_counter()
+                tokens, coalesced = prepared["flights"].stream(
+                    prepared["flight_key"], lambda: (chunk.content for chunk in self.llm.stream(prepared["prompt"]))
+                )
+                self._mark_coalesced(prepared, coalesced)
             
-            return {
-                "success": True,
-                "answer": answer,
-                "metadata": metadata
-            }
+            parts = []
+            for token in tokens:
+                if not token:
+                    continue
+                if not parts:
+                    prepared["metadata"]["time_to_first_token"] = time.perf_counter() - start_time
+                parts.append(token)
+                yield {"type": "token", "content": token}
+            
+            if llm_start is not None:
+                prepared["metadata"]["stage_latency"]["llm"] = time.perf_counter() - llm_start
+            result = self._finalize(prepared, "".join(parts))
+            result["metadata"]["response_time"] = time.perf_counter() - start_time
+            self._observe(result["metadata"])
+            yield {"type": "end", **result}
             
         except Exception as e:
-            logger.error(f"Error al procesar pregunta: {e}")
-            import traceback
-            logger.error(traceback.format_exc())
+            yield {"type": "end", **self._error_result(e)}
+
+    async def aask_stream(self, question: str, use_shortcuts: bool = True) -> AsyncIterator[Dict[str, Any]]:
+        await self._await_ready("embeddings", "index")
+        
+        start_time = time.perf_counter()
+        
+        try:
+            prepared = await asyncio.to_thread(self._prepare, question, None, use_shortcuts)
+            yield {"type": "metadata", "metadata": prepared["metadata"]}
             
-            return {
-                "success": False,
-                "error": str(e),
-                "answer": "Lo siento, ocurrió un error al procesar tu pregunta.",
-                "metadata": {}
-            }
+            parts = []
+            if prepared["cached"] is not None:
+                prepared["metadata"]["time_to_first_token"] = time.perf_counter() - start_time
+                parts.append(prepared["cached"]["answer"])
+                yield {"type": "token", "content": parts[0]}
+            else:
+                await self._await_ready("llm")
+                llm_start = time.perf_counter()
+                tokens, coalesced = prepared["flights"].astream(
+                    prepared["flight_key"], lambda: self._astream_tokens(prepared["prompt"])
+                )
+                self._mark_coalesced(prepared, coalesced)
+                async for token in tokens:
+                    if not token:
+                        continue
+                    if not parts:
+                        prepared["metadata"]["time_to_first_token"] = time.perf_counter() - start_time
+                    parts.append(token)
+                    yield {"type": "token", "content": token}
+                prepared["metadata"]["stage_latency"]["llm"] = time.perf_counter() - llm_start
+            
+            result = self._finalize(prepared, "".join(parts))
+            result["metadata"]["response_time"] = time.perf_counter() - start_time
+            self._observe(result["metadata"])
+            yield {"type": "end", **result}
+            
+        except Exception as e:
+            yield {"type": "end", **self._error_result(e)}
+
+    async def _astream_tokens(self, prompt: str) -> AsyncIterator[str]:
+        async for chunk in self.llm.astream(prompt):
+            yield chunk.content
+
+    async def _agenerate(self, prompt: str, semaphore: asyncio.Semaphore) -> str:
+        attempt = 0
+        
+        while True:
+            async with semaphore:
+                try:
+                    return (await self.llm.ainvoke(prompt)).content
+                except Exception as e:
+                    if not _is_rate_limit_error(e) or attempt >= self.llm_max_retries:
+                        raise
+                    delay = _retry_after_seconds(e) or min(2 ** attempt, 30) * (0.5 + random.random())
+            
+            attempt += 1
+            logger.warning(f"Límite de peticiones del LLM alcanzado, reintento {attempt} en {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+    async def _aanswer(
+        self,
+        question: str,
+        retrieved: Optional[Retrieved],
+        semaphore: asyncio.Semaphore,
+        use_shortcuts: bool = True
+    ) -> Dict[str, Any]:
+        start_time = time.perf_counter()
+        
+        try:
+            if retrieved is None:
+                prepared = await asyncio.to_thread(self._prepare, question, None, use_shortcuts)
+            else:
+                prepared = self._prepare(question, retrieved, use_shortcuts)
+            
+            if prepared["cached"] is not None:
+                answer = prepared["cached"]["answer"]
+            else:
+                await self._await_ready("llm")
+                llm_start = time.perf_counter()
+                answer, coalesced = await prepared["flights"].ado(
+                    prepared["flight_key"], lambda: self._agenerate(prepared["prompt"], semaphore)
+                )
+                prepared["metadata"]["stage_latency"]["llm"] = time.perf_counter() - llm_start
+                self._mark_coalesced(prepared, coalesced)
+            
+            result = self._finalize(prepared, answer)
+            result["metadata"]["response_time"] = time.perf_counter() - start_time
+            self._observe(result["metadata"])
+            return result
+            
+        except Exception as e:
+            return self._error_result(e)
+
+    async def aask(self, question: str, use_shortcuts: bool = True) -> Dict[str, Any]:
+        await self._await_ready("embeddings", "index")
+        
+        return await self._aanswer(question, None, asyncio.Semaphore(1), use_shortcuts)
+
+    async def aask_many(
+        self,
+        questions: List[str],
+        max_concurrency: Optional[int] = None,
+        use_shortcuts: bool = True
+    ) -> List[Dict[str, Any]]:
+        await self._await_ready("embeddings", "index")
+        
+        if not questions:
+            return []
+        
+        logger.info(f"Procesando {len(questions)} preguntas en lote")
+        
+        try:
+            retrieved = await asyncio.to_thread(self._retrieve_many, questions)
+        except Exception as e:
+            return [self._error_result(e) for _ in questions]
+        
+        semaphore = asyncio.Semaphore(max_concurrency or self.llm_max_concurrency)
+        return await asyncio.gather(*[
+            self._aanswer(question, question_retrieved, semaphore, use_shortcuts)
+            for question, question_retrieved in zip(questions, retrieved)
+        ])
+
+    def ask_many(
+        self,
+        questions: List[str],
+        max_concurrency: Optional[int] = None,
+        use_shortcuts: bool = True
+    ) -> List[Dict[str, Any]]:
+        return _run_coroutine(self.aask_many(questions, max_concurrency=max_concurrency, use_shortcuts=use_shortcuts))
 
     def get_stats(self) -> Dict[str, Any]:
-        stats = self.stats.copy()
+        with self.stats_lock:
+            stats = self.stats.copy()
+        stats["ready"] = self.is_ready()
         
-        if self.vectorstore:
+        if self.index is not None:
             try:
-                stats["vectorstore_documents"] = self.vectorstore._collection.count() if hasattr(self.vectorstore, '_collection') else 0
+                stats["vectorstore_documents"] = len(self.index)
             except:
                 stats["vectorstore_documents"] = 0
+            stats["index_backend"] = self.index.backend
+        stats["retrieval_mode"] = self.retrieval_mode
+        stats["embedding_backend"] = self.embedding_backend
+        stats["pdf_extractor"] = self.pdf_extractor
+        stats["snapshot"] = self.snapshot_path if self.snapshot is not None else None
+        stats["llm_backend"] = self.llm_backend
+        
+        if isinstance(self.embedding_model, CachedEmbeddings):
+            stats["embedding_cache"] = self.embedding_model.cache_stats()
+        
+        if self.answer_cache is not None:
+            stats["answer_cache"] = self.answer_cache.cache_stats()
+        
+        if self.reranker is not None:
+            stats["reranker"] = self.reranker.cache_stats()
+        
+        if self.metrics.enabled:
+            stats["latency"] = self.metrics.snapshot()
+        
+        if self.query_batcher is not None:
+            stats["query_batching"] = self.query_batcher.batch_stats()
+        
+        stats["coalescing"] = {
+            "retrieval": self.retrieval_flights.flight_stats(),
+            "generation": self.generation_flights.flight_stats()
+        }
         
         return stats
 
+    def prometheus_metrics(self) -> str:
+        with self.stats_lock:
+            counters = {
+                "rag_questions_answered_total": self.stats["total_questions_answered"],
+                "rag_coalesced_requests_total": self.stats["coalesced_requests"],
+                "rag_context_tokens_saved_total": self.stats["context_tokens_saved"]
+            }
+        if self.answer_cache is not None:
+            counters["rag_answer_cache_hits_total"] = self.answer_cache.cache_stats()["hits"]
+        
+        text = self.metrics.prometheus_text(counters)
+        if self.query_batcher is not None:
+            text += self.query_batcher.prometheus_text()
+        return text
+
     def search_similar(self, query: str, k: int = 3) -> List[Dict[str, Any]]:
-        if not self.vectorstore:
-            raise RuntimeError("Agente no inicializado")
+        self._wait_for("embeddings", "index")
         
-        similar_docs = self.vectorstore.similarity_search(query, k=k)
+        similar_docs = self._search([query], [self.embedding_model.embed_query(query)], k)[0]
         
         return [
             {
@@ -326,7 +1237,44 @@ Respuesta:"""
         ]
 
 
-def create_certification_agent(pdf_path: str = None, vectorstore_path: str = None) -> RAGAgent:
+def _is_rate_limit_error(error: Exception) -> bool:
+    return type(error).__name__ == "RateLimitError" or getattr(error, "status_code", None) == 429
+
+
+def _retry_after_seconds(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+async def _closing_http_clients(coroutine):
+    try:
+        return await coroutine
+    finally:
+        # asyncio.run cierra el loop al volver: su pool de conexiones se cierra antes
+        await aclose_loop_http_clients()
+
+
+def _run_coroutine(coroutine):
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(_closing_http_clients(coroutine))
+    
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, _closing_http_clients(coroutine)).result()
+
+
+def create_certification_agent(
+    pdf_path: str = None,
+    vectorstore_path: str = None,
+    background: bool = False,
+    **agent_kwargs
+) -> RAGAgent:
     if pdf_path is None:
         from pathlib import Path
         project_root = Path(__file__).parent.parent
@@ -339,10 +1287,14 @@ def create_certification_agent(pdf_path: str = None, vectorstore_path: str = Non
     
     agent = RAGAgent(
         pdf_path=pdf_path,
-        vectorstore_path=vectorstore_path
+        vectorstore_path=vectorstore_path,
+        **agent_kwargs
     )
     
-    agent.initialize()
+    if background:
+        agent.start_background_initialization()
+    else:
+        agent.initialize()
     
     return agent
 
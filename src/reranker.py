@@ -0,0 +1,123 @@
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+try:
+    from .index_manifest import hash_text
+except ImportError:
+    from index_manifest import hash_text
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RERANK_MODEL = "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"
+DEFAULT_BATCH_SIZE = 32
+DEFAULT_CACHE_ENTRIES = 8192
+
+
+def _chunk_key(document: Any) -> str:
+    return getattr(document, "id", None) or hash_text(document.page_content)
+
+
+class CrossEncoderReranker:
+    def __init__(
+        self,
+        model_name: str = DEFAULT_RERANK_MODEL,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        cache_entries: int = DEFAULT_CACHE_ENTRIES,
+        model: Any = None
+    ):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.cache_entries = cache_entries
+        self.model = model
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.model_lock = threading.Lock()
+        self.stats = {
+            "pairs_scored": 0,
+            "cache_hits": 0,
+            "batches": 0
+        }
+
+    def load(self):
+        with self.model_lock:
+            if self.model is None:
+                from sentence_transformers import CrossEncoder
+
+                logger.info(f"Cargando cross-encoder: {self.model_name}")
+                self.model = CrossEncoder(self.model_name, device="cpu")
+
+    def score(self, question: str, documents: Sequence[Any]) -> List[float]:
+        question_hash = hash_text(question)
+        keys = [(question_hash, _chunk_key(document)) for document in documents]
+        scores = [None] * len(documents)
+
+        with self.lock:
+            for i, key in enumerate(keys):
+                score = self.cache.get(key)
+                if score is not None:
+                    self.cache.move_to_end(key)
+                    self.stats["cache_hits"] += 1
+                    scores[i] = score
+
+        missing = [i for i, score in enumerate(scores) if score is None]
+        if missing:
+            self.load()
+            # Una sola pasada por lotes; el tokenizer no admite llamadas concurrentes
+            with self.model_lock:
+                predicted = self.model.predict(
+                    [(question, documents[i].page_content) for i in missing],
+                    batch_size=self.batch_size,
+                    show_progress_bar=False
+                )
+
+            with self.lock:
+                self.stats["pairs_scored"] += len(missing)
+                self.stats["batches"] += 1
+                for i, score in zip(missing, predicted):
+                    scores[i] = float(score)
+                    self.cache[keys[i]] = scores[i]
+                    self.cache.move_to_end(keys[i])
+                while len(self.cache) > self.cache_entries:
+                    self.cache.popitem(last=False)
+
+        return scores
+
+    def rerank(
+        self,
+        question: str,
+        documents: Sequence[Any],
+        top_k: int,
+        token_budget: Optional[int] = None,
+        count_tokens: Optional[Callable[[str], int]] = None
+    ) -> Tuple[List[Any], List[float]]:
+        if not documents:
+            return [], []
+
+        scores = self.score(question, documents)
+        ranked = sorted(zip(documents, scores), key=lambda pair: pair[1], reverse=True)
+
+        selected = []
+        used_tokens = 0
+        for document, score in ranked:
+            if len(selected) >= top_k:
+                break
+            if token_budget is not None and count_tokens is not None:
+                tokens = count_tokens(document.page_content)
+                # Siempre se conserva el mejor chunk aunque supere el presupuesto
+                if selected and used_tokens + tokens > token_budget:
+                    continue
+                used_tokens += tokens
+            selected.append((document, score))
+
+        return [document for document, _ in selected], [score for _, score in selected]
+
+    def cache_stats(self) -> Dict[str, Any]:
+        with self.lock:
+            stats = self.stats.copy()
+            stats["cache_entries"] = len(self.cache)
+
+        lookups = stats["pairs_scored"] + stats["cache_hits"]
+        stats["hit_rate"] = stats["cache_hits"] / lookups if lookups else 0.0
+        return stats
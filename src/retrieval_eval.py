@@ -0,0 +1,261 @@
+import itertools
+import json
+import logging
+import re
+import shutil
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .config import DATA_DIR
+from .lexical_index import RETRIEVAL_MODES
+from .pdf_extraction import PageTextCache, iter_pdf_pages
+
+logger = logging.getLogger(__name__)
+
+LABELLED_SET_PATH = str(DATA_DIR / "retrieval_eval.jsonl")
+DEFAULT_KS = [1, 3, 5, 10]
+
+# Un chunk es relevante si contiene al menos esta fracción del fragmento etiquetado
+# (o si el fragmento cubre esa fracción del chunk, cuando el chunk es más pequeño)
+MIN_SPAN_COVERAGE = 0.5
+
+# Parámetros que obligan a reconstruir el índice frente a los que solo cambian la consulta
+INDEX_PARAMETERS = ["chunk_unit", "chunk_size", "chunk_overlap", "index_backend", "embedding_model"]
+QUERY_PARAMETERS = ["retrieval_mode", "hybrid_candidates", "rrf_k", "rerank_candidates"]
+
+
+def load_labelled_set(path: str = LABELLED_SET_PATH) -> List[Dict[str, Any]]:
+    """Lee un JSONL con ``question`` y al menos una etiqueta de relevancia.
+
+    ``relevant_text`` (fragmentos literales del PDF) y ``relevant_spans``
+    (offsets ``[inicio, fin)`` en el texto extraído) no dependen del troceado y
+    sirven para comparar tamaños de chunk; ``relevant_chunks`` (``chunk_id``)
+    solo vale para el índice con el que se etiquetó.
+    """
+    labelled = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if not any(record.get(key) for key in ("relevant_text", "relevant_spans", "relevant_chunks")):
+                raise ValueError(f"{path}:{line_number}: pregunta sin etiquetas de relevancia")
+            if isinstance(record.get("relevant_text"), str):
+                record["relevant_text"] = [record["relevant_text"]]
+            labelled.append(record)
+
+    if not labelled:
+        raise ValueError(f"No hay preguntas etiquetadas en {path}")
+    return labelled
+
+
+def document_text(pdf_path: str, extractor: str = "pdfplumber", cache: Optional[PageTextCache] = None) -> str:
+    # Mismo texto sobre el que el agente calcula start_offset/end_offset
+    return "".join(text for _, text in iter_pdf_pages(pdf_path, extractor=extractor, cache=cache))
+
+
+def _find_text(text: str, fragment: str) -> Optional[Tuple[int, int]]:
+    start = text.find(fragment)
+    if start >= 0:
+        return start, start + len(fragment)
+
+    # Los saltos de línea del PDF no tienen por qué coincidir con los de la etiqueta
+    pattern = r"\s+".join(re.escape(word) for word in fragment.split())
+    match = re.search(pattern, text)
+    return (match.start(), match.end()) if match else None
+
+
+def gold_spans(labelled: Sequence[Dict[str, Any]], text: str) -> List[List[Tuple[int, int]]]:
+    """Índice de referencia: tramos relevantes de cada pregunta, independientes del troceado."""
+    spans = []
+    for record in labelled:
+        question_spans = [tuple(span) for span in record.get("relevant_spans", [])]
+        for fragment in record.get("relevant_text", []):
+            span = _find_text(text, fragment)
+            if span is None:
+                raise ValueError(f"Fragmento etiquetado no encontrado en el PDF: {fragment[:80]!r}")
+            question_spans.append(span)
+        spans.append(question_spans)
+    return spans
+
+
+def relevance_matrix(
+    labelled: Sequence[Dict[str, Any]],
+    spans: Sequence[Sequence[Tuple[int, int]]],
+    documents: Sequence[Any]
+) -> np.ndarray:
+    """Matriz booleana preguntas x chunks del índice."""
+    metadata = [document.metadata or {} for document in documents]
+    chunk_ids = np.array([meta.get("chunk_id", -1) for meta in metadata])
+    has_offsets = all("start_offset" in meta and "end_offset" in meta for meta in metadata)
+    starts = np.array([meta.get("start_offset", 0) for meta in metadata], dtype=np.int64)
+    ends = np.array([meta.get("end_offset", 0) for meta in metadata], dtype=np.int64)
+
+    gold = np.zeros((len(labelled), len(documents)), dtype=bool)
+    for row, (record, question_spans) in enumerate(zip(labelled, spans)):
+        if question_spans and not has_offsets:
+            raise ValueError("El índice no guarda offsets de los chunks; vuelve a indexar el PDF")
+        for start, end in question_spans:
+            overlap = np.clip(np.minimum(ends, end) - np.maximum(starts, start), 0, None)
+            gold[row] |= overlap >= MIN_SPAN_COVERAGE * np.minimum(end - start, ends - starts)
+        if record.get("relevant_chunks"):
+            gold[row] |= np.isin(chunk_ids, record["relevant_chunks"])
+    return gold
+
+
+def ranking_matrix(results: Sequence[Sequence[Any]], rows: Dict[str, int], depth: int) -> np.ndarray:
+    ranked = np.full((len(results), depth), -1, dtype=np.int64)
+    for i, documents in enumerate(results):
+        for j, document in enumerate(documents[:depth]):
+            ranked[i, j] = rows.get(document.id, -1)
+    return ranked
+
+
+def retrieval_metrics(ranked: np.ndarray, gold: np.ndarray, ks: Sequence[int] = DEFAULT_KS) -> Dict[str, float]:
+    """recall@k, precision@k, nDCG@k y MRR de todas las preguntas a la vez.
+
+    ``ranked`` contiene la fila del chunk en cada posición (-1 si no hay) y
+    ``gold`` la relevancia binaria; las preguntas sin chunks relevantes en el
+    índice no cuentan.
+    """
+    valid = ranked >= 0
+    hits = gold[np.arange(len(ranked))[:, None], np.where(valid, ranked, 0)] & valid
+
+    relevant = gold.sum(axis=1)
+    evaluable = relevant > 0
+    hits = hits[evaluable]
+    relevant = relevant[evaluable]
+    if not len(hits):
+        return {"questions": 0}
+
+    discounts = 1.0 / np.log2(np.arange(2, ranked.shape[1] + 2))
+    ideal = np.cumsum(discounts)
+    first_hit = np.where(hits.any(axis=1), hits.argmax(axis=1) + 1, np.inf)
+
+    metrics = {"questions": int(len(hits)), "mrr": float(np.mean(1.0 / first_hit))}
+    for k in ks:
+        found = hits[:, :k].sum(axis=1)
+        dcg = hits[:, :k] @ discounts[:k]
+        metrics[f"recall@{k}"] = float(np.mean(found / relevant))
+        metrics[f"precision@{k}"] = float(np.mean(found / k))
+        metrics[f"ndcg@{k}"] = float(np.mean(dcg / ideal[np.minimum(relevant, k) - 1]))
+    return metrics
+
+
+def evaluate_agent(
+    agent: Any,
+    labelled: Sequence[Dict[str, Any]],
+    ks: Sequence[int] = DEFAULT_KS,
+    text: Optional[str] = None
+) -> Dict[str, Any]:
+    ids, _ = agent.index.contents()
+    documents = agent.index.get_documents(ids)
+    if text is None:
+        text = document_text(agent.pdf_path, agent.pdf_extractor, agent.page_cache)
+    gold = relevance_matrix(labelled, gold_spans(labelled, text), documents)
+
+    questions = [record["question"] for record in labelled]
+    depth = max(ks)
+
+    start_time = time.perf_counter()
+    results = agent.retrieve(questions, k=depth)
+    batch_seconds = time.perf_counter() - start_time
+
+    single = []
+    for question in questions:
+        start_time = time.perf_counter()
+        agent.retrieve([question], k=depth)
+        single.append(time.perf_counter() - start_time)
+
+    metrics = retrieval_metrics(ranking_matrix(results, {document.id: i for i, document in enumerate(documents)}, depth), gold, ks)
+    metrics.update({
+        "chunks": len(documents),
+        "relevant_chunks_per_question": float(gold.sum(axis=1).mean()) if len(gold) else 0.0,
+        "batch_ms_per_query": batch_seconds / len(questions) * 1000,
+        "query_p50_ms": float(np.percentile(single, 50) * 1000),
+        "query_p95_ms": float(np.percentile(single, 95) * 1000)
+    })
+    return metrics
+
+
+def _apply_query_parameters(agent: Any, parameters: Dict[str, Any], lexical_indexes: Dict[str, Any]):
+    for name, value in parameters.items():
+        if name == "retrieval_mode":
+            if value not in RETRIEVAL_MODES:
+                raise ValueError(f"Modo de recuperación desconocido: {value}")
+            if value == "hybrid" and "hybrid" not in lexical_indexes:
+                lexical_indexes["hybrid"] = agent._build_lexical_index()
+            agent.retrieval_mode = value
+            agent.lexical_index = lexical_indexes.get(value)
+        else:
+            setattr(agent, name, value)
+
+
+def sweep(
+    labelled: Sequence[Dict[str, Any]],
+    grid: Dict[str, Sequence[Any]],
+    base_settings: Dict[str, Any],
+    ks: Sequence[int] = DEFAULT_KS
+) -> Dict[str, Any]:
+    """Evalúa cada combinación de ``grid``; reconstruye el índice solo cuando cambia un parámetro de indexación."""
+    from .rag_agent import create_certification_agent
+
+    unknown = [name for name in grid if name not in INDEX_PARAMETERS + QUERY_PARAMETERS]
+    if unknown:
+        raise ValueError(
+            f"Parámetros no admitidos en el barrido: {', '.join(unknown)}. "
+            f"Disponibles: {', '.join(INDEX_PARAMETERS + QUERY_PARAMETERS)}"
+        )
+
+    names = list(grid)
+    combinations = [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+    groups = {}
+    for parameters in combinations:
+        key = tuple((name, parameters[name]) for name in names if name in INDEX_PARAMETERS)
+        groups.setdefault(key, []).append(parameters)
+
+    work_dir = tempfile.mkdtemp(prefix="rag-retrieval-sweep-")
+    # Todas las reconstrucciones comparten el texto extraído: solo se parsea el PDF una vez
+    base_settings = dict(base_settings)
+    base_settings.setdefault("page_cache_dir", f"{work_dir}/page_cache")
+    text = document_text(
+        base_settings["pdf_path"],
+        base_settings.get("pdf_extractor", "pdfplumber"),
+        PageTextCache(base_settings["page_cache_dir"]) if base_settings.get("use_page_cache", True) else None
+    )
+    results = []
+
+    try:
+        for group_number, (index_parameters, group) in enumerate(groups.items()):
+            settings = dict(base_settings)
+            settings.update(index_parameters)
+            settings.update(
+                vectorstore_path=f"{work_dir}/vectorstore-{group_number}",
+                llm_backend="fake",
+                use_answer_cache=False,
+                enable_metrics=False
+            )
+            logger.info(f"Construyendo índice para {dict(index_parameters) or 'la configuración base'}")
+            agent = create_certification_agent(**settings)
+            lexical_indexes = {"dense": None}
+            if agent.lexical_index is not None:
+                lexical_indexes["hybrid"] = agent.lexical_index
+
+            for parameters in group:
+                _apply_query_parameters(
+                    agent, {name: value for name, value in parameters.items() if name in QUERY_PARAMETERS}, lexical_indexes
+                )
+                results.append({"parameters": parameters, **evaluate_agent(agent, labelled, ks=ks, text=text)})
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        "benchmark": "retrieval_sweep",
+        "questions": len(labelled),
+        "ks": list(ks),
+        "results": results
+    }
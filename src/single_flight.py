@@ -0,0 +1,237 @@
+import asyncio
+import logging
+import threading
+import unicodedata
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_question(question: str) -> str:
+    # "¿Qué es SageMaker?" y "qué es  sagemaker" comparten la misma llamada
+    question = unicodedata.normalize("NFKC", question).lower()
+    return " ".join(question.split()).strip(" ¿?¡!.")
+
+
+class _TokenBroadcast:
+    def __init__(self):
+        self.tokens = []
+        self.done = False
+        self.error = None
+        self.condition = threading.Condition()
+
+    def publish(self, token: str):
+        with self.condition:
+            self.tokens.append(token)
+            self.condition.notify_all()
+
+    def close(self, error: Optional[BaseException] = None):
+        with self.condition:
+            self.done = True
+            self.error = error
+            self.condition.notify_all()
+
+    def read_from(self, position: int, timeout: Optional[float] = None) -> List[str]:
+        # Bloquea hasta que haya tokens nuevos; lista vacía = flujo terminado
+        with self.condition:
+            if not self.condition.wait_for(lambda: len(self.tokens) > position or self.done, timeout):
+                raise TimeoutError(f"Sin tokens del líder en {timeout}s")
+            if len(self.tokens) > position:
+                return self.tokens[position:]
+            if self.error is not None:
+                raise self.error
+            return []
+
+
+class SingleFlight:
+    """Agrupa llamadas idénticas en curso para que solo una haga el trabajo.
+
+    El primer llamante de una clave (líder) ejecuta la función; el resto espera
+    y recibe el mismo resultado o la misma excepción. Los llamantes pueden ser
+    hilos o corrutinas de cualquier event loop: el resultado se publica en un
+    ``concurrent.futures.Future``. Con ``enabled=False`` cada llamante es su
+    propio líder, p. ej. para medir la latencia real del pipeline.
+
+    Con ``timeout``, un seguidor que espera más de ese tiempo el resultado (o el
+    siguiente token) del líder hace su propia llamada; si ya había recibido
+    tokens de un flujo no puede empezar de nuevo y lanza ``TimeoutError``.
+    """
+
+    def __init__(self, enabled: bool = True, timeout: Optional[float] = None):
+        self.enabled = enabled
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.streams = {}
+        self.stats = {
+            "calls": 0,
+            "coalesced": 0,
+            "timeouts": 0
+        }
+
+    def _join(self, registry: Dict[Hashable, Any], key: Hashable, factory: Callable[[], Any]) -> Tuple[Any, bool]:
+        with self.lock:
+            if not self.enabled:
+                self.stats["calls"] += 1
+                return factory(), True
+            flight = registry.get(key)
+            if flight is not None:
+                self.stats["coalesced"] += 1
+                return flight, False
+            flight = factory()
+            registry[key] = flight
+            self.stats["calls"] += 1
+            return flight, True
+
+    def _leave(self, registry: Dict[Hashable, Any], key: Hashable, flight: Any):
+        # Se retira antes de publicar el resultado: las llamadas posteriores
+        # ya no se agrupan con una respuesta terminada
+        with self.lock:
+            if registry.get(key) is flight:
+                registry.pop(key)
+
+    def _timed_out(self, key: Hashable):
+        with self.lock:
+            self.stats["timeouts"] += 1
+        logger.warning(f"El líder de {key!r} no respondió en {self.timeout}s, se hace una llamada propia")
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Devuelve (resultado, agrupada)."""
+        future, leader = self._join(self.calls, key, Future)
+        if not leader:
+            try:
+                return future.result(timeout=self.timeout), True
+            except FutureTimeoutError:
+                # Si el futuro terminó, el TimeoutError es el error del propio líder
+                if future.done():
+                    raise
+            self._timed_out(key)
+            return fn(), False
+
+        try:
+            result = fn()
+        except BaseException as e:
+            self._leave(self.calls, key, future)
+            future.set_exception(e)
+            raise
+        self._leave(self.calls, key, future)
+        future.set_result(result)
+        return result, False
+
+    async def ado(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        future, leader = self._join(self.calls, key, Future)
+        if not leader:
+            try:
+                # shield: cancelar la espera no debe cancelar el futuro del líder
+                return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), self.timeout), True
+            except asyncio.TimeoutError:
+                if future.done():
+                    raise
+            self._timed_out(key)
+            return await fn(), False
+
+        try:
+            result = await fn()
+        except BaseException as e:
+            self._leave(self.calls, key, future)
+            future.set_exception(e)
+            raise
+        self._leave(self.calls, key, future)
+        future.set_result(result)
+        return result, False
+
+    def stream(self, key: Hashable, produce: Callable[[], Iterable[str]]) -> Tuple[Iterator[str], bool]:
+        """Devuelve (tokens, agrupada); los seguidores reciben los tokens del líder según llegan."""
+        broadcast, leader = self._join(self.streams, key, _TokenBroadcast)
+        if leader:
+            return self._lead_stream(key, broadcast, produce), False
+        return self._follow_stream(key, broadcast, produce), True
+
+    def astream(self, key: Hashable, produce: Callable[[], AsyncIterator[str]]) -> Tuple[AsyncIterator[str], bool]:
+        broadcast, leader = self._join(self.streams, key, _TokenBroadcast)
+        if leader:
+            return self._alead_stream(key, broadcast, produce), False
+        return self._afollow_stream(key, broadcast, produce), True
+
+    def _lead_stream(self, key: Hashable, broadcast: _TokenBroadcast, produce: Callable[[], Iterable[str]]) -> Iterator[str]:
+        error = None
+        try:
+            for token in produce():
+                broadcast.publish(token)
+                yield token
+        except BaseException as e:
+            # También si el consumidor abandona el generador: los seguidores no se quedan esperando
+            error = e if isinstance(e, Exception) else RuntimeError("Respuesta interrumpida")
+            raise
+        finally:
+            self._leave(self.streams, key, broadcast)
+            broadcast.close(error)
+
+    async def _alead_stream(
+        self,
+        key: Hashable,
+        broadcast: _TokenBroadcast,
+        produce: Callable[[], AsyncIterator[str]]
+    ) -> AsyncIterator[str]:
+        error = None
+        try:
+            async for token in produce():
+                broadcast.publish(token)
+                yield token
+        except BaseException as e:
+            error = e if isinstance(e, Exception) else RuntimeError("Respuesta interrumpida")
+            raise
+        finally:
+            self._leave(self.streams, key, broadcast)
+            broadcast.close(error)
+
+    def _follow_stream(
+        self,
+        key: Hashable,
+        broadcast: _TokenBroadcast,
+        produce: Callable[[], Iterable[str]]
+    ) -> Iterator[str]:
+        position = 0
+        while True:
+            try:
+                tokens = broadcast.read_from(position, self.timeout)
+            except TimeoutError:
+                if position:
+                    raise
+                self._timed_out(key)
+                yield from produce()
+                return
+            if not tokens:
+                return
+            position += len(tokens)
+            yield from tokens
+
+    async def _afollow_stream(
+        self,
+        key: Hashable,
+        broadcast: _TokenBroadcast,
+        produce: Callable[[], AsyncIterator[str]]
+    ) -> AsyncIterator[str]:
+        position = 0
+        while True:
+            try:
+                tokens = await asyncio.to_thread(broadcast.read_from, position, self.timeout)
+            except TimeoutError:
+                if position:
+                    raise
+                self._timed_out(key)
+                async for token in produce():
+                    yield token
+                return
+            if not tokens:
+                return
+            position += len(tokens)
+            for token in tokens:
+                yield token
+
+    def flight_stats(self) -> Dict[str, Any]:
+        with self.lock:
+            stats = self.stats.copy()
+            stats["in_flight"] = len(self.calls) + len(self.streams)
+        return stats
@@ -0,0 +1,409 @@
+import importlib.util
+import json
+import logging
+import os
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.documents import Document
+
+logger = logging.getLogger(__name__)
+
+INDEX_BACKENDS = ["chroma", "numpy", "faiss", "int8", "auto"]
+AUTO_FAISS_THRESHOLD = 50000
+
+EMBEDDINGS_FILENAME = "embeddings.npy"
+METADATA_FILENAME = "metadata.json"
+FAISS_FILENAME = "faiss.index"
+CODES_FILENAME = "codes.npy"
+SCALES_FILENAME = "scales.npy"
+
+# Candidatos por resultado que se reordenan con los vectores float32
+INT8_RESCORE_FACTOR = 4
+# Filas de códigos int8 que se convierten a float32 a la vez al puntuar
+INT8_SCORE_BLOCK_ROWS = 16384
+
+
+def faiss_available() -> bool:
+    return importlib.util.find_spec("faiss") is not None
+
+
+def resolve_backend(backend: str, num_vectors: int) -> str:
+    if backend not in INDEX_BACKENDS:
+        raise ValueError(f"Backend de índice desconocido: {backend}. Disponibles: {', '.join(INDEX_BACKENDS)}")
+
+    if backend == "auto":
+        backend = "faiss" if num_vectors > AUTO_FAISS_THRESHOLD else "numpy"
+
+    if backend == "faiss" and not faiss_available():
+        logger.warning("faiss no está instalado, se usa el índice NumPy")
+        backend = "numpy"
+
+    return backend
+
+
+def index_directory(vectorstore_path: str, backend: str) -> str:
+    return os.path.join(vectorstore_path, f"{backend}_index")
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix[None, :]
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class IndexRetriever:
+    def __init__(self, index: "VectorIndex", embeddings: Any, k: int = 3):
+        self.index = index
+        self.embeddings = embeddings
+        self.search_kwargs = {"k": k}
+
+    def invoke(self, query: str) -> List[Document]:
+        return self.index.search(self.embeddings.embed_query(query), self.search_kwargs["k"])
+
+
+class VectorIndex:
+    backend = None
+
+    def search(self, query_embedding: Sequence[float], k: int) -> List[Document]:
+        return self.search_many([query_embedding], k)[0]
+
+    def search_many(self, query_embeddings: Sequence[Sequence[float]], k: int) -> List[List[Document]]:
+        raise NotImplementedError
+
+    def as_retriever(self, embeddings: Any, k: int = 3) -> IndexRetriever:
+        return IndexRetriever(self, embeddings, k=k)
+
+    def contents(self) -> tuple:
+        raise NotImplementedError
+
+    def get_documents(self, ids: Sequence[str]) -> List[Document]:
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+
+class ChromaIndex(VectorIndex):
+    backend = "chroma"
+
+    def __init__(self, vectorstore: Any):
+        self.vectorstore = vectorstore
+
+    def search_many(self, query_embeddings: Sequence[Sequence[float]], k: int) -> List[List[Document]]:
+        response = self.vectorstore._collection.query(
+            query_embeddings=[list(embedding) for embedding in query_embeddings],
+            n_results=k,
+            include=["documents", "metadatas"]
+        )
+        return [
+            [
+                Document(id=doc_id, page_content=content, metadata=metadata or {})
+                for doc_id, content, metadata in zip(ids, contents, metadatas)
+            ]
+            for ids, contents, metadatas in zip(response["ids"], response["documents"], response["metadatas"])
+        ]
+
+    def contents(self) -> tuple:
+        stored = self.vectorstore._collection.get(include=["documents"])
+        return list(stored["ids"]), [content or "" for content in stored["documents"]]
+
+    def get_documents(self, ids: Sequence[str]) -> List[Document]:
+        stored = self.vectorstore._collection.get(ids=list(ids), include=["documents", "metadatas"])
+        by_id = {
+            doc_id: Document(id=doc_id, page_content=content, metadata=metadata or {})
+            for doc_id, content, metadata in zip(stored["ids"], stored["documents"], stored["metadatas"])
+        }
+        return [by_id[doc_id] for doc_id in ids if doc_id in by_id]
+
+    def __len__(self) -> int:
+        return self.vectorstore._collection.count()
+
+
+class NumpyIndex(VectorIndex):
+    backend = "numpy"
+
+    def __init__(
+        self,
+        embeddings: np.ndarray,
+        ids: List[str],
+        documents: List[str],
+        metadatas: List[Dict[str, Any]],
+        fingerprint: Optional[str] = None
+    ):
+        self.embeddings = embeddings
+        self.ids = ids
+        self.documents = documents
+        self.metadatas = metadatas
+        self.fingerprint = fingerprint
+        self._rows = None
+
+    @classmethod
+    def from_chroma(cls, vectorstore: Any, fingerprint: Optional[str] = None) -> "NumpyIndex":
+        stored = vectorstore._collection.get(include=["embeddings", "documents", "metadatas"])
+        return cls(
+            _normalize_rows(stored["embeddings"]),
+            list(stored["ids"]),
+            list(stored["documents"]),
+            [metadata or {} for metadata in stored["metadatas"]],
+            fingerprint=fingerprint
+        )
+
+    def _sidecar(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend,
+            "fingerprint": self.fingerprint,
+            "dim": int(self.embeddings.shape[1]),
+            "ids": self.ids,
+            "documents": self.documents,
+            "metadatas": self.metadatas
+        }
+
+    def save(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, EMBEDDINGS_FILENAME), np.ascontiguousarray(self.embeddings, dtype=np.float32))
+
+        tmp_path = os.path.join(directory, METADATA_FILENAME + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._sidecar(), f, ensure_ascii=False)
+        os.replace(tmp_path, os.path.join(directory, METADATA_FILENAME))
+
+        logger.info(f"Índice {self.backend} guardado en {directory} ({len(self)} vectores)")
+
+    @classmethod
+    def _read(cls, directory: str) -> Optional[tuple]:
+        metadata_path = os.path.join(directory, METADATA_FILENAME)
+        embeddings_path = os.path.join(directory, EMBEDDINGS_FILENAME)
+        if not (os.path.exists(metadata_path) and os.path.exists(embeddings_path)):
+            return None
+
+        with open(metadata_path, "r", encoding="utf-8") as f:
+            sidecar = json.load(f)
+        if sidecar.get("backend") != cls.backend:
+            return None
+
+        return np.load(embeddings_path, mmap_mode="r"), sidecar
+
+    @classmethod
+    def load(cls, directory: str) -> Optional["NumpyIndex"]:
+        stored = cls._read(directory)
+        if stored is None:
+            return None
+
+        embeddings, sidecar = stored
+        return cls(embeddings, sidecar["ids"], sidecar["documents"], sidecar["metadatas"], sidecar.get("fingerprint"))
+
+    def _documents_for(self, rows: Sequence[int]) -> List[Document]:
+        return [
+            Document(id=self.ids[i], page_content=self.documents[i], metadata=dict(self.metadatas[i]))
+            for i in rows
+        ]
+
+    def contents(self) -> tuple:
+        return self.ids, self.documents
+
+    def get_documents(self, ids: Sequence[str]) -> List[Document]:
+        if self._rows is None:
+            self._rows = {doc_id: i for i, doc_id in enumerate(self.ids)}
+        return self._documents_for([self._rows[doc_id] for doc_id in ids if doc_id in self._rows])
+
+    def search_many(self, query_embeddings: Sequence[Sequence[float]], k: int) -> List[List[Document]]:
+        queries = _normalize_rows(query_embeddings)
+        k = min(k, len(self))
+        if k == 0:
+            return [[] for _ in range(len(queries))]
+
+        scores = queries @ self.embeddings.T
+        if k < scores.shape[1]:
+            candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        else:
+            candidates = np.tile(np.arange(scores.shape[1]), (len(queries), 1))
+        candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+        order = np.argsort(-candidate_scores, axis=1)
+        top = np.take_along_axis(candidates, order, axis=1)
+
+        return [self._documents_for(row) for row in top.tolist()]
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def memory_bytes(self) -> int:
+        # La búsqueda exacta recorre toda la matriz: acaba entera en memoria aunque esté mapeada
+        return int(self.embeddings.nbytes)
+
+
+class FaissIndex(NumpyIndex):
+    backend = "faiss"
+
+    def __init__(self, *args, faiss_index: Any = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.faiss_index = faiss_index if faiss_index is not None else self._build_faiss_index()
+
+    def _build_faiss_index(self) -> Any:
+        import faiss
+
+        dim = self.embeddings.shape[1]
+        if len(self) > AUTO_FAISS_THRESHOLD:
+            faiss_index = faiss.IndexHNSWFlat(dim, 32, faiss.METRIC_INNER_PRODUCT)
+            faiss_index.hnsw.efSearch = 64
+        else:
+            faiss_index = faiss.IndexFlatIP(dim)
+        faiss_index.add(np.ascontiguousarray(self.embeddings, dtype=np.float32))
+        return faiss_index
+
+    def save(self, directory: str):
+        import faiss
+
+        super().save(directory)
+        faiss.write_index(self.faiss_index, os.path.join(directory, FAISS_FILENAME))
+
+    @classmethod
+    def load(cls, directory: str) -> Optional["FaissIndex"]:
+        import faiss
+
+        faiss_path = os.path.join(directory, FAISS_FILENAME)
+        stored = cls._read(directory)
+        if stored is None or not os.path.exists(faiss_path):
+            return None
+
+        embeddings, sidecar = stored
+        return cls(
+            embeddings,
+            sidecar["ids"],
+            sidecar["documents"],
+            sidecar["metadatas"],
+            sidecar.get("fingerprint"),
+            faiss_index=faiss.read_index(faiss_path)
+        )
+
+    def search_many(self, query_embeddings: Sequence[Sequence[float]], k: int) -> List[List[Document]]:
+        queries = _normalize_rows(query_embeddings)
+        k = min(k, len(self))
+        if k == 0:
+            return [[] for _ in range(len(queries))]
+
+        _, rows = self.faiss_index.search(queries, k)
+        return [self._documents_for([i for i in row if i >= 0]) for row in rows.tolist()]
+
+
+def quantize_int8(embeddings: np.ndarray) -> tuple:
+    """Cuantización escalar simétrica por dimensión: ``x ≈ codes * scales``."""
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    scales = np.abs(embeddings).max(axis=0) / 127.0 if len(embeddings) else np.ones(embeddings.shape[1], dtype=np.float32)
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(embeddings / scales), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+class Int8Index(NumpyIndex):
+    """Índice con vectores cuantizados a int8 y reordenación exacta.
+
+    La primera pasada puntúa todos los chunks con los códigos int8 (4 veces
+    menos memoria que float32); después se reordenan los ``k * rescore_factor``
+    mejores candidatos con los embeddings float32, que siguen mapeados desde
+    disco y solo se leen para esas filas.
+    """
+
+    backend = "int8"
+
+    def __init__(
+        self,
+        *args,
+        codes: Optional[np.ndarray] = None,
+        scales: Optional[np.ndarray] = None,
+        rescore_factor: int = INT8_RESCORE_FACTOR,
+        **kwargs
+    ):
+        super().__init__(*args, **kwargs)
+        if codes is None or scales is None:
+            codes, scales = quantize_int8(self.embeddings)
+        self.codes = codes
+        self.scales = scales
+        self.rescore_factor = rescore_factor
+
+    def save(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, CODES_FILENAME), self.codes)
+        np.save(os.path.join(directory, SCALES_FILENAME), self.scales)
+        super().save(directory)
+
+    @classmethod
+    def load(cls, directory: str) -> Optional["Int8Index"]:
+        codes_path = os.path.join(directory, CODES_FILENAME)
+        scales_path = os.path.join(directory, SCALES_FILENAME)
+        stored = cls._read(directory)
+        if stored is None or not (os.path.exists(codes_path) and os.path.exists(scales_path)):
+            return None
+
+        embeddings, sidecar = stored
+        return cls(
+            embeddings,
+            sidecar["ids"],
+            sidecar["documents"],
+            sidecar["metadatas"],
+            sidecar.get("fingerprint"),
+            codes=np.load(codes_path),
+            scales=np.load(scales_path)
+        )
+
+    def _approximate_scores(self, queries: np.ndarray) -> np.ndarray:
+        # La escala se aplica a la consulta: q · (codes * scales) = (q * scales) · codes
+        scaled = queries * self.scales
+        scores = np.empty((len(queries), len(self)), dtype=np.float32)
+        for start in range(0, len(self), INT8_SCORE_BLOCK_ROWS):
+            block = self.codes[start:start + INT8_SCORE_BLOCK_ROWS]
+            scores[:, start:start + len(block)] = scaled @ block.T.astype(np.float32)
+        return scores
+
+    def search_many(self, query_embeddings: Sequence[Sequence[float]], k: int) -> List[List[Document]]:
+        queries = _normalize_rows(query_embeddings)
+        k = min(k, len(self))
+        if k == 0:
+            return [[] for _ in range(len(queries))]
+
+        num_candidates = min(len(self), max(k, k * self.rescore_factor))
+        scores = self._approximate_scores(queries)
+        if num_candidates < scores.shape[1]:
+            candidates = np.argpartition(-scores, num_candidates - 1, axis=1)[:, :num_candidates]
+        else:
+            candidates = np.tile(np.arange(scores.shape[1]), (len(queries), 1))
+
+        top = []
+        for query, rows in zip(queries, candidates):
+            rows = np.sort(rows)
+            exact = np.asarray(self.embeddings[rows], dtype=np.float32) @ query
+            top.append(rows[np.argsort(-exact)[:k]].tolist())
+
+        return [self._documents_for(row) for row in top]
+
+    def memory_bytes(self) -> int:
+        return int(self.codes.nbytes + self.scales.nbytes)
+
+
+INDEX_CLASSES = {
+    "numpy": NumpyIndex,
+    "faiss": FaissIndex,
+    "int8": Int8Index
+}
+
+
+def load_index(vectorstore_path: str, backend: str, fingerprint: Optional[str] = None) -> Optional[VectorIndex]:
+    index_class = INDEX_CLASSES[backend]
+    directory = index_directory(vectorstore_path, backend)
+
+    try:
+        index = index_class.load(directory)
+    except Exception as e:
+        logger.warning(f"No se pudo cargar el índice {backend} desde {directory}: {e}")
+        return None
+
+    if index is None:
+        return None
+    if fingerprint is not None and index.fingerprint != fingerprint:
+        logger.info(f"Índice {backend} desactualizado respecto al manifest")
+        return None
+
+    return index
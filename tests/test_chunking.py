@@ -0,0 +1,92 @@
+import random
+import re
+
+import pytest
+
+from src.chunking import iter_chunk_offsets, iter_chunks_stream
+
+# El troceador anterior se detenía a las 10000 iteraciones y perdía el resto del texto
+OLD_ITERATION_CAP = 10000
+# (chunk_size, chunk_overlap) pequeños para superar ese número de chunks con poco texto
+CHUNK_PARAMS = {"chars": (40, 10), "tokens": (8, 2)}
+WORD = re.compile(r"\S+")
+
+
+def _pages(n_pages=800, seed=0):
+    rng = random.Random(seed)
+    words = ["SageMaker", "modelo", "datos", "entrenamiento", "inferencia", "examen", "dominio", "AWS"]
+    pages = []
+    for _ in range(n_pages):
+        sentences = [
+            " ".join(rng.choice(words) for _ in range(rng.randint(3, 15))) + rng.choice([".", "?", "!"])
+            for _ in range(rng.randint(5, 12))
+        ]
+        pages.append(" ".join(sentences) + "\n")
+    # Sin espacio final: el último chunk debe acabar exactamente en len(text)
+    pages[-1] = pages[-1].rstrip()
+    return pages
+
+
+def _word_starts(text):
+    # Tokenizer de sustitución: un token por palabra
+    return [match.start() for match in WORD.finditer(text)]
+
+
+def _assert_covers(text, offsets):
+    assert len(offsets) > OLD_ITERATION_CAP
+    assert offsets[-1][1] == len(text)
+
+    covered = 0
+    for start, end in sorted(offsets):
+        assert 0 <= start < end <= len(text)
+        # Los chunks se recortan en los espacios: solo puede quedar fuera espacio en blanco
+        assert not text[covered:start].strip(), f"texto perdido en [{covered}, {start})"
+        covered = max(covered, end)
+    assert covered == len(text)
+
+
+@pytest.fixture(scope="module")
+def pages():
+    return _pages()
+
+
+@pytest.fixture(scope="module")
+def text(pages):
+    return "".join(pages)
+
+
+@pytest.mark.parametrize("unit", ["chars", "tokens"])
+def test_iter_chunk_offsets_covers_whole_text(text, unit):
+    chunk_size, chunk_overlap = CHUNK_PARAMS[unit]
+    units = _word_starts(text) if unit == "tokens" else None
+
+    offsets = list(iter_chunk_offsets(text, chunk_size, chunk_overlap, units))
+
+    _assert_covers(text, offsets)
+
+
+@pytest.mark.parametrize("unit", ["chars", "tokens"])
+def test_iter_chunks_stream_covers_whole_text(pages, text, unit):
+    chunk_size, chunk_overlap = CHUNK_PARAMS[unit]
+    tokenize = _word_starts if unit == "tokens" else None
+
+    chunks = list(iter_chunks_stream(pages, chunk_size, chunk_overlap, tokenize))
+
+    for chunk, start, end in chunks:
+        assert chunk == text[start:end]
+    _assert_covers(text, [(start, end) for _, start, end in chunks])
+
+
+@pytest.mark.parametrize("unit", ["chars", "tokens"])
+def test_iter_chunks_stream_matches_full_text(pages, text, unit):
+    chunk_size, chunk_overlap = CHUNK_PARAMS[unit]
+
+    streamed = [
+        (start, end)
+        for _, start, end in iter_chunks_stream(
+            pages, chunk_size, chunk_overlap, _word_starts if unit == "tokens" else None
+        )
+    ]
+    full = list(iter_chunk_offsets(text, chunk_size, chunk_overlap, _word_starts(text) if unit == "tokens" else None))
+
+    assert streamed == full
@@ -0,0 +1,67 @@
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+from src.config import EMBEDDING_MODEL, VECTORSTORE_PATH
+from src.embedding_backends import PARITY_MIN_COSINE, PARITY_SENTENCES, create_embeddings, embedding_parity
+from src.retrieval_eval import LABELLED_SET_PATH, load_labelled_set
+from src.vector_index import NumpyIndex, _normalize_rows
+
+pytest.importorskip("onnxruntime")
+pytest.importorskip("sentence_transformers")
+huggingface_hub = pytest.importorskip("huggingface_hub")
+
+if not isinstance(huggingface_hub.try_to_load_from_cache(EMBEDDING_MODEL, "config.json"), str):
+    pytest.skip(f"{EMBEDDING_MODEL} no está en la caché local de HuggingFace", allow_module_level=True)
+
+TOP_K = 3
+
+
+@pytest.fixture(scope="module")
+def stored_index(tmp_path_factory):
+    # Se abre una copia: Chroma puede escribir en el sqlite al abrirlo y el vectorstore está versionado
+    if not os.path.exists(os.path.join(VECTORSTORE_PATH, "chroma.sqlite3")):
+        pytest.skip(f"No hay vectorstore en {VECTORSTORE_PATH}")
+    import chromadb
+
+    path = str(tmp_path_factory.mktemp("vectorstore"))
+    shutil.copytree(VECTORSTORE_PATH, path, dirs_exist_ok=True)
+    stored = chromadb.PersistentClient(path=path).get_collection("langchain").get(
+        include=["embeddings", "documents", "metadatas"]
+    )
+    return NumpyIndex(
+        _normalize_rows(stored["embeddings"]),
+        list(stored["ids"]),
+        list(stored["documents"]),
+        [metadata or {} for metadata in stored["metadatas"]]
+    )
+
+
+@pytest.fixture(scope="module")
+def onnx_dir(tmp_path_factory):
+    return str(tmp_path_factory.mktemp("onnx_models"))
+
+
+@pytest.fixture(scope="module")
+def torch_embeddings():
+    return create_embeddings("torch", EMBEDDING_MODEL)
+
+
+@pytest.mark.parametrize("backend", ["onnx", "onnx-int8"])
+def test_onnx_matches_torch(backend, stored_index, onnx_dir, torch_embeddings):
+    embeddings = create_embeddings(backend, EMBEDDING_MODEL, onnx_cache_dir=onnx_dir)
+    chunks = PARITY_SENTENCES + list(stored_index.documents)
+
+    parity = embedding_parity(
+        np.asarray(torch_embeddings.embed_documents(chunks)), np.asarray(embeddings.embed_documents(chunks))
+    )
+    assert parity["min_cosine"] >= PARITY_MIN_COSINE[backend]
+
+    # El contexto se ordena por posición en el PDF, así que lo que importa es el conjunto de chunks
+    questions = [record["question"] for record in load_labelled_set(LABELLED_SET_PATH)]
+    expected = stored_index.search_many(torch_embeddings.embed_documents(questions), TOP_K)
+    found = stored_index.search_many(embeddings.embed_documents(questions), TOP_K)
+    for question, expected_documents, documents in zip(questions, expected, found):
+        assert {doc.id for doc in documents} == {doc.id for doc in expected_documents}, question
@@ -0,0 +1,68 @@
+import os
+
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from src.config import PDF_PATH
+from src.llm_backends import DEFAULT_FAKE_RESPONSE
+from src.rag_agent import RAGAgent
+
+if not os.path.exists(PDF_PATH):
+    pytest.skip(f"No hay PDF en {PDF_PATH}", allow_module_level=True)
+
+QUESTIONS = [
+    "¿Qué es Amazon SageMaker?",
+    "¿Cuántas preguntas tiene el examen?",
+    "¿Qué dominios cubre la certificación?",
+    "¿Cuál es la nota mínima para aprobar?"
+]
+
+
+@pytest.fixture(scope="module")
+def agent(tmp_path_factory):
+    # LLM simulado y embeddings deterministas: sin red ni modelos descargados
+    work_dir = tmp_path_factory.mktemp("rag_agent")
+    agent = RAGAgent(
+        pdf_path=PDF_PATH,
+        vectorstore_path=str(work_dir / "vectorstore"),
+        page_cache_dir=str(work_dir / "page_cache"),
+        chunk_unit="chars",
+        use_embedding_cache=False,
+        embeddings=DeterministicFakeEmbedding(size=64),
+        llm_backend="fake",
+        index_backend="numpy"
+    )
+    agent.initialize()
+    return agent
+
+
+def test_ask(agent):
+    result = agent.ask(QUESTIONS[0])
+
+    assert result["success"], result.get("error")
+    assert result["answer"] == DEFAULT_FAKE_RESPONSE
+    assert result["metadata"]["question"] == QUESTIONS[0]
+    assert result["metadata"]["num_sources"] > 0
+
+
+def test_ask_stream_event_order(agent):
+    # use_shortcuts=False: la respuesta se genera token a token aunque ya esté en caché
+    events = list(agent.ask_stream(QUESTIONS[1], use_shortcuts=False))
+    types = [event["type"] for event in events]
+
+    assert types[0] == "metadata"
+    assert types[-1] == "end"
+    assert set(types[1:-1]) == {"token"}
+    assert events[-1]["success"], events[-1].get("error")
+    assert "".join(event["content"] for event in events[1:-1]) == events[-1]["answer"]
+
+
+def test_ask_many_keeps_order(agent):
+    questions = QUESTIONS + QUESTIONS[:2]
+
+    results = agent.ask_many(questions, max_concurrency=3)
+
+    assert len(results) == len(questions)
+    for question, result in zip(questions, results):
+        assert result["success"], result.get("error")
+        assert result["metadata"]["question"] == question